@@ -0,0 +1,91 @@
+"""
+Pluggable physics backends.
+
+A backend bundles a gravity solver, calculate_accelerations(positions, masses), with a matching
+fixed-step integrator, step(state, delta_time). Three ship with the simulation:
+
+    reference  physics.calculate_acceleration called body by body; slow, but easy to check
+    numpy      the blocked NumPy broadcast of physics.calculate_accelerations
+    numba      compiled kernels in numba_kernels.py that use all CPU cores; needs Numba
+
+Pick one at startup with load_backend.
+"""
+import warnings
+from functools import partial
+
+import numpy as np
+
+import physics
+
+DEFAULT_BACKEND = 'numpy'
+
+
+class Backend:
+    def __init__(self, name, calculate_accelerations, step=None):
+        """
+        Initialize a backend.
+
+        Parameters:
+        name (str): Name the backend is registered under.
+        calculate_accelerations (callable): Function mapping (positions, masses) to accelerations.
+        step (callable, optional): Function advancing (state, delta_time) by one fixed step.
+            Defaults to physics.step with calculate_accelerations as its solver.
+        """
+        self.name = name
+        self.calculate_accelerations = calculate_accelerations
+        self.step = step if step is not None else partial(physics.step, solver=calculate_accelerations)
+
+    def __repr__(self):
+        return f'Backend({self.name!r})'
+
+
+def _reference_accelerations(positions, masses):
+    accelerations = np.zeros((len(masses), 3))
+    for i in range(len(masses)):
+        accelerations[i] = physics.calculate_acceleration(masses[i], positions[i], masses, positions)
+    return accelerations
+
+
+def _load_reference():
+    return Backend('reference', _reference_accelerations)
+
+
+def _load_numpy():
+    return Backend('numpy', physics.calculate_accelerations)
+
+
+def _load_numba():
+    import numba_kernels  # Raises ImportError without Numba
+    return Backend('numba', numba_kernels.calculate_accelerations, numba_kernels.step)
+
+
+_LOADERS = {
+    'reference': _load_reference,
+    'numpy': _load_numpy,
+    'numba': _load_numba,
+}
+
+BACKEND_NAMES = tuple(_LOADERS)
+
+
+def load_backend(name=DEFAULT_BACKEND, fallback=DEFAULT_BACKEND):
+    """
+    Load a physics backend by name.
+
+    Parameters:
+    name (str, optional): One of BACKEND_NAMES.
+    fallback (str, optional): Backend to use instead when the requested one can't be imported,
+        e.g. numba without Numba installed. None raises the ImportError instead.
+
+    Returns:
+    Backend: The loaded backend.
+    """
+    if name not in _LOADERS:
+        raise ValueError(f"Unknown backend {name!r}; choose one of {', '.join(BACKEND_NAMES)}.")
+    try:
+        return _LOADERS[name]()
+    except ImportError as error:
+        if fallback is None or fallback == name:
+            raise
+        warnings.warn(f"The {name} backend is unavailable ({error}); using the {fallback} backend.")
+        return _LOADERS[fallback]()
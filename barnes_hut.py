@@ -0,0 +1,200 @@
+import numpy as np
+
+from physics import G, epsilon
+
+MAX_DEPTH = 21  # Bits of the Morton key per axis; 3 * 21 bits fit in a uint64
+_TARGET_BLOCK_SIZE = 2048  # Number of bodies walked through the tree together
+
+
+def _spread_bits(values):
+    """
+    Spread the lowest 21 bits of each value so that two zero bits separate consecutive bits.
+
+    Parameters:
+    values (np.array): Non-negative integers below 2 ** 21 (dtype: uint64).
+
+    Returns:
+    np.array: The spread integers (dtype: uint64).
+    """
+    values = (values | (values << np.uint64(32))) & np.uint64(0x1f00000000ffff)
+    values = (values | (values << np.uint64(16))) & np.uint64(0x1f0000ff0000ff)
+    values = (values | (values << np.uint64(8))) & np.uint64(0x100f00f00f00f00f)
+    values = (values | (values << np.uint64(4))) & np.uint64(0x10c30c30c30c30c3)
+    values = (values | (values << np.uint64(2))) & np.uint64(0x1249249249249249)
+    return values
+
+
+def _segment_sums(values, starts, ends):
+    """
+    Sum the rows of values over the half-open index ranges [starts[k], ends[k]).
+
+    Parameters:
+    values (np.array): Values to sum (shape: [n] or [n, 3]).
+    starts (np.array): First index of every range.
+    ends (np.array): One past the last index of every range; ranges must be non-empty.
+
+    Returns:
+    np.array: The sum over every range (shape: [len(starts)] or [len(starts), 3]).
+    """
+    padded = np.concatenate([values, np.zeros((1,) + values.shape[1:])])
+    bounds = np.column_stack([starts, ends]).ravel()
+    return np.add.reduceat(padded, bounds, axis=0)[::2]
+
+
+class Octree:
+    def __init__(self, positions, masses):
+        """
+        Build a linear octree over a set of point masses.
+
+        The tree is stored as flat arrays indexed by node number rather than as linked node
+        objects. Bodies are sorted along a Morton (Z-order) curve, so every node covers a
+        contiguous range [start, end) of the sorted bodies and the children of a node are a
+        contiguous range of node numbers. Nodes holding a single body are leaves and are
+        not subdivided further.
+
+        Parameters:
+        positions (np.array): Position vectors of all masses (shape: [n, 3]).
+        masses (np.array): Masses of all objects (shape: [n]).
+        """
+        positions = np.asarray(positions, dtype=float)
+        masses = np.asarray(masses, dtype=float)
+        n = len(masses)
+
+        lower = positions.min(axis=0)
+        extent = (positions.max(axis=0) - lower).max()
+        self.root_size = extent * (1 + 1e-9) if extent > 0 else 1.0
+        cells = (positions - lower) / self.root_size * (1 << MAX_DEPTH)
+        cells = np.clip(cells, 0, (1 << MAX_DEPTH) - 1).astype(np.uint64)
+        keys = _spread_bits(cells[:, 0]) | (_spread_bits(cells[:, 1]) << np.uint64(1)) \
+            | (_spread_bits(cells[:, 2]) << np.uint64(2))
+
+        self.order = np.argsort(keys, kind='stable')
+        keys = keys[self.order]
+        sorted_positions = positions[self.order]
+        sorted_masses = masses[self.order]
+        self.rank = np.empty(n, dtype=np.int64)  # Position of every body in the sorted order
+        self.rank[self.order] = np.arange(n)
+
+        level_starts = [np.array([0])]
+        level_ends = [np.array([n])]
+        settled = np.zeros(n, dtype=bool)  # Bodies that already sit alone in a leaf
+        if n == 1:
+            settled[:] = True
+        for level in range(1, MAX_DEPTH + 1):
+            if settled.all():
+                break
+            prefixes = keys >> np.uint64(3 * (MAX_DEPTH - level))
+            boundaries = np.flatnonzero(prefixes[1:] != prefixes[:-1]) + 1
+            starts = np.concatenate([[0], boundaries])
+            ends = np.concatenate([boundaries, [n]])
+            unsettled = ~settled[starts]
+            starts, ends = starts[unsettled], ends[unsettled]
+            settled[starts[ends - starts == 1]] = True
+            level_starts.append(starts)
+            level_ends.append(ends)
+
+        level_sizes = [len(starts) for starts in level_starts]
+        level_offsets = np.concatenate([[0], np.cumsum(level_sizes)])
+        self.start = np.concatenate(level_starts)
+        self.end = np.concatenate(level_ends)
+        self.size = np.concatenate([np.full(count, self.root_size / 2 ** level)
+                                    for level, count in enumerate(level_sizes)])
+
+        self.first_child = np.zeros(len(self.start), dtype=np.int64)
+        self.child_count = np.zeros(len(self.start), dtype=np.int64)
+        for level in range(len(level_starts) - 1):
+            parents = slice(level_offsets[level], level_offsets[level + 1])
+            child_starts = level_starts[level + 1]
+            first = np.searchsorted(child_starts, level_starts[level])
+            last = np.searchsorted(child_starts, level_ends[level])
+            self.first_child[parents] = level_offsets[level + 1] + first
+            self.child_count[parents] = last - first
+
+        self.mass = _segment_sums(sorted_masses, self.start, self.end)
+        weighted = _segment_sums(sorted_masses[:, np.newaxis] * sorted_positions, self.start, self.end)
+        centroid = _segment_sums(sorted_positions, self.start, self.end) / (self.end - self.start)[:, np.newaxis]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.center_of_mass = np.where(self.mass[:, np.newaxis] > 0,
+                                           weighted / self.mass[:, np.newaxis], centroid)
+
+    def __len__(self):
+        return len(self.start)
+
+
+def calculate_accelerations(positions, masses, theta=0.5):
+    """
+    Calculate the acceleration of every mass using the Barnes-Hut approximation.
+
+    A node of the octree is replaced by a point mass at its center of mass when its size
+    divided by its distance is below the opening angle theta; otherwise its children are
+    visited. The walk is vectorized over blocks of bodies: every iteration handles one
+    frontier of (body, node) pairs. Nodes containing the body itself are always opened, and
+    its own mass is removed from the leaf it ends up in. The same Plummer softening as physics.calculate_accelerations is used,
+    so theta = 0 reproduces direct summation.
+
+    Parameters:
+    positions (np.array): Position vectors of all masses (shape: [n, 3]).
+    masses (np.array): Masses of all objects (shape: [n]).
+    theta (float, optional): Opening angle; smaller values are more accurate and slower.
+
+    Returns:
+    np.array: Acceleration vectors of all masses (shape: [n, 3]).
+    """
+    positions = np.asarray(positions, dtype=float)
+    masses = np.asarray(masses, dtype=float)
+    n = len(masses)
+    accelerations = np.zeros((n, 3))
+    if n == 0:
+        return accelerations
+
+    tree = Octree(positions, masses)
+    theta_squared = theta ** 2
+
+    for block_start in range(0, n, _TARGET_BLOCK_SIZE):
+        block_bodies = tree.order[block_start:block_start + _TARGET_BLOCK_SIZE]  # Nearby bodies walk together
+        block_accelerations = np.zeros((len(block_bodies), 3))
+        bodies = block_bodies
+        nodes = np.zeros(len(bodies), dtype=np.int64)
+
+        while len(bodies):
+            separations = tree.center_of_mass[nodes] - positions[bodies]
+            distances_squared = np.einsum('ij,ij->i', separations, separations)
+            ranks = tree.rank[bodies]
+            inside = (tree.start[nodes] <= ranks) & (ranks < tree.end[nodes])
+            # Nodes containing the body itself are always opened, down to the leaves
+            accepted = (tree.child_count[nodes] == 0) \
+                | (~inside & (tree.size[nodes] ** 2 < theta_squared * distances_squared))
+
+            accepted_bodies, accepted_nodes = bodies[accepted], nodes[accepted]
+            node_masses = tree.mass[accepted_nodes]
+            centers = tree.center_of_mass[accepted_nodes]
+            ranks, inside = ranks[accepted], inside[accepted]
+            if inside.any():
+                # Leaves holding the body: remove its own mass from the monopole
+                own_masses = masses[accepted_bodies[inside]]
+                remaining = node_masses[inside] - own_masses
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    shifted = (node_masses[inside, np.newaxis] * centers[inside]
+                               - own_masses[:, np.newaxis] * positions[accepted_bodies[inside]]) \
+                        / remaining[:, np.newaxis]
+                centers[inside] = np.where(remaining[:, np.newaxis] > 0, shifted, centers[inside])
+                node_masses[inside] = np.maximum(remaining, 0.0)
+
+            pair_separations = centers - positions[accepted_bodies]
+            pair_distances_squared = np.einsum('ij,ij->i', pair_separations, pair_separations)
+            weights = G * node_masses * (pair_distances_squared + epsilon ** 2) ** -1.5
+            weights[pair_distances_squared == 0] = 0.0  # Self-interaction and coincident bodies
+            rows = ranks - block_start
+            for axis in range(3):
+                block_accelerations[:, axis] += np.bincount(rows, weights=weights * pair_separations[:, axis],
+                                                            minlength=len(block_bodies))
+
+            opened_bodies, opened_nodes = bodies[~accepted], nodes[~accepted]
+            counts = tree.child_count[opened_nodes]
+            bodies = np.repeat(opened_bodies, counts)
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            nodes = np.repeat(tree.first_child[opened_nodes], counts) + offsets
+
+        accelerations[block_bodies] = block_accelerations
+
+    return accelerations
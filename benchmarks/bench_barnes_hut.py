@@ -0,0 +1,83 @@
+"""
+Accuracy and scaling benchmark for the Barnes-Hut solver.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_barnes_hut [--max-direct 10000] [--theta 0.5]
+
+The accuracy table compares barnes_hut.calculate_accelerations against direct summation
+(physics.calculate_accelerations) for a Plummer-sphere cluster. The scaling table times
+both solvers for N = 10^3 ... 10^5; direct summation is skipped above --max-direct bodies.
+"""
+import argparse
+import time
+
+import numpy as np
+
+import barnes_hut
+import physics
+
+
+def plummer_sphere(n, seed=0):
+    """
+    Sample a Plummer-sphere cluster of equal-mass bodies.
+
+    Parameters:
+    n (int): Number of bodies.
+    seed (int, optional): Seed of the random number generator.
+
+    Returns:
+    tuple: Position vectors (shape: [n, 3]) and masses (shape: [n]).
+    """
+    rng = np.random.default_rng(seed)
+    radii = 1.0 / np.sqrt(rng.uniform(1e-3, 1.0, n) ** (-2 / 3) - 1)
+    directions = rng.normal(size=(n, 3))
+    directions /= np.linalg.norm(directions, axis=1)[:, np.newaxis]
+    return radii[:, np.newaxis] * directions, np.full(n, 1.0 / n)
+
+
+def time_call(function, *args, repeat=3):
+    """
+    Return the best wall-clock time of several calls of a function.
+    """
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--theta', type=float, default=0.5, help='opening angle for the scaling table')
+    parser.add_argument('--max-direct', type=int, default=10000, help='largest N timed with direct summation')
+    args = parser.parse_args()
+
+    positions, masses = plummer_sphere(2000)
+    direct = physics.calculate_accelerations(positions, masses)
+    direct_norms = np.linalg.norm(direct, axis=1)
+    print('Accuracy against direct summation (N = 2000)')
+    print(f'{"theta":>6} {"median error":>14} {"99% error":>12} {"max error":>12}')
+    for theta in (0.0, 0.3, 0.5, 0.7, 1.0):
+        approximate = barnes_hut.calculate_accelerations(positions, masses, theta)
+        errors = np.linalg.norm(approximate - direct, axis=1) / direct_norms
+        print(f'{theta:>6.2f} {np.median(errors):>14.2e} {np.percentile(errors, 99):>12.2e} {errors.max():>12.2e}')
+
+    print()
+    print(f'Scaling (theta = {args.theta})')
+    print(f'{"N":>8} {"direct (s)":>12} {"Barnes-Hut (s)":>15} {"tree nodes":>11}')
+    for n in (1000, 3000, 10000, 30000, 100000):
+        positions, masses = plummer_sphere(n)
+        repeat = 3 if n <= 10000 else 1
+        if n <= args.max_direct:
+            direct_time = f'{time_call(physics.calculate_accelerations, positions, masses, repeat=repeat):>12.3f}'
+        else:
+            direct_time = f'{"-":>12}'
+        tree_time = time_call(barnes_hut.calculate_accelerations, positions, masses, args.theta, repeat=repeat)
+        nodes = len(barnes_hut.Octree(positions, masses))
+        print(f'{n:>8} {direct_time} {tree_time:>15.3f} {nodes:>11}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+"""
+Speed, memory and accuracy benchmark of the integrators and physics backends, with a
+regression check against a saved baseline.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_physics [--quick] [--save benchmarks/baseline.json]
+    python -m benchmarks.bench_physics --compare benchmarks/baseline.json [--threshold 0.2]
+
+Every case integrates a star with N - 1 planets on circular orbits for a fixed number of
+steps and reports steps per second, the median and 95th percentile step latency, the peak
+memory allocated during one step (tracemalloc) and the relative energy error over the run.
+The force backends are those of backends.py plus barnes_hut, the Barnes-Hut tree solver
+with opening angle --theta. With --compare the command exits with status 1 when the median
+step of a case is slower by more than threshold, a step uses more than threshold more
+memory, or the energy error grows by more than --energy-factor over the baseline.
+
+benchmarks/baseline.json holds the --quick results of the reference machine. A CI job fails
+on regressions with
+
+    python -m benchmarks.bench_physics --quick --compare benchmarks/baseline.json --threshold 0.5
+
+Baselines are only comparable on the machine that recorded them, so a CI runner should record
+its own once, on the commit to compare against, with --quick --save benchmarks/baseline.json,
+and commit or cache that file. Cases missing from the baseline, e.g. numba without Numba
+installed, are not compared. On shared machines raise --threshold, since small cases take
+only tens of microseconds per step.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from functools import partial
+
+import numpy as np
+
+import backends
+import barnes_hut
+import physics
+from entity.celestial_body import CelestialBody
+from entity.system_state import SystemState
+
+FORMAT_VERSION = 1
+SIZES = (2, 10, 100, 1000, 10000)
+QUICK_SIZES = (2, 10, 100, 1000)
+INTEGRATORS = ('verlet', 'hierarchical', 'adaptive')
+FORCE_BACKENDS = backends.BACKEND_NAMES + ('barnes_hut',)
+
+# Fixed step counts keep the energy error comparable between runs
+_STEPS = {2: 1000, 10: 1000, 100: 100, 1000: 5, 10000: 2}
+_REPEATS = 3  # The fastest of several runs is reported, which filters out scheduling noise
+
+
+def planetary_system(n, seed=0):
+    """
+    Build a star with n - 1 light planets on circular orbits between 10 and 100 units.
+
+    Parameters:
+    n (int): Number of bodies, including the star.
+    seed (int, optional): Seed of the random number generator.
+
+    Returns:
+    SystemState: The system; every planet has the star as its parent.
+    """
+    rng = np.random.default_rng(seed)
+    state = SystemState(capacity=n)
+    star = CelestialBody('Star', radius=4, mass=10000, color=(1, 1, 0), state=state)
+    for index in range(1, n):
+        radius = rng.uniform(10, 100)
+        angle = rng.uniform(0, 2 * np.pi)
+        speed = np.sqrt(physics.G * 10000 / radius)
+        CelestialBody(f'Planet {index}',
+                      radius=0.1,
+                      mass=rng.uniform(1e-3, 1e-1),
+                      color=(1, 1, 1),
+                      initial_position=radius * np.array([np.cos(angle), 0.0, np.sin(angle)]),
+                      initial_velocity=speed * np.array([np.sin(angle), 0.0, -np.cos(angle)]),
+                      parent_body=star,
+                      state=state)
+    return state
+
+
+def load_force_backend(name, theta=0.5):
+    """
+    Load a backend of backends.py, or the Barnes-Hut solver wrapped as one when name is 'barnes_hut'.
+
+    Raises ImportError when the backend can't be imported.
+    """
+    if name == 'barnes_hut':
+        return backends.Backend('barnes_hut', partial(barnes_hut.calculate_accelerations, theta=theta))
+    return backends.load_backend(name, fallback=None)
+
+
+def make_integrator(name, backend):
+    """
+    Return the function advancing (state, delta_time) for an integrator and backend.
+    """
+    if name == 'verlet':
+        return backend.step
+    if name == 'hierarchical':
+        return partial(physics.step_hierarchical, solver=backend.calculate_accelerations)
+    if name == 'adaptive':
+        return physics.step_adaptive
+    raise ValueError(f'Unknown integrator {name!r}.')
+
+
+def run_case(integrator_name, backend, n, delta_time=500.0, repeats=_REPEATS):
+    """
+    Benchmark one integrator and backend on a system of n bodies.
+
+    Returns:
+    dict: The measurements of the case.
+    """
+    integrator = make_integrator(integrator_name, backend)
+    steps = _STEPS.get(n, 2)
+
+    # Warm-up step, which also compiles JIT kernels, then the peak memory of one step
+    integrator(planetary_system(n), delta_time)
+    state = planetary_system(n)
+    tracemalloc.start()
+    integrator(state, delta_time)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = None
+    for _ in range(repeats if n <= 1000 else 1):
+        state = planetary_system(n)
+        run_latencies = np.empty(steps)
+        for step_index in range(steps):
+            start = time.perf_counter()
+            integrator(state, delta_time)
+            run_latencies[step_index] = time.perf_counter() - start
+        if latencies is None or run_latencies.sum() < latencies.sum():
+            latencies = run_latencies
+    # Every run is identical, so the last one gives the energy error
+    initial_state = planetary_system(n)
+    initial_energy = physics.total_energy(initial_state.positions, initial_state.velocities, initial_state.masses)
+    energy = physics.total_energy(state.positions, state.velocities, state.masses)
+
+    return {
+        'integrator': integrator_name,
+        'backend': backend.name,
+        'n': n,
+        'steps': steps,
+        'steps_per_second': steps / latencies.sum(),
+        'latency_median': float(np.median(latencies)),
+        'latency_p95': float(np.percentile(latencies, 95)),
+        'peak_memory': int(peak_memory),
+        'energy_error': float(abs((energy - initial_energy) / initial_energy)),
+    }
+
+
+def case_key(result):
+    return result['integrator'], result['backend'], result['n']
+
+
+def compare(results, baseline, threshold, energy_factor):
+    """
+    List the regressions of results against a baseline.
+
+    Returns:
+    list of str: One line per regression; empty when there are none.
+    """
+    baseline_results = {case_key(result): result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        old = baseline_results.get(case_key(result))
+        if old is None:
+            continue
+        name = '{} / {} / N={}'.format(*case_key(result))
+        # The median step latency is less sensitive to scheduling hiccups than the mean
+        if result['latency_median'] > old['latency_median'] * (1 + threshold):
+            regressions.append(f'{name}: median step {1e3 * result["latency_median"]:.3f} ms, '
+                               f'baseline {1e3 * old["latency_median"]:.3f} ms')
+        if result['peak_memory'] > old['peak_memory'] * (1 + threshold) + 2 ** 20:
+            regressions.append(f'{name}: peak memory {result["peak_memory"] / 2 ** 20:.1f} MiB, '
+                               f'baseline {old["peak_memory"] / 2 ** 20:.1f} MiB')
+        if result['energy_error'] > max(old['energy_error'] * energy_factor, 1e-12):
+            regressions.append(f'{name}: energy error {result["energy_error"]:.2e}, '
+                               f'baseline {old["energy_error"]:.2e}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help=f'only N in {QUICK_SIZES}')
+    parser.add_argument('--sizes', type=int, nargs='+', help='body counts to run')
+    parser.add_argument('--integrators', nargs='+', choices=INTEGRATORS, default=INTEGRATORS)
+    parser.add_argument('--backends', nargs='+', choices=FORCE_BACKENDS, default=FORCE_BACKENDS)
+    parser.add_argument('--theta', type=float, default=0.5, help='opening angle of the barnes_hut backend')
+    parser.add_argument('--max-reference', type=int, default=100, help='largest N run with the reference backend')
+    parser.add_argument('--max-adaptive', type=int, default=1000, help='largest N run with the adaptive integrator')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file to check the results against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative slowdown and memory growth')
+    parser.add_argument('--energy-factor', type=float, default=10.0, help='allowed growth of the energy error')
+    args = parser.parse_args(argv)
+
+    sizes = args.sizes or (QUICK_SIZES if args.quick else SIZES)
+    loaded = []
+    for name in args.backends:
+        try:
+            loaded.append(load_force_backend(name, args.theta))
+        except ImportError as error:
+            print(f'Skipping the {name} backend: {error}')
+
+    print(f'{"integrator":<13} {"backend":<10} {"N":>6} {"steps/s":>10} {"median (ms)":>12} '
+          f'{"p95 (ms)":>10} {"peak (MiB)":>11} {"energy error":>13}')
+    results = []
+    for integrator_name in args.integrators:
+        for backend in loaded:
+            if integrator_name == 'adaptive' and backend.name != backends.DEFAULT_BACKEND:
+                continue  # The adaptive integrator has its own solver
+            for n in sizes:
+                if (backend.name == 'reference' and n > args.max_reference) \
+                        or (integrator_name == 'adaptive' and n > args.max_adaptive):
+                    continue
+                result = run_case(integrator_name, backend, n)
+                results.append(result)
+                print(f'{integrator_name:<13} {backend.name:<10} {n:>6} {result["steps_per_second"]:>10.1f} '
+                      f'{1e3 * result["latency_median"]:>12.3f} {1e3 * result["latency_p95"]:>10.3f} '
+                      f'{result["peak_memory"] / 2 ** 20:>11.2f} {result["energy_error"]:>13.2e}')
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump({'version': FORMAT_VERSION, 'machine': platform.platform(), 'python': platform.python_version(),
+                       'results': results}, file, indent=2)
+        print(f'Saved {len(results)} results to {args.save}')
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.threshold, args.energy_factor)
+        if regressions:
+            print(f'{len(regressions)} regression(s) against {args.compare}:')
+            for line in regressions:
+                print(f'  {line}')
+            return 1
+        print(f'No regressions against {args.compare}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
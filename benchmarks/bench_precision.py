@@ -0,0 +1,157 @@
+"""
+Round-off benchmark of the compensated (Kahan) summation mode of physics.step.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_precision [--scenario scenarios/solar_system.toml] [--years 10] [--dt 1]
+
+The integrated bodies of the scenario are advanced with plain and with compensated Velocity
+Verlet steps, and with the same scheme in extended precision (np.longdouble) as a reference.
+All three share the same discretization, so differences from the reference are round-off
+alone. Every --sample-days the benchmark records, for both modes, the deviation of the total
+energy from the reference energy, relative to the initial energy, and the phase error of every
+body: the angle between its position relative to its parent and the reference one. It prints
+the final and largest errors and the cost per step of either mode. Tightly coupled moons, such
+as the Galilean moons in their resonance, amplify any difference quickly and show less gain.
+"""
+import argparse
+import time
+
+import numpy as np
+
+import physics
+from scenario import load_scenario
+
+DAY = 86400.0
+YEAR = 365.25 * DAY
+
+
+def _reference_accelerations(positions, masses):
+    # calculate_accelerations in the precision of the arguments
+    separations = positions[np.newaxis, :, :] - positions[:, np.newaxis, :]
+    distances_squared = np.einsum('ijk,ijk->ij', separations, separations)
+    inverse_cubes = (distances_squared + np.longdouble(physics.epsilon) ** 2) ** -1.5
+    np.fill_diagonal(inverse_cubes, 0)
+    return np.longdouble(physics.G) * np.einsum('ij,ijk->ik', inverse_cubes * masses, separations)
+
+
+def _reference_energy(positions, velocities, masses):
+    kinetic = 0.5 * np.sum(masses * np.einsum('ij,ij->i', velocities, velocities))
+    separations = positions[np.newaxis, :, :] - positions[:, np.newaxis, :]
+    distances = np.sqrt(np.einsum('ijk,ijk->ij', separations, separations) + np.longdouble(physics.epsilon) ** 2)
+    pair_potentials = masses[:, np.newaxis] * masses[np.newaxis, :] / distances
+    return kinetic - np.longdouble(physics.G) * np.sum(np.triu(pair_potentials, 1))
+
+
+class ReferenceRun:
+    def __init__(self, state):
+        """
+        Initialize a Velocity Verlet integration of a system in extended precision.
+
+        Parameters:
+        state (SystemState): The system to copy; it has no analytic bodies.
+        """
+        self.positions = state.positions.astype(np.longdouble)
+        self.velocities = state.velocities.astype(np.longdouble)
+        self.masses = state.masses.astype(np.longdouble)
+        self.accelerations = _reference_accelerations(self.positions, self.masses)
+
+    def step(self, delta_time):
+        delta_time = np.longdouble(delta_time)
+        self.velocities += 0.5 * delta_time * self.accelerations
+        self.positions += delta_time * self.velocities
+        self.accelerations = _reference_accelerations(self.positions, self.masses)
+        self.velocities += 0.5 * delta_time * self.accelerations
+
+    def energy(self):
+        return _reference_energy(self.positions, self.velocities, self.masses)
+
+
+def phase_errors(positions, reference_positions, parents, reference_origin):
+    """
+    Calculate the angle between every body's position and its reference position, seen from its parent.
+
+    Parameters:
+    positions (np.array): Position vectors of all bodies (shape: [n, 3]).
+    reference_positions (np.array): Reference position vectors (shape: [n, 3]).
+    parents (np.array): Index of every body's parent, or -1 for none (shape: [n]).
+    reference_origin (int): Body whose position bodies without a parent are seen from.
+
+    Returns:
+    np.array: Angles (rad) of all bodies except reference_origin (shape: [n - 1]).
+    """
+    hosts = np.where(parents >= 0, parents, reference_origin)
+    observed = np.flatnonzero(np.arange(len(parents)) != reference_origin)
+    hosts = hosts[observed]
+    relative = positions[observed] - positions[hosts]
+    reference = (reference_positions[observed] - reference_positions[hosts]).astype(float)
+    cosines = np.einsum('ij,ij->i', relative, reference) / (np.linalg.norm(relative, axis=1)
+                                                           * np.linalg.norm(reference, axis=1))
+    sines = np.linalg.norm(np.cross(relative, reference), axis=1) / (np.linalg.norm(relative, axis=1)
+                                                                    * np.linalg.norm(reference, axis=1))
+    return np.arctan2(sines, cosines)
+
+
+def run(args):
+    full_state = load_scenario(args.scenario)
+    state = full_state.subset(np.flatnonzero(~full_state.analytic))
+    delta_time = args.dt * 3600.0
+    steps = int(round(args.years * YEAR / delta_time))
+    sample_every = max(1, int(round(args.sample_days * DAY / delta_time)))
+    origin = int(np.argmax(state.masses))
+    print(f'{len(state)} integrated bodies of {args.scenario}, {steps} steps of {args.dt:g} h '
+          f'({args.years:g} years)')
+
+    modes = {'plain': False, 'compensated': True}
+    states = {name: state.subset(np.arange(len(state))) for name in modes}
+    durations = {name: 0.0 for name in modes}
+    energy_errors = {name: [] for name in modes}
+    phases = {name: np.zeros(len(state) - 1) for name in modes}  # Largest phase error of every body
+    final_phases = {}
+    reference = ReferenceRun(state)
+    initial_energy = reference.energy()
+
+    for step_index in range(1, steps + 1):
+        for name, compensated in modes.items():
+            start = time.perf_counter()
+            physics.step(states[name], delta_time, compensated=compensated)
+            durations[name] += time.perf_counter() - start
+        reference.step(delta_time)
+        if step_index % sample_every == 0 or step_index == steps:
+            reference_energy = reference.energy()
+            for name in modes:
+                mode_state = states[name]
+                energy = physics.total_energy(mode_state.positions, mode_state.velocities, mode_state.masses)
+                energy_errors[name].append(float(abs((energy - reference_energy) / initial_energy)))
+                final_phases[name] = phase_errors(mode_state.positions, reference.positions, mode_state.parents,
+                                                  origin)
+                np.maximum(phases[name], final_phases[name], out=phases[name])
+
+    print(f"{'mode':<12} {'us/step':>9} {'energy final':>13} {'energy max':>11}")
+    for name in modes:
+        print(f'{name:<12} {1e6 * durations[name] / steps:>9.1f} {energy_errors[name][-1]:>13.2e} '
+              f'{max(energy_errors[name]):>11.2e}')
+    print(f"\n{'phase (rad)':<12} {'plain':>9} {'compensated':>12} {'plain max':>10} {'comp. max':>10}")
+    names = [body.p_name for index, body in enumerate(state.bodies) if index != origin]
+    for row, name in enumerate(names):
+        print(f"{name:<12} {final_phases['plain'][row]:>9.2e} {final_phases['compensated'][row]:>12.2e} "
+              f"{phases['plain'][row]:>10.2e} {phases['compensated'][row]:>10.2e}")
+
+    tiny = np.finfo(float).tiny
+    gains = phases['plain'] / np.maximum(phases['compensated'], tiny)
+    print(f"\nCompensated: {durations['compensated'] / durations['plain']:.2f}x the cost per step, "
+          f"{energy_errors['plain'][-1] / max(energy_errors['compensated'][-1], tiny):.0f}x smaller energy error, "
+          f"median {np.median(gains):.0f}x smaller phase error")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', default='scenarios/solar_system.toml', help='scenario JSON or TOML file')
+    parser.add_argument('--years', type=float, default=10, help='simulated time (years)')
+    parser.add_argument('--dt', type=float, default=1, help='time step (hours)')
+    parser.add_argument('--sample-days', type=float, default=30, help='days between error measurements')
+    run(parser.parse_args(argv))
+
+
+if __name__ == '__main__':
+    main()
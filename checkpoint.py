@@ -0,0 +1,217 @@
+"""
+Checkpoints: bit-exact copies of a simulation that can be written to disk and restored.
+
+A checkpoint holds every per-body buffer of a SystemState (see scenario.state_to_arrays, plus
+the timescales and compensation terms the integrators carry between steps), the simulation
+time and step count, whether the accelerations are current, and free-form view settings such
+as the camera. Restoring one and stepping on reproduces the original run bit for bit.
+
+A checkpoint is captured between two physics steps: Simulation.request_checkpoint has the
+physics thread copy the state after its current step, so the render loop waits for neither
+the step nor the copy. Checkpointer writes checkpoints to an .npz file on a background
+thread, replacing the previous file atomically, so no other thread waits for the disk. The
+latest checkpoint also stays in memory for rewinding.
+"""
+import json
+import os
+import threading
+import time
+import zipfile
+
+import numpy as np
+
+from scenario import STATE_ARRAYS, state_from_arrays, state_to_arrays
+
+CHECKPOINT_VERSION = 1
+# Buffers the integrators carry between steps, beyond what a scenario needs
+INTEGRATOR_ARRAYS = ('timescales', 'position_errors', 'velocity_errors')
+
+
+class Checkpoint:
+    __slots__ = ('arrays', 'metadata', 'bodies')
+
+    def __init__(self, arrays, metadata, bodies=None):
+        """
+        Initialize a checkpoint.
+
+        Parameters:
+        arrays (dict): Copies of the per-body buffers keyed by the names in STATE_ARRAYS and
+            INTEGRATOR_ARRAYS.
+        metadata (dict): JSON-compatible values: 'time', 'steps', 'accelerations_current' and any
+            view settings.
+        bodies (list of CelestialBody, optional): The body of every row, when the checkpoint was
+            taken in this process; restore_state then brings back these very objects.
+        """
+        self.arrays = arrays
+        self.metadata = metadata
+        self.bodies = bodies
+
+    @property
+    def time(self):
+        return self.metadata['time']
+
+
+def capture(state, steps=0, **view):
+    """
+    Copy the state of a system; call holding the lock of the thread that steps it.
+
+    Parameters:
+    state (SystemState): The system.
+    steps (int, optional): Number of steps simulated so far.
+    **view: JSON-compatible settings to store alongside, e.g. camera=[zoom, x, y] or target=3.
+
+    Returns:
+    Checkpoint: The checkpoint, sharing no memory with the state.
+    """
+    arrays = state_to_arrays(state)
+    for name in INTEGRATOR_ARRAYS:
+        arrays[name] = getattr(state, name).copy()
+    metadata = dict(view, version=CHECKPOINT_VERSION, time=state.time, steps=steps,
+                    accelerations_current=state.accelerations_current)
+    return Checkpoint(arrays, metadata, list(state.bodies))
+
+
+def restore_state(checkpoint, state=None):
+    """
+    Bring a system back to a checkpoint.
+
+    Parameters:
+    checkpoint (Checkpoint): The checkpoint to restore.
+    state (SystemState, optional): A system to restore in place, keeping its body objects valid.
+        Requires a checkpoint taken in this process; bodies removed since, e.g. in collisions,
+        are put back. A new system is built when omitted.
+
+    Returns:
+    SystemState: The restored system.
+    """
+    arrays, metadata = checkpoint.arrays, checkpoint.metadata
+    if state is None:
+        state = state_from_arrays(arrays)
+    else:
+        if checkpoint.bodies is None:
+            raise ValueError("Only checkpoints taken in this process can be restored in place.")
+        if state.bodies != checkpoint.bodies:
+            # Rebuild the rows in the order of the checkpoint
+            state.remove_bodies(list(state.bodies))
+            for body in checkpoint.bodies:
+                body.move_to(state)
+        for body, parent in zip(checkpoint.bodies, arrays['parents'].tolist()):
+            body.parent_body = checkpoint.bodies[parent] if parent >= 0 else None
+    for name in ('radii', 'positions', 'velocities', 'accelerations', 'masses', 'parents', 'analytic',
+                 'elements') + INTEGRATOR_ARRAYS:
+        getattr(state, name)[:] = arrays[name]
+    state.time = metadata['time']
+    state.accelerations_current = metadata['accelerations_current']
+    return state
+
+
+def save_checkpoint(checkpoint, path):
+    """
+    Write a checkpoint to an .npz file, atomically replacing any previous one.
+
+    Parameters:
+    checkpoint (Checkpoint): The checkpoint.
+    path (str): File to write.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as file:
+        np.savez(file, metadata=np.array(json.dumps(checkpoint.metadata)), **checkpoint.arrays)
+    os.replace(temporary_path, path)  # A crash while writing leaves the previous checkpoint intact
+
+
+def load_checkpoint(path):
+    """
+    Read a checkpoint written by save_checkpoint.
+
+    Parameters:
+    path (str): The file.
+
+    Returns:
+    Checkpoint: The checkpoint, without body objects; restore it with restore_state(checkpoint).
+    """
+    try:
+        with np.load(path) as file:
+            metadata = json.loads(str(file['metadata']))
+            if metadata.get('version') != CHECKPOINT_VERSION:
+                raise ValueError(f"{path} is a version {metadata.get('version')} checkpoint; "
+                                 f"expected version {CHECKPOINT_VERSION}.")
+            arrays = {name: file[name] for name in STATE_ARRAYS + INTEGRATOR_ARRAYS}
+    except (KeyError, zipfile.BadZipFile) as error:
+        raise ValueError(f"{path} is not a checkpoint: {error}") from error
+    return Checkpoint(arrays, metadata)
+
+
+class Checkpointer:
+    def __init__(self, path=None, interval=30.0):
+        """
+        Initialize a keeper of periodic checkpoints that writes them on a background thread.
+
+        Parameters:
+        path (str, optional): File the checkpoints are written to; None keeps them in memory only.
+        interval (float, optional): Wall-clock seconds between checkpoints, see due.
+        """
+        self.path = path
+        self.interval = interval
+        self.latest = None  # The most recent checkpoint, for rewinding
+        self.written = 0
+        self.error = None  # The exception of the last failed write, if any
+        self._last_submit = time.perf_counter()
+        self._pending = None
+        self._condition = threading.Condition()
+        self._running = True
+        self._thread = None
+        if path is not None:
+            self._thread = threading.Thread(target=self._run, name='checkpoints', daemon=True)
+            self._thread.start()
+
+    def due(self):
+        """
+        Return whether interval seconds have passed since the last checkpoint.
+        """
+        return time.perf_counter() - self._last_submit >= self.interval
+
+    def submit(self, checkpoint):
+        """
+        Keep a checkpoint as the latest one and queue it for writing.
+
+        Only the newest checkpoint waits for the writer; an older one still queued is dropped.
+
+        Parameters:
+        checkpoint (Checkpoint): The checkpoint, e.g. from capture.
+        """
+        self.latest = checkpoint
+        self._last_submit = time.perf_counter()
+        if self._thread is not None:
+            with self._condition:
+                self._pending = checkpoint
+                self._condition.notify()
+
+    def close(self):
+        """
+        Write the checkpoint still queued, if any, and stop the writer thread.
+        """
+        if self._thread is None:
+            return
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and self._running:
+                    self._condition.wait()
+                checkpoint, self._pending = self._pending, None
+                if checkpoint is None:
+                    return
+            try:
+                save_checkpoint(checkpoint, self.path)
+                self.written += 1
+                self.error = None
+            except OSError as error:
+                self.error = error  # Keep running; the next checkpoint may succeed
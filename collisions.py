@@ -0,0 +1,203 @@
+"""
+Collision detection and merging of celestial bodies.
+
+find_collisions looks for overlapping spheres with a spatial hash: bodies are binned into
+cubic cells about twice as wide as the larger typical bodies, and only bodies in the same or adjacent
+cells are compared, which takes O(N) time for bodies that are spread out. The few bodies too
+large for the cells are compared with everything directly. resolve_collisions merges every
+group of touching bodies into one, conserving mass and momentum.
+"""
+import numpy as np
+
+import physics
+
+# Half of the 26 neighbouring cells plus the cell itself; the other half is covered from the
+# neighbours' side, so every pair of cells is visited once
+_HALF_NEIGHBOURHOOD = np.array([(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)
+                                if (dx, dy, dz) >= (0, 0, 0)], dtype=np.int64)
+_MAX_KEY = 2 ** 62
+
+
+def _ranges(starts, counts):
+    # Concatenation of range(start, start + count) for every pair
+    total = int(counts.sum())
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.arange(total) - offsets + np.repeat(starts, counts)
+
+
+def find_collisions(positions, radii, cell_size=None):
+    """
+    Find all pairs of bodies whose spheres touch or overlap.
+
+    Parameters:
+    positions (np.array): Position vectors of all bodies (shape: [n, 3]).
+    radii (np.array): Radii of all bodies (shape: [n]).
+    cell_size (float, optional): Edge length of the hash cells. Defaults to twice the largest
+        radius up to four times the median; bodies larger than half a cell are tested against
+        all others directly. Point bodies touch only where they coincide, so a cell size of 0
+        is replaced by one that spreads the bodies over the cells.
+
+    Returns:
+    np.array: Index pairs (i, j) with i < j, sorted (shape: [k, 2]).
+    """
+    positions = np.asarray(positions, dtype=float)
+    radii = np.asarray(radii, dtype=float)
+    n = len(radii)
+    if n < 2:
+        return np.empty((0, 2), dtype=np.int64)
+    if cell_size is None:
+        # A few huge bodies, like a star among asteroids, must not make every cell huge
+        cell_size = 2 * float(radii[radii <= 4 * np.median(radii)].max())
+    large = radii > 0.5 * cell_size
+    if cell_size <= 0:
+        # About one body per cell; any size finds coincident bodies, since they share a cell
+        extent = float(np.ptp(positions[~large], axis=0).max()) if (~large).any() else 0.0
+        cell_size = extent / np.cbrt(n) or 1.0
+    found = []
+
+    small = np.flatnonzero(~large)
+    if len(small) > 1:
+        # Number the cells of the bounding box, with a margin of one cell, so that every
+        # neighbouring cell is a fixed key offset away; coarser cells keep the keys in range
+        extent = np.ptp(positions[small], axis=0)
+        while np.prod(extent / cell_size + 3) >= _MAX_KEY:
+            cell_size *= 2
+        cells = np.floor((positions[small] - positions[small].min(axis=0)) / cell_size).astype(np.int64) + 1
+        dims = cells.max(axis=0) + 2
+        keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+        order = np.argsort(keys)
+        sorted_keys = keys[order]
+        cell_keys, cell_starts, cell_counts = np.unique(sorted_keys, return_index=True, return_counts=True)
+        for offset in _HALF_NEIGHBOURHOOD:
+            # Sorted keys shifted by a constant stay sorted, which keeps the searches fast
+            neighbour_keys = sorted_keys + (offset[0] * dims[1] + offset[1]) * dims[2] + offset[2]
+            cells_found = np.minimum(np.searchsorted(cell_keys, neighbour_keys), len(cell_keys) - 1)
+            occupied = cell_keys[cells_found] == neighbour_keys
+            starts = cell_starts[cells_found]
+            counts = np.where(occupied, cell_counts[cells_found], 0)
+            first = order[np.repeat(np.arange(len(small)), counts)]
+            second = order[_ranges(starts, counts)]
+            if not offset.any():
+                keep = first < second  # Pairs within a cell are found from both sides
+                first, second = first[keep], second[keep]
+            found.append(np.column_stack((small[first], small[second])))
+
+    # Bodies too large for the cells against everything
+    for index in np.flatnonzero(large):
+        found.append(np.column_stack((np.full(n, index), np.arange(n)))[np.arange(n) != index])
+
+    if not found:
+        return np.empty((0, 2), dtype=np.int64)
+    candidates = np.sort(np.concatenate(found), axis=1)
+    separations = positions[candidates[:, 1]] - positions[candidates[:, 0]]
+    reach = radii[candidates[:, 0]] + radii[candidates[:, 1]]
+    touching = np.einsum('ij,ij->i', separations, separations) <= reach ** 2
+    return np.unique(candidates[touching], axis=0)
+
+
+def collision_groups(pairs, n):
+    """
+    Group bodies that touch directly or through others, e.g. three bodies in a chain.
+
+    Parameters:
+    pairs (np.array): Index pairs of touching bodies (shape: [k, 2]).
+    n (int): Number of bodies.
+
+    Returns:
+    list of np.array: Indices of the bodies of every group with at least two bodies.
+    """
+    roots = np.arange(n)
+
+    def find(index):
+        while roots[index] != index:
+            roots[index] = roots[roots[index]]
+            index = roots[index]
+        return index
+
+    for i, j in pairs.tolist():
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            roots[max(root_i, root_j)] = min(root_i, root_j)
+    members = np.unique(pairs)
+    group_roots = np.array([find(index) for index in members.tolist()], dtype=np.int64)
+    return [members[group_roots == root] for root in np.unique(group_roots)]
+
+
+def merge_groups(state, groups):
+    """
+    Merge every group of bodies into its most massive member and remove the others.
+
+    The merged body keeps the name and color of that member and gets the total mass, the
+    center of mass position and velocity (so momentum is conserved) and the radius of a sphere
+    with the total volume. It orbits the parent of the group's highest member in the hierarchy;
+    satellites of the removed bodies move to it, and analytic ones have their orbits refitted.
+
+    Parameters:
+    state (SystemState): The system the groups belong to.
+    groups (list of np.array): Indices of the bodies of every group.
+
+    Returns:
+    tuple: The merges as (merged body, list of removed bodies) pairs, and the new index of every
+        old row, where removed rows map to their merged body (shape: [n_old]).
+    """
+    bodies = state.bodies
+    positions, velocities, masses, radii = state.positions, state.velocities, state.masses, state.radii
+    depths = physics.hierarchy_depths(state.parents)
+    survivor_of = np.arange(len(state))
+    merges = []
+    for group in groups:
+        survivor = group[np.argmax(masses[group])]
+        total_mass = masses[group].sum()
+        weights = masses[group] / total_mass if total_mass > 0 else np.full(len(group), 1 / len(group))
+        positions[survivor] = weights @ positions[group]
+        velocities[survivor] = weights @ velocities[group]
+        state.position_errors[survivor] = 0.0
+        state.velocity_errors[survivor] = 0.0
+        radii[survivor] = np.cbrt(np.sum(radii[group] ** 3))
+        masses[survivor] = total_mass
+        state.timescales[survivor] = np.inf  # Picked afresh by step_adaptive
+        survivor_of[group] = survivor
+        merges.append((bodies[survivor], [bodies[index] for index in group if index != survivor]))
+
+    # The merged body orbits the parent of the group's highest member, which lies outside the group
+    removed_rows = survivor_of != np.arange(len(state))
+    parents = state.parents
+    for survivor_body, _ in merges:
+        group = np.flatnonzero(survivor_of == survivor_body.index)
+        parent = parents[group[np.argmin(depths[group])]]
+        survivor_body.parent_body = bodies[parent] if parent >= 0 else None
+    # Satellites of removed bodies, including merged bodies whose new parent was removed, are adopted
+    adopted = [bodies[index] for index in np.flatnonzero(~removed_rows & (parents >= 0)
+                                                         & removed_rows[np.maximum(parents, 0)])]
+    for body in adopted:
+        body.parent_body = bodies[survivor_of[parents[body.index]]]
+
+    row_map = np.cumsum(~removed_rows) - 1
+    row_map = row_map[survivor_of]
+    state.remove_bodies([body for _, removed in merges for body in removed])
+    adopted_analytic = [body for body in adopted if body.analytic]
+    if adopted_analytic:
+        physics.set_analytic(state, adopted_analytic)
+    state.accelerations_current = False
+    return merges, row_map
+
+
+def resolve_collisions(state, cell_size=None):
+    """
+    Merge all touching bodies of a system.
+
+    Analytic bodies are test particles on fixed orbits and never collide.
+
+    Parameters:
+    state (SystemState): The system; merged bodies are removed from it.
+    cell_size (float, optional): Edge length of the hash cells, see find_collisions.
+
+    Returns:
+    tuple: The merges as (merged body, list of removed bodies) pairs and the new index of every
+        old row (shape: [n_old]), or None when no bodies touch.
+    """
+    candidates = np.flatnonzero(~state.analytic)
+    pairs = find_collisions(state.positions[candidates], state.radii[candidates], cell_size)
+    if len(pairs) == 0:
+        return None
+    return merge_groups(state, collision_groups(candidates[pairs], len(state)))
@@ -0,0 +1,215 @@
+"""
+Runtime diagnostics of a simulation: conserved quantities, osculating orbits and instability flags.
+
+Diagnostics.observe measures a system every few calls and folds the measurements into streaming
+statistics (first, last, minimum and maximum) instead of storing a history, so it can run for
+the whole length of a simulation. It watches
+
+    energy              relative drift of the total energy of the integrated bodies
+    momentum            change of the total linear momentum, relative to the sum of |m v|
+    angular momentum    relative change of the total angular momentum about the origin
+    semi-major axes     relative change of every integrated satellite's orbit about its parent
+
+and raises a flag as soon as the energy drifts beyond a tolerance, an orbit grows or shrinks
+beyond a tolerance or a satellite is no longer bound to its parent, the usual signs of a
+timestep too large for the speed up. Analytic bodies are test particles on fixed orbits and
+are left out.
+"""
+import numpy as np
+
+import physics
+
+
+def osculating_elements(state, indices=None):
+    """
+    Calculate the osculating orbit of bodies about their parent bodies.
+
+    Unlike kepler.elements_from_state this accepts unbound bodies, which get a negative
+    semi-major axis and an eccentricity of 1 or more.
+
+    Parameters:
+    state (SystemState): The system.
+    indices (np.array, optional): Rows of the bodies, which must all have a parent; defaults to
+        every body with a parent.
+
+    Returns:
+    dict: Arrays (shape: [k]) of the semi-major axes 'a', eccentricities 'e', inclinations 'i'
+        (degrees, to the scene's x-z plane) and specific orbital energies 'energy'.
+    """
+    if indices is None:
+        indices = np.flatnonzero(state.parents >= 0)
+    hosts = state.parents[indices]
+    r = state.positions[indices] - state.positions[hosts]
+    v = state.velocities[indices] - state.velocities[hosts]
+    mu = physics.G * (state.masses[indices] + state.masses[hosts])
+    distances = np.linalg.norm(r, axis=1)
+    angular_momenta = np.cross(r, v)
+    energies = 0.5 * np.einsum('ij,ij->i', v, v) - mu / distances
+    eccentricity_vectors = np.cross(v, angular_momenta) / mu[:, np.newaxis] - r / distances[:, np.newaxis]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        semi_major_axes = -mu / (2 * energies)
+        inclinations = np.degrees(np.arccos(angular_momenta[:, 1] / np.linalg.norm(angular_momenta, axis=1)))
+    return {'a': semi_major_axes, 'e': np.linalg.norm(eccentricity_vectors, axis=1), 'i': inclinations,
+            'energy': energies}
+
+
+def conserved_quantities(state):
+    """
+    Calculate the total energy, linear momentum and angular momentum of the integrated bodies.
+
+    Parameters:
+    state (SystemState): The system.
+
+    Returns:
+    dict: 'energy' (float), 'momentum' and 'angular momentum' (np.array, shape: [3]) and
+        'momentum scale', the sum of |m v| that momentum errors are measured against.
+    """
+    integrated = ~state.analytic
+    positions, velocities = state.positions[integrated], state.velocities[integrated]
+    masses = state.masses[integrated]
+    return {
+        'energy': physics.total_energy(positions, velocities, masses),
+        'momentum': masses @ velocities,
+        'angular momentum': physics.angular_momentum(positions, velocities, masses),
+        'momentum scale': float(masses @ np.linalg.norm(velocities, axis=1)),
+    }
+
+
+class StreamingStatistic:
+    __slots__ = ('first', 'last', 'minimum', 'maximum', 'count')
+
+    def __init__(self):
+        """
+        Initialize a statistic that keeps the first, last, smallest and largest of the values it is given.
+        """
+        self.first = self.last = None
+        self.minimum = np.inf
+        self.maximum = -np.inf
+        self.count = 0
+
+    def update(self, value):
+        if self.count == 0:
+            self.first = value
+        self.last = value
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+        self.count += 1
+
+    def __repr__(self):
+        return f'StreamingStatistic(last={self.last!r}, min={self.minimum!r}, max={self.maximum!r}, n={self.count})'
+
+
+class Diagnostics:
+    def __init__(self, every=10, energy_tolerance=1e-3, axis_tolerance=0.05):
+        """
+        Initialize diagnostics that measure a system on every every-th call of observe.
+
+        Parameters:
+        every (int, optional): Calls of observe per measurement.
+        energy_tolerance (float, optional): Relative energy drift that flags the run.
+        axis_tolerance (float, optional): Relative semi-major axis change that flags a satellite.
+        """
+        self.every = max(1, int(every))
+        self.energy_tolerance = energy_tolerance
+        self.axis_tolerance = axis_tolerance
+        self.calls = 0
+        self.measurements = 0
+        self.time = None  # Simulation time of the latest measurement
+        self.statistics = {}  # Drifts of the conserved quantities by name
+        self.elements = None  # Osculating orbits of the satellites at the latest measurement
+        self.satellites = []  # Bodies the rows of elements belong to
+        self.flags = []  # Descriptions of everything that looked unstable, oldest first
+        self.lines = self.summary()  # Replaced as a whole after every measurement, so other threads can read it
+        self._flagged = set()
+        self._baseline = None
+        self._initial_axes = {}  # Body -> semi-major axis when first seen
+        self._body_count = None
+
+    def reset(self):
+        """
+        Forget all statistics and flags and measure from scratch on the next observe.
+        """
+        self.__init__(self.every, self.energy_tolerance, self.axis_tolerance)
+
+    def observe(self, state):
+        """
+        Count a step of a system and measure it if one is due.
+
+        Parameters:
+        state (SystemState): The system.
+
+        Returns:
+        bool: Whether the system was measured.
+        """
+        self.calls += 1
+        if (self.calls - 1) % self.every:
+            return False
+        self.measure(state)
+        return True
+
+    def measure(self, state):
+        """
+        Measure a system now and update the statistics and flags.
+
+        Parameters:
+        state (SystemState): The system.
+        """
+        quantities = conserved_quantities(state)
+        if self._baseline is None or len(state) != self._body_count:
+            # Merges change the conserved quantities and the survivors' orbits for good, so the
+            # drifts and the orbit changes restart from here
+            self._baseline = quantities
+            self._body_count = len(state)
+            self._initial_axes.clear()
+        baseline = self._baseline
+        drifts = {
+            'energy': abs((quantities['energy'] - baseline['energy']) / baseline['energy'])
+            if baseline['energy'] else 0.0,
+            'momentum': float(np.linalg.norm(quantities['momentum'] - baseline['momentum'])
+                              / max(baseline['momentum scale'], np.finfo(float).tiny)),
+            'angular momentum': float(np.linalg.norm(quantities['angular momentum'] - baseline['angular momentum'])
+                                      / max(np.linalg.norm(baseline['angular momentum']), np.finfo(float).tiny)),
+        }
+        for name, drift in drifts.items():
+            self.statistics.setdefault(f'{name} drift', StreamingStatistic()).update(drift)
+        self.statistics.setdefault('energy', StreamingStatistic()).update(quantities['energy'])
+        if drifts['energy'] > self.energy_tolerance:
+            self._flag('energy', f'energy drifted by {drifts["energy"]:.2e}')
+
+        satellites = np.flatnonzero((state.parents >= 0) & ~state.analytic)
+        self.satellites = [state.bodies[index] for index in satellites]
+        self.elements = osculating_elements(state, satellites)
+        for body, axis, energy in zip(self.satellites, self.elements['a'].tolist(), self.elements['energy'].tolist()):
+            initial_axis = self._initial_axes.setdefault(body, axis)
+            if energy >= 0:
+                self._flag(body, f'{body.p_name} is no longer bound to {body.parent_body.p_name}')
+            elif initial_axis > 0 and abs(axis - initial_axis) > self.axis_tolerance * initial_axis:
+                self._flag(body, f'{body.p_name} orbit changed by {abs(axis / initial_axis - 1):.0%}')
+        self.measurements += 1
+        self.time = state.time
+        self.lines = self.summary()
+
+    def _flag(self, key, message):
+        # Every quantity and body is flagged once, so the list stays short
+        if key not in self._flagged:
+            self._flagged.add(key)
+            self.flags.append(message)
+
+    @property
+    def stable(self):
+        """bool: Whether nothing has been flagged so far."""
+        return not self.flags
+
+    def summary(self):
+        """
+        Return a few lines describing the latest measurement and the flags.
+        """
+        if not self.measurements:
+            return ['no measurements yet']
+        lines = [f'{name}: {statistic.last:.2e} (max {statistic.maximum:.2e})'
+                 for name, statistic in self.statistics.items() if name.endswith(' drift')]
+        if self.elements is not None and len(self.satellites):
+            eccentricities = self.elements['e']
+            lines.append(f'{len(self.satellites)} orbits, e max {eccentricities.max():.3f}')
+        lines.extend(f'! {flag}' for flag in self.flags)
+        return lines
@@ -0,0 +1,383 @@
+"""
+Parameter sweeps and perturbed-initial-condition ensembles of headless simulations.
+
+An ensemble starts from one scenario and runs one independent simulation per variant: every
+combination of the swept parameters, each repeated with randomly perturbed initial conditions
+when perturbations are asked for. The variants run in a pool of worker processes, one per CPU
+core by default. The base system is copied into shared memory once; every worker maps it
+read-only and only receives the few parameters of each variant.
+
+Each run reports
+    energy_error           relative change of the total energy of the integrated bodies
+    min_distance           smallest distance between two integrated bodies seen at any sample
+    max_axis_change        largest relative change of a satellite's semi-major axis about its parent
+    unbound                number of satellites no longer bound to their parent at the end
+    merged                 number of bodies lost in collisions
+    stable                 no satellite unbound or merged and max_axis_change below the tolerance
+
+Sweepable parameters of a body, written BODY.FIELD: mass, radius, mass_factor, speed_factor
+(scales the velocity relative to the parent) and distance_factor (scales the distance to the
+parent). The last two move the body's satellites along with it. The time step is swept as dt.
+"""
+import csv
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import backends
+import collisions
+import diagnostics
+import physics
+from scenario import STATE_ARRAYS, state_from_arrays, state_to_arrays
+
+BODY_FIELDS = ('mass', 'radius', 'mass_factor', 'speed_factor', 'distance_factor')
+METRICS = ('energy_error', 'min_distance', 'max_axis_change', 'unbound', 'merged', 'stable')
+INTEGRATORS = ('verlet', 'hierarchical', 'adaptive')
+
+# Arrays that stay in the pickled part of the shared system, since they are not numeric
+_PICKLED_ARRAYS = ('names',)
+
+_shared = None  # The base system as mapped by a worker process
+
+
+def parse_sweep(text):
+    """
+    Parse a sweep given as NAME=start:stop:count or NAME=value,value,...
+
+    Parameters:
+    text (str): The sweep, e.g. 'Earth.speed_factor=0.9:1.1:5' or 'dt=250,500'.
+
+    Returns:
+    tuple: The parameter name and the list of its values.
+    """
+    name, _, values = text.partition('=')
+    if not values:
+        raise ValueError(f'Expected NAME=VALUES in sweep {text!r}.')
+    if name != 'dt':
+        body, _, field = name.rpartition('.')
+        if not body or field not in BODY_FIELDS:
+            raise ValueError(f"Unknown parameter {name!r}; use dt or BODY.FIELD with FIELD in {', '.join(BODY_FIELDS)}.")
+    if ':' in values:
+        start, stop, count = values.split(':')
+        return name, np.linspace(float(start), float(stop), int(count)).tolist()
+    return name, [float(value) for value in values.split(',')]
+
+
+def make_variants(sweeps, perturbations=0):
+    """
+    List every combination of the swept values, each repeated perturbations times if any.
+
+    Parameters:
+    sweeps (list of tuple): Parameter names and their values, as returned by parse_sweep.
+    perturbations (int, optional): Number of perturbed copies of every combination; 0 for none.
+
+    Returns:
+    list of dict: The parameters of every variant; 'perturbation' numbers the perturbed copies.
+    """
+    names = [name for name, _ in sweeps]
+    variants = []
+    for values in itertools.product(*(values for _, values in sweeps)):
+        for perturbation in range(max(perturbations, 1)):
+            variant = dict(zip(names, values))
+            if perturbations:
+                variant['perturbation'] = perturbation
+            variants.append(variant)
+    return variants
+
+
+def make_integrator(name, backend_name=backends.DEFAULT_BACKEND):
+    """
+    Return the function advancing (state, delta_time) for an integrator and physics backend.
+    """
+    if name == 'adaptive':
+        return physics.step_adaptive
+    backend = backends.load_backend(backend_name)
+    if name == 'hierarchical':
+        return partial(physics.step_hierarchical, solver=backend.calculate_accelerations)
+    if name == 'verlet':
+        return backend.step
+    raise ValueError(f'Unknown integrator {name!r}.')
+
+
+def share_state(state):
+    """
+    Copy the numeric arrays of a system into a new shared memory block.
+
+    Parameters:
+    state (SystemState): The system to share.
+
+    Returns:
+    tuple: The SharedMemory block, which the caller must close and unlink, and a picklable
+        description of its layout for attach_state.
+    """
+    arrays = state_to_arrays(state)
+    layout = []
+    size = 0
+    for name in STATE_ARRAYS:
+        if name in _PICKLED_ARRAYS:
+            continue
+        array = arrays[name]
+        layout.append((name, array.dtype.str, array.shape, size))
+        size += -(-array.nbytes // 8) * 8  # Keep every array 8-byte aligned
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for name, dtype, shape, offset in layout:
+        np.ndarray(shape, dtype, buffer=block.buf, offset=offset)[...] = arrays[name]
+    pickled = {name: arrays[name] for name in _PICKLED_ARRAYS}
+    return block, (block.name, layout, pickled)
+
+
+def attach_state(description):
+    """
+    Map a system shared with share_state, read-only.
+
+    Parameters:
+    description (tuple): The layout returned by share_state.
+
+    Returns:
+    tuple: The SharedMemory block, to keep open while the arrays are used, and the arrays.
+    """
+    name, layout, pickled = description
+    block = shared_memory.SharedMemory(name=name)
+    arrays = dict(pickled)
+    for array_name, dtype, shape, offset in layout:
+        array = np.ndarray(shape, dtype, buffer=block.buf, offset=offset)
+        array.flags.writeable = False
+        arrays[array_name] = array
+    return block, arrays
+
+
+def _initialize_worker(description):
+    global _shared
+    _shared = attach_state(description)
+
+
+def check_variants(state, variants):
+    """
+    Raise a ValueError if a variant changes a body the system does not have.
+    """
+    names = {body.p_name for body in state.bodies}
+    for name in {name for variant in variants for name in variant if name not in ('dt', 'perturbation')}:
+        body_name = name.rpartition('.')[0]
+        if body_name not in names:
+            raise ValueError(f'The scenario has no body named {body_name!r}.')
+
+
+def _subtree(parents, index):
+    # Row of a body followed by the rows of all its satellites, their satellites and so on
+    inside = np.arange(len(parents)) == index
+    ancestors = np.array(parents, dtype=np.int64)
+    while True:
+        has_ancestor = ancestors >= 0
+        if not has_ancestor.any():
+            return np.flatnonzero(inside)
+        inside[has_ancestor] |= ancestors[has_ancestor] == index
+        ancestors[has_ancestor] = parents[ancestors[has_ancestor]]
+
+
+def _change_body(body, field, value):
+    # Moving or accelerating a body carries its satellites along, so their orbits about it are kept
+    parent = body.parent_body
+    state = body.state
+    if field == 'mass':
+        body.mass = value
+    elif field == 'radius':
+        body.radius = value
+    elif field == 'mass_factor':
+        body.mass = body.mass * value
+    elif field == 'speed_factor':
+        reference = parent.velocity if parent is not None else np.zeros(3)
+        state.velocities[_subtree(state.parents, body.index)] += (value - 1) * (body.velocity - reference)
+    elif field == 'distance_factor':
+        reference = parent.position if parent is not None else np.zeros(3)
+        state.positions[_subtree(state.parents, body.index)] += (value - 1) * (body.position - reference)
+
+
+def apply_variant(state, variant, position_sigma=0.0, velocity_sigma=0.0, seed=0):
+    """
+    Change a system according to the parameters of a variant.
+
+    Parameters:
+    state (SystemState): The system to change in place.
+    variant (dict): Parameter values keyed by name, see make_variants.
+    position_sigma (float, optional): Standard deviation of the position perturbations.
+    velocity_sigma (float, optional): Standard deviation of the velocity perturbations.
+    seed (int, optional): Seed combined with the perturbation number.
+
+    Returns:
+    float or None: The time step of the variant, if it sets one.
+    """
+    bodies_by_name = {body.p_name: body for body in state.bodies}
+    changes = []
+    for name, value in variant.items():
+        if name in ('dt', 'perturbation'):
+            continue
+        body_name, _, field = name.rpartition('.')
+        if body_name not in bodies_by_name:
+            raise ValueError(f'The scenario has no body named {body_name!r}.')
+        changes.append((bodies_by_name[body_name], field, value))
+
+    # Integrated bodies change first; analytic bodies then follow their moved parents before
+    # their own changes apply, and are refitted to the new masses at the end
+    for body, field, value in changes:
+        if not body.analytic:
+            _change_body(body, field, value)
+    if 'perturbation' in variant and (position_sigma or velocity_sigma):
+        rng = np.random.default_rng([seed, int(variant['perturbation'])])
+        integrated = ~state.analytic
+        state.positions[integrated] += rng.normal(0.0, position_sigma, (integrated.sum(), 3))
+        state.velocities[integrated] += rng.normal(0.0, velocity_sigma, (integrated.sum(), 3))
+    if state.analytic.any():
+        physics.propagate_analytic(state, state.time)
+        for body, field, value in changes:
+            if body.analytic:
+                _change_body(body, field, value)
+        physics.set_analytic(state, [state.bodies[index] for index in np.flatnonzero(state.analytic)])
+    state.accelerations_current = False
+    return variant.get('dt')
+
+
+def _orbits(state, bodies):
+    # Semi-major axis and specific orbital energy of every body about its parent
+    elements = diagnostics.osculating_elements(state, np.array([body.index for body in bodies], dtype=np.int64))
+    return elements['a'], elements['energy']
+
+
+def _min_distance(positions, below=np.inf, block_elements=2 ** 20):
+    # Smallest distance between two of the positions, or below if none are closer. Once a finite
+    # bound is known only pairs within it can matter, and the spatial hash of collisions.py finds
+    # those in O(n) time; otherwise rows are compared in blocks to keep the memory use bounded.
+    n = len(positions)
+    if n < 2:
+        return below
+    if np.isfinite(below):
+        pairs = collisions.find_collisions(positions, np.full(n, 0.5 * below))
+        if len(pairs) == 0:
+            return below
+        separations = positions[pairs[:, 1]] - positions[pairs[:, 0]]
+        return min(below, float(np.sqrt(np.einsum('ij,ij->i', separations, separations).min())))
+    rows = max(1, block_elements // n)
+    smallest_squared = np.inf
+    for start in range(0, n - 1, rows):
+        stop = min(start + rows, n - 1)
+        # Every row of the block against all later rows
+        separations = positions[start + 1:, np.newaxis, :] - positions[np.newaxis, start:stop, :]
+        distances_squared = np.einsum('ijk,ijk->ij', separations, separations)
+        later = np.arange(start + 1, n)[:, np.newaxis] > np.arange(start, stop)[np.newaxis, :]
+        smallest_squared = min(smallest_squared, float(distances_squared[later].min()))
+    return min(below, float(np.sqrt(smallest_squared)))
+
+
+def run_variant(arrays, variant, steps, dt, integrator, collide=False, sample_every=1, axis_tolerance=0.1,
+                position_sigma=0.0, velocity_sigma=0.0, seed=0):
+    """
+    Integrate one variant of a system and measure how it behaved.
+
+    Parameters:
+    arrays (dict): The base system, as returned by scenario.state_to_arrays.
+    variant (dict): Parameter values of the variant, see make_variants.
+    steps (int): Number of steps.
+    dt (float): Time step (s), unless the variant sweeps dt.
+    integrator (callable): Function advancing (state, delta_time).
+    collide (bool, optional): Whether touching bodies merge, see collisions.py.
+    sample_every (int, optional): Steps between measurements of the closest approach.
+    axis_tolerance (float, optional): Largest relative semi-major axis change of a stable run.
+    position_sigma (float, optional): Standard deviation of the position perturbations.
+    velocity_sigma (float, optional): Standard deviation of the velocity perturbations.
+    seed (int, optional): Seed of the perturbations.
+
+    Returns:
+    dict: The variant's parameters followed by the metrics in METRICS.
+    """
+    state = state_from_arrays(arrays, accelerations_current=False)
+    dt = apply_variant(state, variant, position_sigma, velocity_sigma, seed) or dt
+    integrated = np.flatnonzero(~state.analytic)
+    initial_energy = physics.total_energy(state.positions[integrated], state.velocities[integrated],
+                                          state.masses[integrated])
+    satellites = [state.bodies[index] for index in integrated if state.parents[index] >= 0]
+    initial_axes, _ = _orbits(state, satellites) if satellites else (np.empty(0), None)
+
+    bodies = len(state)
+    min_distance = _min_distance(state.positions[integrated])
+    for step_index in range(1, steps + 1):
+        integrator(state, dt)
+        if collide:
+            collisions.resolve_collisions(state)
+        if step_index % sample_every == 0:
+            integrated = np.flatnonzero(~state.analytic)
+            min_distance = _min_distance(state.positions[integrated], min_distance)
+
+    integrated = np.flatnonzero(~state.analytic)
+    energy = physics.total_energy(state.positions[integrated], state.velocities[integrated], state.masses[integrated])
+    remaining = [index for index, body in enumerate(satellites)
+                 if body.state is state and state.parents[body.index] >= 0]
+    if remaining:
+        axes, energies = _orbits(state, [satellites[index] for index in remaining])
+        unbound = int(np.sum(energies >= 0))
+        bound = energies < 0
+        axis_changes = np.abs(axes[bound] - initial_axes[remaining][bound]) / initial_axes[remaining][bound]
+        max_axis_change = float(axis_changes.max()) if len(axis_changes) else 0.0
+    else:
+        unbound, max_axis_change = 0, 0.0
+    merged = bodies - len(state)
+    result = dict(variant)
+    result.update(energy_error=float(abs((energy - initial_energy) / initial_energy)) if initial_energy else 0.0,
+                  min_distance=min_distance,
+                  max_axis_change=max_axis_change,
+                  unbound=unbound,
+                  merged=merged,
+                  stable=unbound == 0 and merged == 0 and max_axis_change < axis_tolerance)
+    return result
+
+
+def _run_shared_variant(variant, integrator_name, backend_name, **options):
+    return run_variant(_shared[1], variant, integrator=make_integrator(integrator_name, backend_name), **options)
+
+
+def run_ensemble(state, variants, steps, dt, integrator='hierarchical', backend=backends.DEFAULT_BACKEND,
+                 workers=None, **options):
+    """
+    Run every variant of a system in a pool of worker processes.
+
+    Parameters:
+    state (SystemState): The base system; it is not changed.
+    variants (list of dict): Parameters of the variants, see make_variants.
+    steps (int): Number of steps of every run.
+    dt (float): Time step (s), unless a variant sweeps dt.
+    integrator (str, optional): One of INTEGRATORS.
+    backend (str, optional): Physics backend of the verlet and hierarchical integrators.
+    workers (int, optional): Number of worker processes; defaults to the number of CPU cores.
+    **options: Further keyword arguments of run_variant, e.g. collide or velocity_sigma.
+
+    Yields:
+    dict: The result of every variant, in the order of variants.
+    """
+    check_variants(state, variants)  # Fail here rather than once in every worker
+    block, description = share_state(state)
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_initialize_worker,
+                                 initargs=(description,)) as pool:
+            run = partial(_run_shared_variant, integrator_name=integrator, backend_name=backend, steps=steps, dt=dt,
+                          **options)
+            yield from pool.map(run, variants)
+    finally:
+        block.close()
+        block.unlink()
+
+
+def write_csv(results, path):
+    """
+    Write ensemble results as a CSV table with one row per variant.
+
+    Parameters:
+    results (list of dict): Results of run_ensemble.
+    path (str): File to write.
+    """
+    columns = [name for name in results[0] if name not in METRICS] + list(METRICS) if results else list(METRICS)
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(results)
@@ -1,10 +1,11 @@
 import numpy as np
-from OpenGL.GL import *
-from OpenGL.GLU import *
-from physics import calculate_acceleration, update_position, update_velocity
+
+from entity.system_state import SystemState
 
 
 class CelestialBody:
+    __slots__ = ('p_name', 'color', '_parent_body', '_state', '_index')
+
     def __init__(self,
                  p_name,
                  radius,
@@ -13,10 +14,14 @@ class CelestialBody:
                  initial_position=np.array([0, 0, 0]),
                  initial_velocity=np.array([0, 0, 0]),
                  initial_acceleration=np.array([0, 0, 0]),
-                 parent_body=None):
+                 parent_body=None,
+                 state=None):
         """
         Initialize a celestial body.
 
+        The body does not own its position, velocity, acceleration, mass and radius; they live in
+        a row of a SystemState and the corresponding attributes read and write that row in place.
+
         Parameters:
         b_name (str): Name of the celestial body.
         radius (float): Radius of the celestial body (m).
@@ -26,41 +31,116 @@ class CelestialBody:
         initial_velocity (np.array, optional): Initial velocity vector of the celestial body (shape: [3]).
         initial_acceleration (np.array, optional): Initial acceleration vector of the celestial body (shape: [3]).
         parent_body (CelestialBody, optional): Parent body of the celestial body.
+        state (SystemState, optional): System to add the body to. A private single-body state is
+            created if omitted.
         """
         self.p_name = p_name
-        self.radius = radius
-        self.mass = mass
-        self.position = initial_position
-        self.velocity = initial_velocity
-        self.acceleration = initial_acceleration
-        self.parent_body = parent_body
+        self._parent_body = parent_body
         self.color = color
+        if state is None:
+            state = SystemState(capacity=1)
+        state.add_body(self, initial_position, initial_velocity, initial_acceleration, mass, radius)
+
+    @property
+    def state(self):
+        return self._state
+
+    @property
+    def index(self):
+        return self._index
+
+    @property
+    def parent_body(self):
+        return self._parent_body
+
+    @parent_body.setter
+    def parent_body(self, value):
+        self._parent_body = value
+        self._state._parents[self._index] = self._state.index_of(value)
+
+    @property
+    def analytic(self):
+        # Set with physics.set_analytic; analytic bodies follow a fixed Kepler orbit about their parent
+        return bool(self._state._analytic[self._index])
+
+    @property
+    def position(self):
+        return self._state._positions[self._index]
+
+    @position.setter
+    def position(self, value):
+        self._state._positions[self._index] = value
+        self._state._position_errors[self._index] = 0.0
+        self._state.accelerations_current = False
+
+    @property
+    def velocity(self):
+        return self._state._velocities[self._index]
+
+    @velocity.setter
+    def velocity(self, value):
+        self._state._velocities[self._index] = value
+        self._state._velocity_errors[self._index] = 0.0
+
+    @property
+    def acceleration(self):
+        return self._state._accelerations[self._index]
 
-    def draw(self):
+    @acceleration.setter
+    def acceleration(self, value):
+        self._state._accelerations[self._index] = value
+
+    @property
+    def mass(self):
+        return self._state._masses[self._index]
+
+    @mass.setter
+    def mass(self, value):
+        self._state._masses[self._index] = value
+        self._state.accelerations_current = False
+
+    @property
+    def radius(self):
+        return self._state._radii[self._index]
+
+    @radius.setter
+    def radius(self, value):
+        self._state._radii[self._index] = value
+
+    def move_to(self, state):
         """
-        Render the celestial body using OpenGL.
+        Move the body into another system, carrying its current values along.
+
+        Parameters:
+        state (SystemState): The system to add the body to.
         """
-        glColor3fv(self.color)
-        quad = gluNewQuadric()
-        glPushMatrix()
-        glTranslatef(*self.position)
-        gluSphere(quad, self.radius, 32, 32)
-        glPopMatrix()
+        if state is self._state:
+            return
+        old_state = self._state
+        i = self._index
+        position, velocity = old_state._positions[i].copy(), old_state._velocities[i].copy()
+        acceleration, mass, radius = old_state._accelerations[i].copy(), old_state._masses[i], old_state._radii[i]
+        old_state.remove_body(self)
+        state.add_body(self, position, velocity, acceleration, mass, radius)
 
-    def update(self, delta_time: float, masses, positions):
+    def draw(self, position=None, slices=32, stacks=32):
         """
-        Update the celestial body's position and velocity.
+        Render the celestial body using OpenGL.
+
+        The sphere geometry comes from a shared cache of display lists, so drawing a body only
+        issues a transform and a call of the cached mesh.
 
         Parameters:
-        delta_time (float): The time step for the update (s).
-        masses (np.array): Array of masses of all other celestial bodies (shape: [n]).
-        positions (np.array): Array of position vectors of all other celestial bodies (shape: [n, 3]).
+        position (np.array, optional): Position to draw the body at (shape: [3]), e.g. from a
+            simulation snapshot. Defaults to the body's current position.
+        slices (int, optional): Tessellation of the sphere around its axis.
+        stacks (int, optional): Tessellation of the sphere along its axis.
         """
-        new_acceleration = calculate_acceleration(self.mass, self.position, masses, positions)
-        self.velocity = update_velocity(self.velocity, self.acceleration, new_acceleration, delta_time)
-        self.position = update_position(self.position, self.velocity, self.acceleration, delta_time)
-        self.acceleration = new_acceleration
-
-    def log(self):
-        print(
-            f'Name: {self.p_name}, Position: {self.position}, Velocity: {self.velocity}, Acceleration: {self.acceleration}')
+        # Imported here so that pure physics code can use bodies without an OpenGL installation
+        from OpenGL.GL import glColor3fv
+        from render.sphere_mesh import draw_sphere
+
+        if position is None:
+            position = self.position
+        glColor3fv(self.color)
+        draw_sphere(position, self.radius, slices, stacks)
@@ -0,0 +1,255 @@
+import numpy as np
+
+from kepler import ELEMENT_COUNT
+
+# Per-body buffers: attribute name, shape of one row and dtype
+_BUFFERS = (
+    ('_positions', (3,), float),
+    ('_velocities', (3,), float),
+    ('_accelerations', (3,), float),
+    ('_masses', (), float),
+    ('_radii', (), float),
+    ('_timescales', (), float),
+    ('_parents', (), np.int64),
+    ('_analytic', (), bool),
+    ('_elements', (ELEMENT_COUNT,), float),
+    ('_position_errors', (3,), float),
+    ('_velocity_errors', (3,), float),
+)
+
+
+class SystemState:
+    def __init__(self, capacity=16):
+        """
+        Initialize an empty structure-of-arrays container for the state of a system of bodies.
+
+        The positions, velocities and accelerations of all bodies are stored in contiguous
+        float64 buffers of shape [capacity, 3]; their masses, radii, timescales, the indices of
+        their parent bodies and analytic flags are stored in buffers of shape [capacity].
+        Only the first len(self) rows are in use; the buffers double in size when full so that
+        adding many bodies costs amortized O(1) per body.
+
+        Parameters:
+        capacity (int, optional): Number of bodies to reserve space for up front.
+        """
+        capacity = max(1, capacity)
+        for name, shape, dtype in _BUFFERS:
+            setattr(self, name, np.zeros((capacity,) + shape, dtype=dtype))
+        self.bodies = []
+        self.time = 0.0
+        self.accelerations_current = False  # Whether the accelerations match the current positions
+
+    def __len__(self):
+        return len(self.bodies)
+
+    @property
+    def capacity(self):
+        return len(self._masses)
+
+    @property
+    def positions(self):
+        """np.array: Position vectors of all bodies (shape: [n, 3]), a view into the buffer."""
+        return self._positions[:len(self)]
+
+    @property
+    def velocities(self):
+        """np.array: Velocity vectors of all bodies (shape: [n, 3]), a view into the buffer."""
+        return self._velocities[:len(self)]
+
+    @property
+    def accelerations(self):
+        """np.array: Acceleration vectors of all bodies (shape: [n, 3]), a view into the buffer."""
+        return self._accelerations[:len(self)]
+
+    @property
+    def masses(self):
+        """np.array: Masses of all bodies (shape: [n]), a view into the buffer."""
+        return self._masses[:len(self)]
+
+    @property
+    def radii(self):
+        """np.array: Radii of all bodies (shape: [n]), a view into the buffer."""
+        return self._radii[:len(self)]
+
+    @property
+    def timescales(self):
+        """np.array: Dynamical timescales that physics.step_adaptive picks timesteps from (shape: [n])."""
+        return self._timescales[:len(self)]
+
+    @property
+    def parents(self):
+        """np.array: Index of every body's parent body in this system, or -1 for none (shape: [n])."""
+        return self._parents[:len(self)]
+
+    @property
+    def analytic(self):
+        """np.array: Whether every body follows a fixed Kepler orbit about its parent (shape: [n])."""
+        return self._analytic[:len(self)]
+
+    @property
+    def elements(self):
+        """np.array: Orbital elements of the analytic bodies, see kepler.py (shape: [n, ELEMENT_COUNT])."""
+        return self._elements[:len(self)]
+
+    @property
+    def position_errors(self):
+        """np.array: Low-order parts of the positions kept by compensated integration, see physics.step (shape: [n, 3])."""
+        return self._position_errors[:len(self)]
+
+    @property
+    def velocity_errors(self):
+        """np.array: Low-order parts of the velocities kept by compensated integration (shape: [n, 3])."""
+        return self._velocity_errors[:len(self)]
+
+    def reserve(self, capacity):
+        """
+        Grow the buffers so that they can hold at least the given number of bodies.
+
+        Views previously returned by the buffer properties (or by CelestialBody.position and
+        friends) keep pointing at the old buffers after a reallocation.
+
+        Parameters:
+        capacity (int): Minimum number of bodies the buffers must be able to hold.
+        """
+        if capacity <= self.capacity:
+            return
+        new_capacity = max(capacity, 2 * self.capacity)
+        n = len(self)
+        for name, shape, dtype in _BUFFERS:
+            old = getattr(self, name)
+            new = np.zeros((new_capacity,) + shape, dtype=dtype)
+            new[:n] = old[:n]
+            setattr(self, name, new)
+
+    def add_body(self, body, position, velocity, acceleration, mass, radius=0.0):
+        """
+        Append a body to the system and bind it to its row in the buffers.
+
+        Parameters:
+        body (CelestialBody): The body to add.
+        position (np.array): Position vector of the body (shape: [3]).
+        velocity (np.array): Velocity vector of the body (shape: [3]).
+        acceleration (np.array): Acceleration vector of the body (shape: [3]).
+        mass (float): Mass of the body.
+        radius (float, optional): Radius of the body.
+
+        Returns:
+        int: Index of the body in the buffers.
+        """
+        index = len(self)
+        self.reserve(index + 1)
+        self._positions[index] = position
+        self._velocities[index] = velocity
+        self._accelerations[index] = acceleration
+        self._masses[index] = mass
+        self._radii[index] = radius
+        self._timescales[index] = np.inf
+        self._parents[index] = self.index_of(body.parent_body)
+        self._analytic[index] = False
+        self._position_errors[index] = 0.0
+        self._velocity_errors[index] = 0.0
+        self.bodies.append(body)
+        body._state = self
+        body._index = index
+        self.accelerations_current = False
+        return index
+
+    def remove_bodies(self, bodies):
+        """
+        Remove bodies from the system, compacting the buffers while preserving the order of the rest.
+
+        The removed bodies are detached into private single-body states that keep their last values.
+
+        Parameters:
+        bodies (iterable of CelestialBody): The bodies to remove.
+        """
+        removed = np.zeros(len(self), dtype=bool)
+        for body in bodies:
+            if body._state is not self:
+                raise ValueError(f"{body.p_name} is not part of this system.")
+            removed[body._index] = True
+        if not removed.any():
+            return
+
+        kept = np.flatnonzero(~removed)
+        detached = [self.bodies[i] for i in np.flatnonzero(removed)]
+        for body in detached:
+            i = body._index
+            SystemState(capacity=1).add_body(body, self._positions[i], self._velocities[i],
+                                             self._accelerations[i], self._masses[i], self._radii[i])
+
+        n = len(kept)
+        for name, _, _ in _BUFFERS:
+            buffer = getattr(self, name)
+            buffer[:n] = buffer[kept]
+        # Renumber the parent indices; satellites of removed bodies lose their parent
+        new_indices = np.where(removed, -1, np.cumsum(~removed) - 1)
+        parents = self._parents[:n]
+        parents[parents >= 0] = new_indices[parents[parents >= 0]]
+        self._analytic[:n] &= parents >= 0  # An analytic orbit needs its parent
+        self.accelerations_current = False
+        first_removed = int(np.argmax(removed))
+        self.bodies[:] = [self.bodies[i] for i in kept]
+        for index in range(first_removed, n):
+            self.bodies[index]._index = index
+
+    def subset(self, indices):
+        """
+        Copy some rows of the buffers into a new system, e.g. to integrate only part of the bodies.
+
+        The bodies stay bound to this system; write the results back with update_from_subset.
+
+        Parameters:
+        indices (np.array): Indices of the bodies to copy, in increasing order.
+
+        Returns:
+        SystemState: A system holding copies of the rows, with parent indices renumbered.
+        """
+        subset = SystemState(capacity=len(indices))
+        for name, _, _ in _BUFFERS:
+            getattr(subset, name)[:len(indices)] = getattr(self, name)[indices]
+        new_indices = np.full(len(self), -1, dtype=np.int64)
+        new_indices[indices] = np.arange(len(indices))
+        parents = subset._parents[:len(indices)]
+        parents[parents >= 0] = new_indices[parents[parents >= 0]]
+        subset.bodies = [self.bodies[i] for i in indices]
+        subset.time = self.time
+        subset.accelerations_current = self.accelerations_current
+        return subset
+
+    def update_from_subset(self, indices, subset):
+        """
+        Copy the evolved state of a subset created by subset back into this system.
+
+        Parameters:
+        indices (np.array): The indices the subset was created from.
+        subset (SystemState): The subset.
+        """
+        for name in ('_positions', '_velocities', '_accelerations', '_timescales', '_position_errors',
+                     '_velocity_errors'):
+            getattr(self, name)[indices] = getattr(subset, name)[:len(indices)]
+        self.time = subset.time
+        self.accelerations_current = subset.accelerations_current
+
+    def index_of(self, body):
+        """
+        Return the index of a body in this system.
+
+        Parameters:
+        body (CelestialBody): The body to look up; may be None.
+
+        Returns:
+        int: Index of the body in the buffers, or -1 if it is None or part of another system.
+        """
+        if body is None or body._state is not self:
+            return -1
+        return body._index
+
+    def remove_body(self, body):
+        """
+        Remove a single body from the system.
+
+        Parameters:
+        body (CelestialBody): The body to remove.
+        """
+        self.remove_bodies([body])
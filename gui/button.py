@@ -1,5 +1,31 @@
 import pygame
 
+_font = None
+_labels = {}
+_MAX_CACHED_LABELS = 1024
+
+
+def get_font():
+    """
+    Return the font shared by all buttons, loading it on first use.
+    """
+    global _font
+    if _font is None:
+        _font = pygame.font.Font(None, 24)
+    return _font
+
+
+def get_label(text):
+    """
+    Return the rendered surface of a text, rendering it only the first time it is asked for.
+    """
+    label = _labels.get(text)
+    if label is None:
+        if len(_labels) >= _MAX_CACHED_LABELS:
+            _labels.clear()
+        label = _labels[text] = get_font().render(text, True, (0, 0, 0))
+    return label
+
 
 class Button:
     def __init__(self, text, position, size, celestial_body, indent_level, color=(255, 255, 255), border_color=(0, 0, 0), border_width=2):
@@ -12,7 +38,13 @@ class Button:
         self.border_color = border_color
         self.border_width = border_width
 
-    def draw(self, surface):
+    def bind(self, celestial_body, indent_level):
+        # Buttons are recycled for whichever body scrolls into their row
+        self.text = celestial_body.p_name
+        self.celestial_body = celestial_body
+        self.indent_level = indent_level
+
+    def draw(self, surface, color=None):
         # Adjust the x-coordinate of the button's position based on its level of indentation
         position = (self.position[0] + self.indent_level * 10, self.position[1])
         # Draw the button (border)
@@ -20,17 +52,6 @@ class Button:
         # Draw another rectangle inside the button for the inner color
         inner_pos = (position[0] + self.border_width, position[1] + self.border_width)
         inner_size = (self.size[0] - 2 * self.border_width, self.size[1] - 2 * self.border_width)
-        pygame.draw.rect(surface, self.color, pygame.Rect(inner_pos, inner_size))
-        # Render the text
-        font = pygame.font.Font(None, 24)
-        text = font.render(self.text, True, (0, 0, 0))
-        surface.blit(text, (position[0] + 10, position[1] + 10))
-
-    def is_clicked(self, mouse_pos, event, gui_manager):
-        if event.type == pygame.MOUSEBUTTONDOWN:
-            if event.button == 1:  # Left mouse button
-                x, y = mouse_pos
-                if self.position[0] <= x <= self.position[0] + self.size[0] and self.position[1] <= y <= self.position[1] + self.size[1]:
-                    gui_manager.target_body = self.celestial_body
-                    return True
-        return False
+        pygame.draw.rect(surface, color or self.color, pygame.Rect(inner_pos, inner_size))
+        # Draw the cached text
+        surface.blit(get_label(self.text), (position[0] + 10, position[1] + 10))
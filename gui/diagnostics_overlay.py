@@ -0,0 +1,39 @@
+from gui.text_overlay import TextOverlay
+
+WARNING_COLOR = (255, 120, 100)
+
+
+class DiagnosticsOverlay(TextOverlay):
+    size = (300, 170)
+    corner = 'bottom left'
+
+    def __init__(self, diagnostics):
+        """
+        Initialize an overlay that shows the conservation errors and instability flags of a simulation.
+
+        Parameters:
+        diagnostics (Diagnostics): The diagnostics whose latest measurement is shown.
+        """
+        super().__init__()
+        self.diagnostics = diagnostics
+        self._flag_count = 0
+
+    def lines(self):
+        return self.diagnostics.lines
+
+    def line_color(self, line):
+        return WARNING_COLOR if line.startswith('!') else (255, 255, 255)
+
+    def new_flags(self):
+        """
+        Return the flags raised since the last call, e.g. to show the overlay when something goes wrong.
+        """
+        flags = self.diagnostics.flags
+        new, self._flag_count = flags[self._flag_count:], len(flags)
+        return new
+
+    def reset(self):
+        """
+        Forget the flags seen so far; call after resetting the diagnostics, e.g. when rewinding.
+        """
+        self._flag_count = 0
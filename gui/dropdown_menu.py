@@ -1,61 +1,223 @@
-import numpy as np
+import bisect
+
 import pygame
-from OpenGL.GL import *
 
-from gui.button import Button
+from gui.button import Button, get_font
+
+MENU_SIZE = (200, 200)
+MENU_POSITION = (10, 10)  # Top-left corner of the menu on screen, see GuiManager.draw
+ROW_TOP = 20
+ROW_HEIGHT = 30
+VISIBLE_ROWS = (MENU_SIZE[1] - ROW_TOP) // ROW_HEIGHT
+SELECTED_COLOR = (255, 230, 120)
+HOVER_COLOR = (210, 225, 255)
+
 
+def get_indent_level(celestial_body, cache=None):
+    """
+    Return the depth of a body in the parent hierarchy, memoizing the depth of every ancestor.
 
-def get_indent_level(celestial_body):
-    level = 0
-    while celestial_body.parent_body is not None:
+    Parameters:
+    celestial_body (CelestialBody): The body to measure.
+    cache (dict, optional): Depths keyed by id(body), shared between calls.
+
+    Returns:
+    int: 0 for bodies without a parent, 1 for their satellites and so on.
+    """
+    if cache is None:
+        cache = {}
+    chain = []
+    body = celestial_body
+    while body is not None and id(body) not in cache:
+        chain.append(body)
+        body = body.parent_body
+    level = cache[id(body)] if body is not None else -1
+    for body in reversed(chain):
         level += 1
-        celestial_body = celestial_body.parent_body
-    return level
+        cache[id(body)] = level
+    return cache[id(celestial_body)]
 
 
 class DropdownMenu:
     def __init__(self, celestial_bodies, gui_manager):
-        self.celestial_bodies = celestial_bodies
+        """
+        Initialize the target selector.
+
+        The list is virtualized: only VISIBLE_ROWS buttons exist, and they are rebound to
+        whichever bodies are scrolled into view. A mouse position maps straight to a row index,
+        and typing after pressing / jumps to the first body whose name starts with the query.
+        """
         self.gui_manager = gui_manager
         self.open = False
-        self.buttons = [Button(body.p_name, (20, 20 + i * 30), (160, 30), body, get_indent_level(body)) for i, body
-                        in enumerate(celestial_bodies)]
         self.scroll_offset = 0
+        self.hovered_row = None
+        self.searching = False
+        self.query = ''
+        self.buttons = [Button('', (20, ROW_TOP + i * ROW_HEIGHT), (160, ROW_HEIGHT), None, 0)
+                        for i in range(VISIBLE_ROWS)]
+        # The menu is painted into this surface only when something it shows has changed
+        self.surface = pygame.Surface(MENU_SIZE, pygame.SRCALPHA)
+        self.dirty = True
+        self.set_bodies(celestial_bodies)
+
+    def set_bodies(self, celestial_bodies):
+        """
+        Replace the listed bodies and rebuild the hierarchy depths and the name index.
+
+        Parameters:
+        celestial_bodies (list of CelestialBody): The bodies to list, in display order.
+        """
+        self.celestial_bodies = celestial_bodies
+        self._depths = {}
+        self.indent_levels = [get_indent_level(body, self._depths) for body in celestial_bodies]
+        self._rebuild_name_index()
+        self.scroll_offset = min(self.scroll_offset, self.max_scroll_offset)
+        self.hovered_row = None
+        self.dirty = True
+
+    def remove_bodies(self, bodies):
+        """
+        Drop bodies from the list, e.g. after they merged in a collision, without re-sorting the name index.
+
+        Parameters:
+        bodies (iterable of CelestialBody): The bodies to drop.
+        """
+        removed = {id(body) for body in bodies}
+        kept_rows = [row for row, body in enumerate(self.celestial_bodies) if id(body) not in removed]
+        new_rows = {old_row: new_row for new_row, old_row in enumerate(kept_rows)}
+        self.celestial_bodies = [self.celestial_bodies[row] for row in kept_rows]
+        # Satellites of the removed bodies moved to new parents, so the depths are measured again
+        self._depths = {}
+        self.indent_levels = [get_indent_level(body, self._depths) for body in self.celestial_bodies]
+        entries = [(name, new_rows[row]) for name, row in zip(self._sorted_names, self._sorted_rows)
+                   if row in new_rows]
+        self._sorted_names = [name for name, _ in entries]
+        self._sorted_rows = [row for _, row in entries]
+        self.scroll_offset = min(self.scroll_offset, self.max_scroll_offset)
+        self.hovered_row = None
+        self.dirty = True
 
-    def draw(self):
-        menu_surface = pygame.Surface((200, 200), pygame.SRCALPHA)
-        menu_surface.fill((150, 150, 150, 128))  # Add transparency to the menu
-        pygame.draw.rect(menu_surface, (0, 0, 0), menu_surface.get_rect(), 2)  # Draw a border
-        for i, button in enumerate(self.buttons[self.scroll_offset:]):
-            button.position = (20, 20 + i * 30)  # Update button position based on scroll offset
-            button.draw(menu_surface)
+    def _rebuild_name_index(self):
+        entries = sorted((body.p_name.lower(), row) for row, body in enumerate(self.celestial_bodies))
+        self._sorted_names = [name for name, _ in entries]
+        self._sorted_rows = [row for _, row in entries]
 
-        tex_id = self.create_texture_from_surface(menu_surface)
-        return tex_id
+    @property
+    def max_scroll_offset(self):
+        return max(0, len(self.celestial_bodies) - 1)
+
+    def row_at(self, mouse_pos):
+        """
+        Map a screen position to the index of the body listed there, in O(1).
+
+        Parameters:
+        mouse_pos (tuple): Screen coordinates of the mouse.
+
+        Returns:
+        int: Index into celestial_bodies, or None when the position is not over a row.
+        """
+        x = mouse_pos[0] - MENU_POSITION[0]
+        y = mouse_pos[1] - MENU_POSITION[1] - ROW_TOP
+        if not (0 <= x < MENU_SIZE[0]) or y < 0:
+            return None
+        visible_row = y // ROW_HEIGHT
+        row = self.scroll_offset + visible_row
+        if visible_row >= VISIBLE_ROWS or row >= len(self.celestial_bodies):
+            return None
+        return row
+
+    def find_prefix(self, prefix):
+        """
+        Return the row of the first body, in name order, whose name starts with a prefix.
+
+        Parameters:
+        prefix (str): Case-insensitive name prefix.
+
+        Returns:
+        int: Index into celestial_bodies, or None when no name matches.
+        """
+        prefix = prefix.lower()
+        position = bisect.bisect_left(self._sorted_names, prefix)
+        if position < len(self._sorted_names) and self._sorted_names[position].startswith(prefix):
+            return self._sorted_rows[position]
+        return None
+
+    def scroll_to(self, row):
+        new_offset = min(max(0, row), self.max_scroll_offset)
+        if new_offset != self.scroll_offset:
+            self.scroll_offset = new_offset
+            self.dirty = True
+
+    def redraw(self):
+        self.surface.fill((150, 150, 150, 128))  # Add transparency to the menu
+        pygame.draw.rect(self.surface, (0, 0, 0), self.surface.get_rect(), 2)  # Draw a border
+        if self.searching:
+            self.surface.blit(get_font().render('/' + self.query, True, (0, 0, 0)), (20, 3))
+        for visible_row, button in enumerate(self.buttons):
+            row = self.scroll_offset + visible_row
+            if row >= len(self.celestial_bodies):
+                break
+            body = self.celestial_bodies[row]
+            button.bind(body, self.indent_levels[row])
+            if body is self.gui_manager.target_body:
+                button.draw(self.surface, SELECTED_COLOR)
+            elif row == self.hovered_row:
+                button.draw(self.surface, HOVER_COLOR)
+            else:
+                button.draw(self.surface)
+        self.dirty = False
+
+    def texture_data(self):
+        """
+        Return the menu pixels in the layout GuiManager uploads to its texture.
+        """
+        surface = pygame.transform.flip(self.surface, True, True)
+        return pygame.image.tostring(surface, 'RGBA', 1)
 
     def handle_scroll(self, event):
         if event.type == pygame.MOUSEBUTTONDOWN:
             if event.button == 4:  # Scroll up
-                self.scroll_offset = max(0, self.scroll_offset - 1)
+                self.scroll_to(self.scroll_offset - 1)
             elif event.button == 5:  # Scroll down
-                self.scroll_offset = min(len(self.buttons) - 1, self.scroll_offset + 1)
+                self.scroll_to(self.scroll_offset + 1)
+
+    def handle_search_key(self, event):
+        if event.key == pygame.K_ESCAPE:
+            self.searching = False
+            self.query = ''
+        elif event.key == pygame.K_RETURN:
+            row = self.find_prefix(self.query)
+            if row is not None:
+                self.gui_manager.target_body = self.celestial_bodies[row]
+            self.searching = False
+            self.query = ''
+        else:
+            if event.key == pygame.K_BACKSPACE:
+                self.query = self.query[:-1]
+            elif event.unicode and event.unicode.isprintable():
+                self.query += event.unicode
+            row = self.find_prefix(self.query)
+            if row is not None:
+                self.scroll_to(row)
+        self.dirty = True
 
     def handle_event(self, event):
-        if self.open:
-            mouse_pos = pygame.mouse.get_pos()
-            for button in self.buttons:
-                if button.is_clicked(mouse_pos, event, self.gui_manager):
-                    break
+        if not self.open:
+            return
+        if event.type == pygame.MOUSEMOTION:
+            row = self.row_at(event.pos)
+            if row != self.hovered_row:
+                self.hovered_row = row
+                self.dirty = True
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            if event.button == 1:  # Left mouse button
+                row = self.row_at(event.pos)
+                if row is not None:
+                    self.gui_manager.target_body = self.celestial_bodies[row]
             self.handle_scroll(event)
-
-    @staticmethod
-    def create_texture_from_surface(surface):
-        surface = pygame.transform.flip(surface, True, True)
-        texture_data = pygame.image.tostring(surface, 'RGBA', 1)
-        width, height = surface.get_size()
-        tex_id = glGenTextures(1)
-        glBindTexture(GL_TEXTURE_2D, tex_id)
-        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, texture_data)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        return tex_id
+        elif event.type == pygame.KEYDOWN:
+            if self.searching:
+                self.handle_search_key(event)
+            elif event.key == pygame.K_SLASH:
+                self.searching = True
+                self.dirty = True
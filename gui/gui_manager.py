@@ -1,6 +1,16 @@
 from OpenGL.GL import *
 
-from gui.dropdown_menu import DropdownMenu
+from gui.dropdown_menu import DropdownMenu, MENU_SIZE
+
+
+def switch_to_2d(display):
+    glMatrixMode(GL_PROJECTION)
+    glPushMatrix()
+    glLoadIdentity()
+    glOrtho(0, display[0], display[1], 0, -1, 1)
+    glMatrixMode(GL_MODELVIEW)
+    glPushMatrix()
+    glLoadIdentity()
 
 
 def switch_to_3d():
@@ -12,25 +22,45 @@ def switch_to_3d():
 
 class GuiManager:
     def __init__(self, celestial_bodies, display):
-        self.target_body = celestial_bodies[0]
+        self._target_body = celestial_bodies[0]
         self.dropdown_menu = DropdownMenu(celestial_bodies, self)
         self.display = display
+        self.texture_id = None
+
+    @property
+    def target_body(self):
+        return self._target_body
+
+    @target_body.setter
+    def target_body(self, body):
+        if body is not self._target_body:
+            self._target_body = body
+            self.dropdown_menu.dirty = True  # The selected row is highlighted
 
     def switch_to_2d(self):
-        glMatrixMode(GL_PROJECTION)
-        glPushMatrix()
-        glLoadIdentity()
-        glOrtho(0, self.display[0], self.display[1], 0, -1, 1)
-        glMatrixMode(GL_MODELVIEW)
-        glPushMatrix()
-        glLoadIdentity()
+        switch_to_2d(self.display)
+
+    def update_texture(self):
+        # The texture lives as long as the manager; it is only re-uploaded when the menu changed
+        if self.texture_id is None:
+            self.texture_id = glGenTextures(1)
+            glBindTexture(GL_TEXTURE_2D, self.texture_id)
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, MENU_SIZE[0], MENU_SIZE[1], 0, GL_RGBA, GL_UNSIGNED_BYTE, None)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+            self.dropdown_menu.dirty = True
+        if self.dropdown_menu.dirty:
+            self.dropdown_menu.redraw()
+            glBindTexture(GL_TEXTURE_2D, self.texture_id)
+            glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, MENU_SIZE[0], MENU_SIZE[1], GL_RGBA, GL_UNSIGNED_BYTE,
+                            self.dropdown_menu.texture_data())
 
     def draw(self):
         if self.dropdown_menu.open:
             self.switch_to_2d()
-            texture_id = self.dropdown_menu.draw()
+            self.update_texture()
             glEnable(GL_TEXTURE_2D)
-            glBindTexture(GL_TEXTURE_2D, texture_id)
+            glBindTexture(GL_TEXTURE_2D, self.texture_id)
             glBegin(GL_QUADS)
             glTexCoord2f(1, 0)  # Flip the x-coordinate here
             glVertex2f(10, 10)
@@ -42,5 +72,9 @@ class GuiManager:
             glVertex2f(10, 210)
             glEnd()
             glDisable(GL_TEXTURE_2D)
-            glDeleteTextures([texture_id])
-            switch_to_3d()
\ No newline at end of file
+            switch_to_3d()
+
+    def release(self):
+        if self.texture_id is not None:
+            glDeleteTextures([self.texture_id])
+            self.texture_id = None
@@ -0,0 +1,32 @@
+from gui.text_overlay import TextOverlay
+
+
+class ProfilerOverlay(TextOverlay):
+    size = (240, 200)
+    corner = 'top right'
+
+    def __init__(self, profiler):
+        """
+        Initialize an overlay that shows the frame rate, body count and profiler measurements.
+
+        Parameters:
+        profiler (Profiler): The profiler whose averages are shown.
+        """
+        super().__init__()
+        self.profiler = profiler
+
+    def lines(self, body_count):
+        """
+        Return the text lines of the overlay.
+
+        Parameters:
+        body_count (int): Number of simulated bodies.
+        """
+        averages = self.profiler.averages
+        lines = [f'{self.profiler.fps:.0f} FPS  {averages.get("frame", 0.0):.1f} ms', f'{body_count} bodies']
+        # Scope times first, then the counters, both sorted by name
+        for name in sorted(name for name in averages if name.endswith(' ms')):
+            lines.append(f'{name[:-3]}: {averages[name]:.2f} ms')
+        for name in sorted(name for name in averages if not name.endswith(' ms') and name != 'frame'):
+            lines.append(f'{name}: {averages[name]:.0f}')
+        return lines
@@ -0,0 +1,101 @@
+import time
+
+import pygame
+from OpenGL.GL import *
+
+from gui.button import get_font
+from gui.gui_manager import switch_to_2d, switch_to_3d
+
+LINE_HEIGHT = 18
+REFRESH_INTERVAL = 0.25  # Seconds between redraws; the numbers shown change slowly anyway
+MARGIN = 10
+
+
+class TextOverlay:
+    size = (240, 200)
+    corner = 'top right'  # Corner of the window the overlay is drawn in: '<top|bottom> <left|right>'
+
+    def __init__(self):
+        """
+        Initialize a panel of text lines drawn over the scene, toggled through visible.
+
+        Subclasses return the text from lines(); draw passes its extra arguments on to it. The
+        text is only rendered every REFRESH_INTERVAL seconds into a texture that is reused.
+        """
+        self.visible = False
+        self.surface = pygame.Surface(self.size, pygame.SRCALPHA)
+        self.texture_id = None
+        self._last_refresh = None
+
+    def lines(self, *args):
+        """
+        Return the text lines of the overlay.
+        """
+        raise NotImplementedError
+
+    def line_color(self, line):
+        return 255, 255, 255
+
+    def redraw(self, *args):
+        self.surface.fill((0, 0, 0, 160))
+        font = get_font()
+        for row, line in enumerate(self.lines(*args)[:self.size[1] // LINE_HEIGHT]):
+            self.surface.blit(font.render(line, True, self.line_color(line)), (6, 4 + row * LINE_HEIGHT))
+
+    def update_texture(self, *args):
+        # Rendering text every frame would cost more than most of what it shows
+        now = time.perf_counter()
+        if self.texture_id is None:
+            self.texture_id = glGenTextures(1)
+            glBindTexture(GL_TEXTURE_2D, self.texture_id)
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, self.size[0], self.size[1], 0, GL_RGBA, GL_UNSIGNED_BYTE, None)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+            self._last_refresh = None
+        if self._last_refresh is None or now - self._last_refresh >= REFRESH_INTERVAL:
+            self.redraw(*args)
+            glBindTexture(GL_TEXTURE_2D, self.texture_id)
+            glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, self.size[0], self.size[1], GL_RGBA, GL_UNSIGNED_BYTE,
+                            pygame.image.tostring(self.surface, 'RGBA'))
+            self._last_refresh = now
+
+    def draw(self, display, *args):
+        """
+        Draw the overlay in its corner of the window.
+
+        Parameters:
+        display (tuple): Width and height of the window in pixels.
+        *args: Passed on to lines.
+        """
+        if not self.visible:
+            return
+        switch_to_2d(display)
+        self.update_texture(*args)
+        vertical, horizontal = self.corner.split()
+        left = MARGIN if horizontal == 'left' else display[0] - self.size[0] - MARGIN
+        top = MARGIN if vertical == 'top' else display[1] - self.size[1] - MARGIN
+        right, bottom = left + self.size[0], top + self.size[1]
+        glDisable(GL_DEPTH_TEST)
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glEnable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, self.texture_id)
+        glBegin(GL_QUADS)
+        glTexCoord2f(0, 0)
+        glVertex2f(left, top)
+        glTexCoord2f(1, 0)
+        glVertex2f(right, top)
+        glTexCoord2f(1, 1)
+        glVertex2f(right, bottom)
+        glTexCoord2f(0, 1)
+        glVertex2f(left, bottom)
+        glEnd()
+        glDisable(GL_TEXTURE_2D)
+        glDisable(GL_BLEND)
+        glEnable(GL_DEPTH_TEST)
+        switch_to_3d()
+
+    def release(self):
+        if self.texture_id is not None:
+            glDeleteTextures([self.texture_id])
+            self.texture_id = None
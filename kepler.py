@@ -0,0 +1,185 @@
+"""
+Analytic two-body orbits.
+
+The orbit of a body about its parent is stored as one row of ELEMENT_COUNT floats:
+
+    0     semi-major axis a
+    1     eccentricity e
+    2     mean motion n (rad/s)
+    3     mean anomaly at time 0 (rad)
+    4:7   unit vector towards periapsis P
+    7:10  unit vector Q completing the orbital plane, 90 degrees ahead of P in the direction of motion
+
+so that the relative position at any time follows from a single solution of Kepler's equation.
+Only bound (elliptic) orbits are supported. All functions work on many orbits at once.
+"""
+import numpy as np
+
+ELEMENT_COUNT = 10
+
+
+def solve_kepler(mean_anomalies, eccentricities, tolerance=1e-12, max_iterations=32):
+    """
+    Solve Kepler's equation M = E - e sin(E) for the eccentric anomaly E with Newton's method.
+
+    Parameters:
+    mean_anomalies (np.array): Mean anomalies M (rad, any range) (shape: [k]).
+    eccentricities (np.array): Eccentricities, 0 <= e < 1 (shape: [k]).
+    tolerance (float, optional): Largest accepted Newton correction (rad).
+    max_iterations (int, optional): Maximum number of Newton iterations.
+
+    Returns:
+    np.array: Eccentric anomalies, in the same revolution as the wrapped mean anomalies (shape: [k]).
+    """
+    mean_anomalies = np.remainder(np.asarray(mean_anomalies, dtype=float) + np.pi, 2 * np.pi) - np.pi
+    eccentricities = np.asarray(eccentricities, dtype=float)
+    # Starting guess that converges for every eccentricity below 1 (Danby 1987)
+    anomalies = mean_anomalies + 0.85 * eccentricities * np.sign(np.sin(mean_anomalies))
+    for _ in range(max_iterations):
+        corrections = (anomalies - eccentricities * np.sin(anomalies) - mean_anomalies) \
+            / (1 - eccentricities * np.cos(anomalies))
+        anomalies -= corrections
+        if np.all(np.abs(corrections) <= tolerance):
+            break
+    return anomalies
+
+
+def elements_from_state(relative_positions, relative_velocities, mu, time=0.0):
+    """
+    Calculate the orbital elements of bodies from their position and velocity relative to their parents.
+
+    Parameters:
+    relative_positions (np.array): Positions relative to the parents (shape: [k, 3]).
+    relative_velocities (np.array): Velocities relative to the parents (shape: [k, 3]).
+    mu (np.array): Gravitational parameters G * (m_parent + m_body) (shape: [k]).
+    time (float, optional): Time at which the positions and velocities hold (s).
+
+    Returns:
+    np.array: Orbital elements (shape: [k, ELEMENT_COUNT]).
+    """
+    r = np.asarray(relative_positions, dtype=float).reshape(-1, 3)
+    v = np.asarray(relative_velocities, dtype=float).reshape(-1, 3)
+    mu = np.broadcast_to(np.asarray(mu, dtype=float), (len(r),))
+    distances = np.linalg.norm(r, axis=1)
+    angular_momenta = np.cross(r, v)
+    angular_momentum_norms = np.linalg.norm(angular_momenta, axis=1)
+    energies = 0.5 * np.einsum('ij,ij->i', v, v) - mu / distances
+    if np.any(energies >= 0):
+        raise ValueError("Only bound orbits can be propagated analytically.")
+    if np.any(angular_momentum_norms == 0):
+        raise ValueError("Radial orbits can't be propagated analytically.")
+
+    semi_major_axes = -mu / (2 * energies)
+    eccentricity_vectors = np.cross(v, angular_momenta) / mu[:, np.newaxis] - r / distances[:, np.newaxis]
+    eccentricities = np.linalg.norm(eccentricity_vectors, axis=1)
+    # Circular orbits have no periapsis; measure from the current position instead
+    circular = eccentricities < 1e-12
+    periapsis_directions = np.where(circular[:, np.newaxis], r / distances[:, np.newaxis],
+                                    eccentricity_vectors / np.where(circular, 1.0, eccentricities)[:, np.newaxis])
+    normals = angular_momenta / angular_momentum_norms[:, np.newaxis]
+    q_directions = np.cross(normals, periapsis_directions)
+
+    x = np.einsum('ij,ij->i', r, periapsis_directions)
+    y = np.einsum('ij,ij->i', r, q_directions)
+    eccentric_anomalies = np.arctan2(y / (semi_major_axes * np.sqrt(1 - eccentricities ** 2)),
+                                     x / semi_major_axes + eccentricities)
+    mean_motions = np.sqrt(mu / semi_major_axes ** 3)
+    mean_anomalies = eccentric_anomalies - eccentricities * np.sin(eccentric_anomalies)
+
+    elements = np.empty((len(r), ELEMENT_COUNT))
+    elements[:, 0] = semi_major_axes
+    elements[:, 1] = eccentricities
+    elements[:, 2] = mean_motions
+    elements[:, 3] = np.remainder(mean_anomalies - mean_motions * time, 2 * np.pi)
+    elements[:, 4:7] = periapsis_directions
+    elements[:, 7:10] = q_directions
+    return elements
+
+
+def elements_from_angles(semi_major_axes, eccentricities, inclinations, ascending_nodes, periapsis_arguments,
+                         mean_anomalies, mu):
+    """
+    Calculate orbital elements from classical Keplerian elements, as listed in ephemerides.
+
+    The angles are measured in a frame whose reference plane is the x-y plane, with the
+    ascending node longitude counted from the x-axis.
+
+    Parameters:
+    semi_major_axes (np.array): Semi-major axes a (shape: [k]).
+    eccentricities (np.array): Eccentricities, 0 <= e < 1 (shape: [k]).
+    inclinations (np.array): Inclinations i to the reference plane (rad) (shape: [k]).
+    ascending_nodes (np.array): Longitudes of the ascending node (rad) (shape: [k]).
+    periapsis_arguments (np.array): Arguments of periapsis (rad) (shape: [k]).
+    mean_anomalies (np.array): Mean anomalies at time 0 (rad) (shape: [k]).
+    mu (np.array): Gravitational parameters G * (m_parent + m_body) (shape: [k]).
+
+    Returns:
+    np.array: Orbital elements (shape: [k, ELEMENT_COUNT]).
+    """
+    semi_major_axes, eccentricities, inclinations, ascending_nodes, periapsis_arguments, mean_anomalies, mu = \
+        np.broadcast_arrays(*(np.asarray(value, dtype=float) for value in (
+            semi_major_axes, eccentricities, inclinations, ascending_nodes, periapsis_arguments, mean_anomalies, mu)))
+    if np.any((eccentricities < 0) | (eccentricities >= 1)) or np.any(semi_major_axes <= 0):
+        raise ValueError("Only bound orbits can be propagated analytically.")
+    cos_node, sin_node = np.cos(ascending_nodes), np.sin(ascending_nodes)
+    cos_argument, sin_argument = np.cos(periapsis_arguments), np.sin(periapsis_arguments)
+    cos_inclination, sin_inclination = np.cos(inclinations), np.sin(inclinations)
+
+    elements = np.empty((semi_major_axes.size, ELEMENT_COUNT))
+    elements[:, 0] = semi_major_axes.ravel()
+    elements[:, 1] = eccentricities.ravel()
+    elements[:, 2] = np.sqrt(mu / semi_major_axes ** 3).ravel()
+    elements[:, 3] = np.remainder(mean_anomalies, 2 * np.pi).ravel()
+    elements[:, 4] = (cos_argument * cos_node - sin_argument * sin_node * cos_inclination).ravel()
+    elements[:, 5] = (cos_argument * sin_node + sin_argument * cos_node * cos_inclination).ravel()
+    elements[:, 6] = (sin_argument * sin_inclination).ravel()
+    elements[:, 7] = (-sin_argument * cos_node - cos_argument * sin_node * cos_inclination).ravel()
+    elements[:, 8] = (-sin_argument * sin_node + cos_argument * cos_node * cos_inclination).ravel()
+    elements[:, 9] = (cos_argument * sin_inclination).ravel()
+    return elements
+
+
+def state_from_elements(elements, time):
+    """
+    Calculate positions and velocities relative to the parents at any time.
+
+    Parameters:
+    elements (np.array): Orbital elements (shape: [k, ELEMENT_COUNT]).
+    time (float): Time to evaluate the orbits at (s).
+
+    Returns:
+    tuple: Relative position vectors (shape: [k, 3]) and relative velocity vectors (shape: [k, 3]).
+    """
+    semi_major_axes, eccentricities, mean_motions = elements[:, 0], elements[:, 1], elements[:, 2]
+    eccentric_anomalies = solve_kepler(elements[:, 3] + mean_motions * time, eccentricities)
+    cos_e, sin_e = np.cos(eccentric_anomalies), np.sin(eccentric_anomalies)
+    minor_ratios = np.sqrt(1 - eccentricities ** 2)
+    periapsis_directions, q_directions = elements[:, 4:7], elements[:, 7:10]
+
+    positions = (semi_major_axes * (cos_e - eccentricities))[:, np.newaxis] * periapsis_directions \
+        + (semi_major_axes * minor_ratios * sin_e)[:, np.newaxis] * q_directions
+    speeds = mean_motions * semi_major_axes / (1 - eccentricities * cos_e)
+    velocities = (-speeds * sin_e)[:, np.newaxis] * periapsis_directions \
+        + (speeds * minor_ratios * cos_e)[:, np.newaxis] * q_directions
+    return positions, velocities
+
+
+def orbit_points(elements, samples=128):
+    """
+    Sample the full ellipse of every orbit, relative to the parents.
+
+    The points are spaced evenly in eccentric anomaly, which puts more of them near periapsis
+    where the orbit curves most.
+
+    Parameters:
+    elements (np.array): Orbital elements (shape: [k, ELEMENT_COUNT]).
+    samples (int, optional): Number of points per orbit.
+
+    Returns:
+    np.array: Points along the orbits (shape: [k, samples, 3]).
+    """
+    anomalies = np.linspace(0, 2 * np.pi, samples, endpoint=False)
+    semi_major_axes, eccentricities = elements[:, 0, np.newaxis], elements[:, 1, np.newaxis]
+    x = semi_major_axes * (np.cos(anomalies) - eccentricities)
+    y = semi_major_axes * np.sqrt(1 - eccentricities ** 2) * np.sin(anomalies)
+    return x[:, :, np.newaxis] * elements[:, np.newaxis, 4:7] + y[:, :, np.newaxis] * elements[:, np.newaxis, 7:10]
@@ -1,11 +1,57 @@
+import argparse
+import os
+import sys
+from functools import partial
+
 import numpy as np
 import pygame
 from OpenGL.GL import *
 from OpenGL.GLU import *
 from pygame.locals import *
 
+from checkpoint import Checkpointer, load_checkpoint, restore_state
+from diagnostics import Diagnostics
+from gui.diagnostics_overlay import DiagnosticsOverlay
 from gui.gui_manager import GuiManager
-from entity.celestial_body import CelestialBody
+from gui.profiler_overlay import ProfilerOverlay
+from render.culling import LOD_LOW, LOD_POINT, LOD_TESSELLATION, depth_range, select_lod, to_eye_space, view_matrix
+from render.orbit_paths import OrbitRenderer
+from render.point_renderer import PointRenderer
+from render.sphere_mesh import release_sphere_lists
+from render.trails import TrailRenderer
+from scenario import load_scenario
+from simulation import Simulation
+from trajectory import ReplayPlayer, TrajectoryReader, TrajectoryWriter
+from profiler import Profiler
+import backends
+import physics
+import gui.gui_manager
+import gui.text_overlay
+import render.orbit_paths
+import render.point_renderer
+import render.sphere_mesh
+import render.trails
+import OpenGL.GL
+import OpenGL.GLU
+
+default_scenario = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios", "default.json")
+
+parser = argparse.ArgumentParser(description="Solar System 3D Visualization")
+parser.add_argument("--scenario", default=default_scenario,
+                    help="JSON or TOML scenario file to simulate, e.g. scenarios/solar_system.toml")
+parser.add_argument("--record", help="record the simulated trajectory into this directory")
+parser.add_argument("--replay", help="play back a recorded trajectory instead of simulating")
+parser.add_argument("--resume", help="continue from a checkpoint file written with --checkpoint")
+parser.add_argument("--checkpoint", help="write a checkpoint of the simulation to this file periodically and on exit")
+parser.add_argument("--checkpoint-interval", type=float, default=30.0,
+                    help="seconds between checkpoints; F5 takes one now and F9 rewinds to the latest")
+parser.add_argument("--backend", choices=backends.BACKEND_NAMES, default=backends.DEFAULT_BACKEND,
+                    help="physics kernels; numba falls back to numpy when Numba is not installed")
+parser.add_argument("--profile", action="store_true", help="show the profiler overlay from the start (toggle with F3)")
+parser.add_argument("--diagnostics", action="store_true",
+                    help="show energy and momentum errors and orbit checks from the start (toggle with F4)")
+parser.add_argument("--trace", help="profile the whole run and write a Chrome trace (chrome://tracing) to this file")
+args = parser.parse_args()
 
 # Initialize Pygame
 pygame.init()
@@ -13,12 +59,14 @@ display = (800, 600)
 window_surface = pygame.display.set_mode(display, DOUBLEBUF | OPENGL | RESIZABLE)
 pygame.display.set_caption("Solar System 3D Visualization")
 
+field_of_view = 45
+
 # Set the perspective of the OpenGL scene
-def set_perspective(width, height):
+def set_perspective(width, height, near=0.1, far=1000000):
     glViewport(0, 0, width, height)
     glMatrixMode(GL_PROJECTION)
     glLoadIdentity()
-    gluPerspective(45, (width / height), 0.1, 1000000)
+    gluPerspective(field_of_view, (width / height), near, far)
     glMatrixMode(GL_MODELVIEW)
 
 set_perspective(display[0], display[1])
@@ -37,105 +85,317 @@ camera_rot_y = 0
 # Initialize mouse state
 mouse_down = False
 
-# Initialize orbit visibility
+# Initialize orbit and trail visibility
 show_orbit = True
 
 # Show the cursor
 pygame.mouse.set_visible(True)
 
-au = 23455.62  # Astronomical unit in earth radii
-
-sun = CelestialBody(p_name="Sun",
-                    radius=4,
-                    mass=10000,
-                    color=(1, 1, 0))
-
-# Create Mercury, Venus, Earth, and Moon instances
-# mercury = CelestialBody(b_name="Mercury", radius=0.35, color=(0.5, 0.5, 0.5), orbit_radius=10, orbit_speed=0.1, parent_body=sun)
-# venus = CelestialBody(b_name="Venus", radius=1, color=(1, 0.5, 0), orbit_radius=15, orbit_speed=0.08, parent_body=sun)
-earth = CelestialBody(p_name="Earth",
-                      radius=1,
-                      mass=100,
-                      color=(0, 0, 1),
-                      initial_position=np.array([20, 0, 0]),
-                      initial_velocity=np.array([0, 0, -4.35424639e-05]),
-                      parent_body=sun)
-# moon = CelestialBody(b_name="Moon", radius=0.273, color=(0.5, 0.5, 0.5), orbit_radius=3, orbit_speed=0.1, parent_body=earth)
-
-# Create Mars, Phobos, and Deimos instances
-# mars = CelestialBody(b_name="Mars", radius=0.532, color=(1, 0, 0), orbit_radius=35, orbit_speed=0.05, parent_body=sun)
-# phobos = CelestialBody(b_name="Phobos", radius=0.2, color=(0.5, 0.5, 0.5), orbit_radius=4, orbit_speed=0.2, parent_body=mars)
-# deimos = CelestialBody(b_name="Deimos", radius=0.15, color=(0.5, 0.5, 0.5), orbit_radius=6, orbit_speed=0.1, parent_body=mars)
-
-# List of celestial bodies
-celestial_bodies = [
-    sun, earth
-]
+resumed = None
+if args.replay:
+    trajectory_reader = TrajectoryReader(args.replay)
+    system_state = trajectory_reader.build_state()
+elif args.resume:
+    resumed = load_checkpoint(args.resume)
+    system_state = restore_state(resumed)
+else:
+    # Bodies, units and initial conditions come from a scenario file, see scenario.py
+    system_state = load_scenario(args.scenario)
+
+# List of celestial bodies; a copy, since collisions remove bodies from the state on the physics thread
+celestial_bodies = list(system_state.bodies)
 
 # Create GuiManager instance
 gui_manager = GuiManager(celestial_bodies, display)
 
+
+def view_settings():
+    """
+    Return the camera and target selection in the form stored in checkpoints.
+    """
+    target = gui_manager.target_body
+    return {'camera': [zoom_level, camera_rot_x, camera_rot_y], 'target': target.p_name if target else None}
+
+
+def apply_view_settings(settings):
+    global zoom_level, camera_rot_x, camera_rot_y
+    zoom_level, camera_rot_x, camera_rot_y = settings.get('camera', (zoom_level, camera_rot_x, camera_rot_y))
+    # The target is stored by name, which stays valid however the rows moved in collisions
+    target = next((body for body in celestial_bodies if body.p_name == settings.get('target')), None)
+    if target is not None:
+        gui_manager.target_body = target
+
+
+if resumed is not None:
+    apply_view_settings(resumed.metadata)
+
+# Bodies smaller than this are always drawn together as point sprites, never as individual spheres
+point_radius_threshold = 0.1
+point_renderer = PointRenderer()
+
+# Predicted orbits about the parent bodies and trails of the last trail_length frames, toggled with O
+trail_length = 256
+orbit_renderer = OrbitRenderer()
+trail_renderer = TrailRenderer(trail_length)
+
+
+def update_render_attributes():
+    """
+    Collect the per-body attributes the renderers need; call again when the body list changes.
+
+    Returns:
+    tuple: Radii of all bodies (shape: [n]), a mask of the bodies that are always points (shape: [n])
+        and the row of every body of celestial_bodies in the snapshots, which stays valid while the
+        physics thread already renumbers the state.
+    """
+    radii = system_state.radii.copy()
+    colors = np.array([body.color for body in celestial_bodies], dtype=float).reshape(-1, 3)
+    point_renderer.set_bodies(colors, radii)
+    orbit_renderer.set_bodies(colors, system_state.parents)
+    trail_renderer.set_bodies(colors, system_state.positions)
+    return radii, radii < point_radius_threshold, {body: row for row, body in enumerate(celestial_bodies)}
+
+
+body_radii, point_only, body_rows = update_render_attributes()
+
+# Frame profiler: timing scopes around every phase of the main loop and GL call counts, shown by
+# the overlay toggled with F3; it costs next to nothing while disabled
+profiler = Profiler(trace=bool(args.trace))
+profiler_overlay = ProfilerOverlay(profiler)
+gl_modules = (sys.modules[__name__], OpenGL.GL, OpenGL.GLU, render.sphere_mesh, render.point_renderer,
+              render.trails, render.orbit_paths, gui.gui_manager, gui.text_overlay)
+
+
+def set_profiling(visible):
+    """
+    Show or hide the profiler overlay; the profiler only runs while it is shown or a trace is recorded.
+    """
+    profiler_overlay.visible = visible
+    enabled = visible or bool(args.trace)
+    if enabled and not profiler.enabled:
+        profiler.instrument_gl(gl_modules)
+    elif not enabled and profiler.enabled:
+        profiler.restore_gl()
+    profiler.enabled = enabled
+
+
+set_profiling(args.profile)
+
 # Main loop
 clock = pygame.time.Clock()
 is_running = True
 speed_up = 50000
 
+# Gravity solver: direct summation with the selected backend, or e.g.
+# functools.partial(barnes_hut.calculate_accelerations, theta=0.5) for scenes with tens of thousands of bodies
+physics_backend = backends.load_backend(args.backend)
+gravity_solver = physics_backend.calculate_accelerations
+
+# Integration scheme: 'verlet' advances every body with the same step, 'adaptive' substeps close
+# encounters with per-body block timesteps (direct summation only) and 'hierarchical' substeps
+# every satellite's orbit relative to its parent body
+integration_scheme = 'hierarchical'
+
+# Merge bodies whose spheres touch, conserving mass and momentum (see collisions.py)
+merge_collisions = True
+max_substeps_per_step = 64
+
+# The physics runs on its own thread in fixed steps; speed_up / physics_timestep steps per wall-clock second
+physics_timestep = 500
+if integration_scheme == 'adaptive':
+    integrator = partial(physics.step_adaptive, max_substeps=max_substeps_per_step)
+elif integration_scheme == 'hierarchical':
+    integrator = partial(physics.step_hierarchical, solver=gravity_solver, max_substeps=max_substeps_per_step)
+elif gravity_solver is physics_backend.calculate_accelerations:
+    integrator = physics_backend.step
+else:
+    integrator = partial(physics.step, solver=gravity_solver)
+# Energy and momentum conservation and orbit checks on the physics thread, every
+# diagnostics_every steps; anything that looks unstable pops up the overlay toggled with F4
+diagnostics_every = 10
+diagnostics = Diagnostics(diagnostics_every)
+diagnostics_overlay = DiagnosticsOverlay(diagnostics)
+diagnostics_overlay.visible = args.diagnostics
+# Checkpoints of the simulation every checkpoint_interval seconds, kept in memory for rewinding
+# with F9 and, with --checkpoint, written to disk on a background thread
+checkpointer = Checkpointer(args.checkpoint, args.checkpoint_interval) if not args.replay else None
+if args.replay:
+    simulation = ReplayPlayer(trajectory_reader, speed_up)
+else:
+    recorder = TrajectoryWriter(args.record, celestial_bodies) if args.record else None
+    simulation = Simulation(system_state, physics_timestep, speed_up, integrator, recorder=recorder,
+                            profiler=profiler, collide=merge_collisions, diagnostics=diagnostics,
+                            checkpointer=checkpointer)
+    if resumed is not None:
+        simulation.steps = resumed.metadata['steps']
+simulation.start()
+last_trail_time = None
+
+
+def rewind():
+    """
+    Bring the simulation, camera and target back to the latest checkpoint.
+    """
+    global body_radii, point_only, body_rows, last_trail_time
+    saved = checkpointer.latest
+    if saved is None:
+        print("No checkpoint to rewind to yet; press F5 to take one")
+        return
+    try:
+        simulation.restore(saved)
+    except ValueError as error:
+        print(error)
+        return
+    diagnostics_overlay.reset()  # The restore started the diagnostics afresh
+    with simulation.state_lock:
+        celestial_bodies[:] = system_state.bodies
+        gui_manager.dropdown_menu.set_bodies(celestial_bodies)
+        body_radii, point_only, body_rows = update_render_attributes()  # Start fresh trails
+    last_trail_time = None
+    apply_view_settings(saved.metadata)
+
 while is_running:
-    time_delta = clock.tick(60) / 1000.0 * speed_up
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            is_running = False
-        elif event.type == pygame.VIDEORESIZE:
-            display = (event.w, event.h)
-            window_surface = pygame.display.set_mode(display, DOUBLEBUF | OPENGL | RESIZABLE)
-            set_perspective(display[0], display[1])
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            if event.button == 1:
-                mouse_down = True
-        elif event.type == pygame.MOUSEBUTTONUP:
-            if event.button == 1:
-                mouse_down = False
-        elif event.type == pygame.MOUSEMOTION:
-            if mouse_down:
-                dx, dy = event.rel
-                camera_rot_x += dy * 0.1
-                camera_rot_y += dx * 0.1
-        elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_o:
-                show_orbit = not show_orbit
-            elif event.key == pygame.K_p:
-                gui_manager.dropdown_menu.open = not gui_manager.dropdown_menu.open
-        elif event.type == pygame.MOUSEWHEEL:
-            zoom_level += event.y
-
-        gui_manager.dropdown_menu.handle_event(event)
+    profiler.begin_frame()
+    with profiler.scope('wait'):
+        clock.tick(60)
+    with profiler.scope('events'):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                is_running = False
+            elif event.type == pygame.VIDEORESIZE:
+                display = (event.w, event.h)
+                window_surface = pygame.display.set_mode(display, DOUBLEBUF | OPENGL | RESIZABLE)
+                set_perspective(display[0], display[1])
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                if event.button == 1:
+                    mouse_down = True
+            elif event.type == pygame.MOUSEBUTTONUP:
+                if event.button == 1:
+                    mouse_down = False
+            elif event.type == pygame.MOUSEMOTION:
+                if mouse_down:
+                    dx, dy = event.rel
+                    camera_rot_x += dy * 0.1
+                    camera_rot_y += dx * 0.1
+            elif event.type == pygame.KEYDOWN and not gui_manager.dropdown_menu.searching:
+                # While the target selector is searching, keystrokes belong to its query
+                if event.key == pygame.K_o:
+                    show_orbit = not show_orbit
+                    if show_orbit:
+                        with simulation.state_lock:
+                            body_radii, point_only, body_rows = update_render_attributes()  # Start fresh trails
+                elif event.key == pygame.K_p:
+                    gui_manager.dropdown_menu.open = not gui_manager.dropdown_menu.open
+                elif event.key == pygame.K_F3:
+                    set_profiling(not profiler_overlay.visible)
+                elif event.key == pygame.K_F4:
+                    diagnostics_overlay.visible = not diagnostics_overlay.visible
+                elif event.key == pygame.K_F5 and checkpointer is not None:
+                    simulation.request_checkpoint(**view_settings())
+                elif event.key == pygame.K_F9 and checkpointer is not None:
+                    rewind()
+                elif event.key == pygame.K_SPACE:
+                    simulation.paused = not simulation.paused
+                elif event.key == pygame.K_RIGHTBRACKET:
+                    simulation.speed_up *= 2
+                elif event.key == pygame.K_LEFTBRACKET:
+                    simulation.speed_up /= 2
+                elif args.replay and event.key in (pygame.K_LEFT, pygame.K_RIGHT):
+                    # Scrub through the recording in steps of 5% of its length
+                    direction = 1 if event.key == pygame.K_RIGHT else -1
+                    duration = trajectory_reader.end_time - trajectory_reader.start_time
+                    simulation.seek(simulation.time + direction * 0.05 * duration)
+            elif event.type == pygame.MOUSEWHEEL:
+                zoom_level += event.y
+
+            gui_manager.dropdown_menu.handle_event(event)
+
+        if checkpointer is not None and checkpointer.due():
+            # The physics thread copies the state after its current step and the checkpointer's
+            # thread writes the file, so the frame goes on without waiting for either
+            simulation.request_checkpoint(**view_settings())
 
     # Clear the screen
     glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 
-    # Apply camera transformations
-    glPushMatrix()
-    glTranslatef(0.0, 0.0, zoom_level)
-    glRotatef(camera_rot_x, 1, 0, 0)
-    glRotatef(camera_rot_y, 0, 1, 0)
-    if gui_manager.target_body:
-        glTranslatef(*[-x for x in gui_manager.target_body.position])
+    # Positions interpolated between the two latest physics snapshots
+    with profiler.scope('snapshot'):
+        positions, sim_time = simulation.interpolated_positions()
+        if len(positions) != len(celestial_bodies):
+            # Bodies merged on the physics thread; the worker publishes while holding the lock,
+            # so the body list and a snapshot read under it match
+            with simulation.state_lock:
+                merged = [body for body in celestial_bodies if body.state is not system_state]
+                gui_manager.dropdown_menu.remove_bodies(merged)
+                celestial_bodies[:] = system_state.bodies
+                gui_manager.target_body = simulation.merged_body(gui_manager.target_body)
+                body_radii, point_only, body_rows = update_render_attributes()
+                positions, sim_time = simulation.interpolated_positions()
+        if show_orbit:
+            if sim_time != last_trail_time:
+                trail_renderer.push(positions)
+                last_trail_time = sim_time
+            # Every array from one snapshot; the state itself may be mid-step or already merged
+            latest = simulation.latest_state()
+            if len(latest.positions) == len(celestial_bodies):
+                orbit_renderer.update(latest.positions, latest.velocities, latest.masses, latest.analytic,
+                                      latest.elements)
+
+    # Camera transform, depth range fitted to the scene, and view-frustum culling with level of detail
+    with profiler.scope('culling'):
+        target_position = positions[body_rows[gui_manager.target_body]] if gui_manager.target_body else None
+        view = view_matrix(zoom_level, camera_rot_x, camera_rot_y, target_position)
+        eye_positions = to_eye_space(view, positions)
+        near, far = depth_range(eye_positions, body_radii)
+        set_perspective(display[0], display[1], near, far)
+        lod = select_lod(eye_positions, body_radii, display[1], display[0] / display[1], near, far,
+                         field_of_view, point_only=point_only)
+
+    # Draw the scene under the camera transformations
+    with profiler.scope('render'):
+        glPushMatrix()
+        glMultMatrixd(np.ascontiguousarray(view.T))
 
-    # Draw the celestial bodies
-    for body in celestial_bodies:
-        other_bodies = [b for b in celestial_bodies if b != body]
-        other_masses = np.array([b.mass for b in other_bodies])
-        other_positions = np.array([b.position for b in other_bodies])
-        body.update(time_delta, other_masses, other_positions)
-        body.draw()
-        body.log()
+        # Draw visible bodies as spheres of matching detail and all point-sized ones in a single call
+        for index in np.flatnonzero(lod >= LOD_LOW):
+            celestial_bodies[index].draw(positions[index], *LOD_TESSELLATION[lod[index]])
+        point_renderer.draw(positions, display[1], np.flatnonzero(lod == LOD_POINT), field_of_view)
+        if show_orbit:
+            orbit_renderer.draw(positions)
+            trail_renderer.draw()
 
-    glPopMatrix()  # End of camera transformations
+        glPopMatrix()  # End of camera transformations
 
-    # Draw the dropdown menu if open
-    gui_manager.draw()
+    # Draw the dropdown menu if open, and the profiler and diagnostics overlays
+    with profiler.scope('gui'):
+        for flag in diagnostics_overlay.new_flags():
+            print(f"t = {diagnostics.time:.6g} s: {flag}")
+            diagnostics_overlay.visible = True
+        gui_manager.draw()
+        profiler_overlay.draw(display, len(celestial_bodies))
+        diagnostics_overlay.draw(display)
 
-    # Update the display
-    pygame.display.flip()
+    # Update the display; the wait for the buffer swap shows up here
+    with profiler.scope('flip'):
+        pygame.display.flip()
+    profiler.end_frame()
 
+simulation.stop()
+if checkpointer is not None:
+    if args.checkpoint:
+        checkpointer.submit(simulation.take_checkpoint(**view_settings()))
+    checkpointer.close()
+    if checkpointer.error:
+        print(f"Writing the checkpoint failed: {checkpointer.error}")
+release_sphere_lists()
+point_renderer.release()
+orbit_renderer.release()
+trail_renderer.release()
+gui_manager.release()
+profiler_overlay.release()
+diagnostics_overlay.release()
+profiler.restore_gl()
+if args.trace:
+    profiler.save_trace(args.trace)
+    print(f"Wrote {len(profiler.trace_events)} trace events to {args.trace}")
 pygame.quit()
@@ -0,0 +1,208 @@
+"""
+Lightweight frame profiler.
+
+Wrap the phases of a frame in named timing scopes:
+
+    with profiler.scope('render'):
+        ...
+
+and call begin_frame / end_frame around every frame. While the profiler is disabled a scope
+is a shared no-op context manager, so instrumented code costs one method call per scope.
+Enabled, it keeps smoothed per-frame milliseconds for every scope and per-frame counters
+(GL calls, GL objects created and deleted, net allocated Python memory blocks) for an
+on-screen overlay, and can record every scope as a Chrome trace event (chrome://tracing,
+Perfetto) for offline analysis.
+"""
+import json
+import sys
+import threading
+import time
+
+_SMOOTHING = 0.1  # Weight of the newest frame in the displayed averages
+
+# Name prefixes of GL functions that create or delete GL objects
+_CREATING = ('glGen', 'glCreate', 'glNewList', 'gluNew')
+_DELETING = ('glDelete', 'gluDelete')
+
+
+class _NullScope:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SCOPE = _NullScope()
+
+
+class _Scope:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler._add_duration(self.name, self.start, time.perf_counter())
+        return False
+
+
+class Profiler:
+    def __init__(self, enabled=False, trace=False, max_trace_events=1000000):
+        """
+        Initialize a profiler.
+
+        Parameters:
+        enabled (bool, optional): Whether scopes and counters are recorded.
+        trace (bool, optional): Whether every scope is also kept as a trace event for save_trace.
+        max_trace_events (int, optional): Number of trace events after which tracing stops.
+        """
+        self.enabled = enabled
+        self.trace = trace
+        self.max_trace_events = max_trace_events
+        self.trace_events = []
+        self.averages = {}  # Smoothed milliseconds per frame of every scope and values of every counter
+        self.frames = 0
+        self._lock = threading.Lock()  # Scopes may close on the physics thread
+        self._frame_times = {}
+        self._counters = {}
+        self._frame_start = None
+        self._allocated_blocks = None  # Count at the end of the previous profiled frame
+        self._start = time.perf_counter()
+        self._originals = []
+
+    def scope(self, name):
+        """
+        Return a context manager that times the code it wraps under the given name.
+
+        Parameters:
+        name (str): Name of the scope, e.g. 'physics' or 'render'.
+        """
+        if not self.enabled:
+            return _NULL_SCOPE
+        return _Scope(self, name)
+
+    def count(self, name, amount=1):
+        """
+        Add to a per-frame counter; call from the render thread only.
+
+        Parameters:
+        name (str): Name of the counter.
+        amount (int, optional): Value to add.
+        """
+        if self.enabled:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def begin_frame(self):
+        if self.enabled and self._allocated_blocks is None:
+            self._allocated_blocks = sys.getallocatedblocks()
+        self._frame_start = time.perf_counter()
+
+    def end_frame(self):
+        """
+        Close the current frame and fold its scope times and counters into the averages.
+        """
+        now = time.perf_counter()
+        if self._frame_start is not None:
+            self._smooth('frame', 1e3 * (now - self._frame_start))
+        if not self.enabled or self._allocated_blocks is None:
+            self._allocated_blocks = None
+            return
+        blocks = sys.getallocatedblocks()
+        self._counters['allocated blocks'] = blocks - self._allocated_blocks
+        self._allocated_blocks = blocks
+
+        with self._lock:
+            frame_times, self._frame_times = self._frame_times, {}
+        names = set(frame_times) | {name for name in self.averages if name.endswith(' ms')}
+        for name in names:
+            self._smooth(name, frame_times.get(name, 0.0))
+        counters, self._counters = self._counters, {}
+        for name in set(counters) | {name for name in self.averages if not name.endswith(' ms') and name != 'frame'}:
+            value = counters.get(name, 0)
+            self._smooth(name, value)
+            if self.trace and len(self.trace_events) < self.max_trace_events:
+                self.trace_events.append({'name': name, 'ph': 'C', 'ts': 1e6 * (now - self._start), 'pid': 0,
+                                          'args': {name: value}})
+        self.frames += 1
+
+    @property
+    def fps(self):
+        """float: Frames per second, from the smoothed frame time."""
+        frame = self.averages.get('frame', 0.0)
+        return 1e3 / frame if frame > 0 else 0.0
+
+    def _smooth(self, name, value):
+        previous = self.averages.get(name)
+        self.averages[name] = value if previous is None else previous + _SMOOTHING * (value - previous)
+
+    def _add_duration(self, name, start, stop):
+        key = name + ' ms'
+        with self._lock:
+            self._frame_times[key] = self._frame_times.get(key, 0.0) + 1e3 * (stop - start)
+            if self.trace and len(self.trace_events) < self.max_trace_events:
+                self.trace_events.append({'name': name, 'ph': 'X', 'ts': 1e6 * (start - self._start),
+                                          'dur': 1e6 * (stop - start), 'pid': 0,
+                                          'tid': threading.get_ident()})
+
+    def instrument_gl(self, modules):
+        """
+        Count the GL calls made through the given modules.
+
+        Every gl* and glu* function bound in the modules is replaced with a wrapper that counts
+        its calls, and creations and deletions of GL objects (glGen*, glDelete*, gluNewQuadric,
+        ...) separately, so a per-frame leak shows up as a nonzero 'gl objects created' count.
+        Pass OpenGL.GL and OpenGL.GLU as well to catch functions imported later inside
+        functions. restore_gl puts the original functions back.
+
+        Parameters:
+        modules (iterable of module): Modules whose GL functions to wrap.
+        """
+        for module in modules:
+            for name, function in list(vars(module).items()):
+                if not name.startswith('gl') or not callable(function) or isinstance(function, type):
+                    continue
+                self._originals.append((module, name, function))
+                setattr(module, name, self._counted(name, function))
+
+    def restore_gl(self):
+        """
+        Undo instrument_gl.
+        """
+        for module, name, function in reversed(self._originals):
+            setattr(module, name, function)
+        self._originals = []
+
+    def _counted(self, name, function):
+        counter = None
+        if name.startswith(_CREATING):
+            counter = 'gl objects created'
+        elif name.startswith(_DELETING):
+            counter = 'gl objects deleted'
+
+        def counted(*args, **kwargs):
+            self.count('gl calls')
+            if counter is not None:
+                self.count(counter)
+            return function(*args, **kwargs)
+        counted.__wrapped__ = function
+        return counted
+
+    def save_trace(self, path):
+        """
+        Write the recorded trace events as a Chrome trace JSON file.
+
+        Parameters:
+        path (str): File to write.
+        """
+        with self._lock:
+            events = list(self.trace_events)
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
@@ -0,0 +1,154 @@
+import math
+
+import numpy as np
+
+# Level of detail of a body, from cheapest to most detailed
+LOD_CULLED = -1
+LOD_POINT = 0
+LOD_LOW = 1
+LOD_FULL = 2
+
+# Sphere tessellation (slices, stacks) for the mesh levels
+LOD_TESSELLATION = {
+    LOD_LOW: (12, 8),
+    LOD_FULL: (32, 32),
+}
+
+
+def rotation_matrix(angle, axis):
+    """
+    Build the 4x4 matrix of glRotatef(angle, *axis) for a coordinate axis.
+
+    Parameters:
+    angle (float): Rotation angle (degrees).
+    axis (int): 0, 1 or 2 for the x, y or z axis.
+
+    Returns:
+    np.array: The rotation matrix (shape: [4, 4]).
+    """
+    c, s = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+    i, j = [(1, 2), (2, 0), (0, 1)][axis]
+    matrix = np.eye(4)
+    matrix[i, i], matrix[i, j] = c, -s
+    matrix[j, i], matrix[j, j] = s, c
+    return matrix
+
+
+def translation_matrix(offset):
+    """
+    Build the 4x4 matrix of glTranslatef(*offset).
+
+    Parameters:
+    offset (np.array): Translation vector (shape: [3]).
+
+    Returns:
+    np.array: The translation matrix (shape: [4, 4]).
+    """
+    matrix = np.eye(4)
+    matrix[:3, 3] = offset
+    return matrix
+
+
+def view_matrix(zoom_level, camera_rot_x, camera_rot_y, target_position=None):
+    """
+    Build the camera transform that main.py applies to the scene.
+
+    It is the product of glTranslatef(0, 0, zoom_level), glRotatef(camera_rot_x, 1, 0, 0),
+    glRotatef(camera_rot_y, 0, 1, 0) and a translation that centers the target body. Load its
+    transpose with glMultMatrixd to apply it in OpenGL.
+
+    Parameters:
+    zoom_level (float): Distance of the camera along the z axis (negative values move it back).
+    camera_rot_x (float): Rotation about the x axis (degrees).
+    camera_rot_y (float): Rotation about the y axis (degrees).
+    target_position (np.array, optional): Position the camera is centered on (shape: [3]).
+
+    Returns:
+    np.array: The world-to-eye matrix (shape: [4, 4]).
+    """
+    matrix = translation_matrix([0.0, 0.0, zoom_level]) @ rotation_matrix(camera_rot_x, 0) \
+        @ rotation_matrix(camera_rot_y, 1)
+    if target_position is not None:
+        matrix = matrix @ translation_matrix(-np.asarray(target_position, dtype=float))
+    return matrix
+
+
+def to_eye_space(matrix, positions):
+    """
+    Transform world positions into eye space.
+
+    Parameters:
+    matrix (np.array): World-to-eye matrix (shape: [4, 4]).
+    positions (np.array): World position vectors (shape: [n, 3]).
+
+    Returns:
+    np.array: Eye-space position vectors; the camera looks down -z (shape: [n, 3]).
+    """
+    return positions @ matrix[:3, :3].T + matrix[:3, 3]
+
+
+def depth_range(eye_positions, radii, minimum_near=0.1, depth_ratio=1e6):
+    """
+    Pick near and far clipping distances that just enclose the scene in front of the camera.
+
+    Parameters:
+    eye_positions (np.array): Eye-space position vectors (shape: [n, 3]).
+    radii (np.array): Radii of the bodies (shape: [n]).
+    minimum_near (float, optional): Smallest allowed near distance.
+    depth_ratio (float, optional): Largest allowed far / near ratio, to keep depth buffer precision.
+
+    Returns:
+    tuple: The near and far distances.
+    """
+    depths = -eye_positions[:, 2]
+    far_edges = depths + radii
+    far = float(far_edges.max()) * 1.01 if len(depths) and far_edges.max() > 0 else 1.0
+    # Bodies entirely behind the camera do not matter; one reaching past minimum_near pins the
+    # near plane there rather than being clipped away
+    near_edges = (depths - radii)[far_edges > 0]
+    near = max(float(near_edges.min()) * 0.99, minimum_near) if len(near_edges) else minimum_near
+    # Bodies beyond near * depth_ratio are sacrificed rather than the precision of the whole scene
+    far = min(max(far, near * 10), near * depth_ratio)
+    return near, far
+
+
+def select_lod(eye_positions, radii, viewport_height, aspect, near, far, field_of_view=45,
+               full_pixels=40.0, low_pixels=4.0, point_only=None):
+    """
+    Cull bodies outside the view frustum and pick a level of detail for the rest.
+
+    The frustum test treats every body as a sphere and rejects it only when it lies entirely
+    outside one of the six clipping planes. Visible bodies are ranked by the diameter of their
+    projection in pixels: at least full_pixels gets the full mesh, at least low_pixels the
+    low-poly mesh and anything smaller a single point.
+
+    Parameters:
+    eye_positions (np.array): Eye-space position vectors (shape: [n, 3]).
+    radii (np.array): Radii of the bodies (shape: [n]).
+    viewport_height (int): Height of the viewport in pixels.
+    aspect (float): Width divided by height of the viewport.
+    near (float): Near clipping distance.
+    far (float): Far clipping distance.
+    field_of_view (float, optional): Vertical field of view (degrees).
+    full_pixels (float, optional): Projected diameter from which the full mesh is used.
+    low_pixels (float, optional): Projected diameter from which the low-poly mesh is used.
+    point_only (np.array, optional): Bodies that are never drawn as meshes (shape: [n], bool).
+
+    Returns:
+    np.array: One of LOD_CULLED, LOD_POINT, LOD_LOW and LOD_FULL per body (shape: [n]).
+    """
+    tan_vertical = math.tan(math.radians(field_of_view) / 2)
+    tan_horizontal = tan_vertical * aspect
+    x, y, z = eye_positions[:, 0], eye_positions[:, 1], eye_positions[:, 2]
+    depths = -z
+
+    # Signed distances to the side planes through the eye; positive is outside
+    horizontal = (np.abs(x) - tan_horizontal * depths) / math.sqrt(1 + tan_horizontal ** 2)
+    vertical = (np.abs(y) - tan_vertical * depths) / math.sqrt(1 + tan_vertical ** 2)
+    visible = (horizontal <= radii) & (vertical <= radii) & (depths + radii >= near) & (depths - radii <= far)
+
+    pixels = radii * viewport_height / (tan_vertical * np.maximum(depths, near))
+    lod = np.where(pixels >= full_pixels, LOD_FULL, np.where(pixels >= low_pixels, LOD_LOW, LOD_POINT))
+    if point_only is not None:
+        lod = np.where(point_only, LOD_POINT, lod)
+    return np.where(visible, lod, LOD_CULLED)
@@ -0,0 +1,149 @@
+import ctypes
+
+import numpy as np
+from OpenGL.GL import *
+
+import kepler
+import physics
+
+_VERTEX_SIZE = 3 * 4  # x, y, z as float32
+
+
+class OrbitRenderer:
+    def __init__(self, samples=128, energy_tolerance=1e-3):
+        """
+        Initialize a renderer for the predicted orbit of every body about its parent.
+
+        Each orbit is an ellipse sampled once from orbital elements and kept on the GPU relative
+        to its parent, so it follows the parent around without being touched. Analytic bodies
+        use their stored elements; for integrated bodies the elements are fitted to the current
+        position and velocity and refitted only when the body's specific orbital energy has
+        drifted by more than energy_tolerance. Orbits that share a parent are drawn with one
+        translation and one glMultiDrawArrays call.
+
+        Parameters:
+        samples (int, optional): Number of points per orbit.
+        energy_tolerance (float, optional): Relative energy change that triggers a refit.
+        """
+        self.samples = samples
+        self.energy_tolerance = energy_tolerance
+        self.position_buffer, self.color_buffer = glGenBuffers(2)
+        self.satellites = np.zeros(0, dtype=np.int64)
+        self.hosts = np.zeros(0, dtype=np.int64)
+
+    def set_bodies(self, colors, parents):
+        """
+        Set the bodies whose orbits are drawn and forget all cached orbits.
+
+        Parameters:
+        colors (np.array): RGB colors of all bodies (shape: [n, 3]).
+        parents (np.array): Index of every body's parent, or -1 for none (shape: [n]).
+        """
+        parents = np.asarray(parents)
+        self.satellites = np.flatnonzero(parents >= 0)
+        self.hosts = parents[self.satellites]
+        k = len(self.satellites)
+        self.elements = np.zeros((k, kepler.ELEMENT_COUNT))
+        self.energies = np.full(k, np.nan)
+        self.bound = np.zeros(k, dtype=bool)
+        self.groups = [(host, np.flatnonzero(self.hosts == host)) for host in np.unique(self.hosts)]
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.position_buffer)
+        glBufferData(GL_ARRAY_BUFFER, max(1, k * self.samples) * _VERTEX_SIZE, None, GL_DYNAMIC_DRAW)
+        # Orbits are drawn in a dimmed version of their body's color
+        vertex_colors = np.repeat(0.6 * np.asarray(colors, dtype=np.float32).reshape(-1, 3)[self.satellites],
+                                  self.samples, axis=0)
+        glBindBuffer(GL_ARRAY_BUFFER, self.color_buffer)
+        glBufferData(GL_ARRAY_BUFFER, vertex_colors if k else np.zeros(3, dtype=np.float32), GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def update(self, positions, velocities, masses, analytic, elements):
+        """
+        Refit and upload the orbits that changed since the last call.
+
+        Parameters:
+        positions (np.array): Position vectors of all bodies (shape: [n, 3]).
+        velocities (np.array): Velocity vectors of all bodies (shape: [n, 3]).
+        masses (np.array): Masses of all bodies (shape: [n]).
+        analytic (np.array): Whether each body moves on a fixed Kepler orbit (shape: [n]).
+        elements (np.array): Orbital elements of the analytic bodies (shape: [n, kepler.ELEMENT_COUNT]).
+        """
+        satellites, hosts = self.satellites, self.hosts
+        if len(satellites) == 0:
+            return
+        relative_positions = positions[satellites] - positions[hosts]
+        relative_velocities = velocities[satellites] - velocities[hosts]
+        mu = physics.G * (masses[satellites] + masses[hosts])
+        energies = 0.5 * np.einsum('ij,ij->i', relative_velocities, relative_velocities) \
+            - mu / np.linalg.norm(relative_positions, axis=1)
+
+        fixed = analytic[satellites]
+        fixed_changed = fixed & np.any(self.elements != elements[satellites], axis=1)
+        drifted = ~fixed & ~(np.abs(energies - self.energies) <= self.energy_tolerance * np.abs(self.energies))
+        changed = np.flatnonzero(fixed_changed | drifted)
+        if len(changed) == 0:
+            return
+
+        self.energies[changed] = energies[changed]
+        # Radial orbits, e.g. a body at rest relative to its parent, are degenerate ellipses
+        # kepler can't fit; they are left undrawn like unbound ones
+        radial = ~fixed[changed] & ~np.any(np.cross(relative_positions[changed], relative_velocities[changed]), axis=1)
+        self.bound[changed] = (energies[changed] < 0) & ~radial
+        self.elements[changed] = elements[satellites[changed]]
+        fitted = changed[~fixed[changed] & self.bound[changed]]
+        if len(fitted):
+            self.elements[fitted] = kepler.elements_from_state(relative_positions[fitted], relative_velocities[fitted],
+                                                               mu[fitted])
+        drawable = changed[self.bound[changed]]
+        points = kepler.orbit_points(self.elements[drawable], self.samples).astype(np.float32)
+
+        orbit_size = self.samples * _VERTEX_SIZE
+        glBindBuffer(GL_ARRAY_BUFFER, self.position_buffer)
+        if len(drawable) > len(satellites) // 4:
+            # Many orbits changed, e.g. on the first call: one upload of the whole buffer
+            all_points = np.zeros((len(satellites), self.samples, 3), dtype=np.float32)
+            unchanged = np.setdiff1d(np.flatnonzero(self.bound), drawable)
+            all_points[unchanged] = kepler.orbit_points(self.elements[unchanged], self.samples)
+            all_points[drawable] = points
+            glBufferSubData(GL_ARRAY_BUFFER, 0, all_points.nbytes, all_points)
+        else:
+            for row, orbit in zip(drawable, points):
+                glBufferSubData(GL_ARRAY_BUFFER, int(row) * orbit_size, orbit_size, orbit)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def draw(self, positions):
+        """
+        Draw the cached orbits around the current positions of their parents.
+
+        Parameters:
+        positions (np.array): Position vectors of all bodies (shape: [n, 3]).
+        """
+        if len(self.satellites) == 0:
+            return
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, self.position_buffer)
+        glVertexPointer(3, GL_FLOAT, 0, ctypes.c_void_p(0))
+        glBindBuffer(GL_ARRAY_BUFFER, self.color_buffer)
+        glColorPointer(3, GL_FLOAT, 0, ctypes.c_void_p(0))
+
+        for host, rows in self.groups:
+            rows = rows[self.bound[rows]]
+            if len(rows) == 0:
+                continue
+            glPushMatrix()
+            glTranslated(*positions[host])
+            firsts = (rows * self.samples).astype(np.int32)
+            counts = np.full(len(rows), self.samples, dtype=np.int32)
+            glMultiDrawArrays(GL_LINE_LOOP, firsts, counts, len(rows))
+            glPopMatrix()
+
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+
+    def release(self):
+        """
+        Delete the GPU buffers.
+        """
+        glDeleteBuffers(2, [self.position_buffer, self.color_buffer])
@@ -0,0 +1,109 @@
+import ctypes
+import math
+
+import numpy as np
+from OpenGL.GL import *
+from OpenGL.GL.shaders import compileProgram, compileShader
+
+_VERTEX_SHADER = """
+#version 120
+attribute float radius;
+uniform float point_scale;
+void main() {
+    vec4 eye_position = gl_ModelViewMatrix * gl_Vertex;
+    gl_Position = gl_ProjectionMatrix * eye_position;
+    gl_PointSize = max(2.0 * radius * point_scale / max(-eye_position.z, 1e-6), 1.5);
+    gl_FrontColor = gl_Color;
+}
+"""
+
+_FRAGMENT_SHADER = """
+#version 120
+void main() {
+    vec2 offset = gl_PointCoord - vec2(0.5);
+    if (dot(offset, offset) > 0.25) {
+        discard;
+    }
+    gl_FragColor = gl_Color;
+}
+"""
+
+_FLOATS_PER_VERTEX = 7  # x, y, z, r, g, b, radius
+_STRIDE = _FLOATS_PER_VERTEX * 4
+
+
+class PointRenderer:
+    def __init__(self):
+        """
+        Initialize a renderer that draws many small bodies as round point sprites in one call.
+
+        Positions, colors and radii of the drawn bodies are packed into a single interleaved
+        vertex buffer, so drawing N bodies costs one buffer upload and one glDrawArrays instead
+        of N transform-and-draw sequences. A small shader sizes every sprite from the body's
+        radius and its distance to the camera.
+        """
+        self.program = compileProgram(compileShader(_VERTEX_SHADER, GL_VERTEX_SHADER),
+                                      compileShader(_FRAGMENT_SHADER, GL_FRAGMENT_SHADER))
+        self.radius_location = glGetAttribLocation(self.program, 'radius')
+        self.point_scale_location = glGetUniformLocation(self.program, 'point_scale')
+        self.buffer = glGenBuffers(1)
+        self.attributes = np.zeros((0, _FLOATS_PER_VERTEX), dtype=np.float32)
+
+    def set_bodies(self, colors, radii):
+        """
+        Set the static attributes of all bodies of the state.
+
+        Parameters:
+        colors (np.array): RGB colors of all bodies (shape: [n, 3]).
+        radii (np.array): Radii of all bodies (shape: [n]).
+        """
+        self.attributes = np.zeros((len(radii), _FLOATS_PER_VERTEX), dtype=np.float32)
+        self.attributes[:, 3:6] = colors
+        self.attributes[:, 6] = radii
+
+    def draw(self, positions, viewport_height, indices, field_of_view=45):
+        """
+        Upload the current positions of some bodies and draw them as point sprites.
+
+        Parameters:
+        positions (np.array): Position vectors of all bodies in the state (shape: [n, 3]).
+        viewport_height (int): Height of the viewport in pixels.
+        indices (np.array): Indices of the bodies to draw, e.g. those at LOD_POINT (shape: [k]).
+        field_of_view (float, optional): Vertical field of view of the projection (degrees).
+        """
+        if not len(indices):
+            return
+        vertices = self.attributes[indices]
+        vertices[:, 0:3] = positions[indices]
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STREAM_DRAW)
+
+        glUseProgram(self.program)
+        glUniform1f(self.point_scale_location, viewport_height / (2 * math.tan(math.radians(field_of_view) / 2)))
+        glEnable(GL_VERTEX_PROGRAM_POINT_SIZE)
+        glEnable(GL_POINT_SPRITE)
+
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glEnableVertexAttribArray(self.radius_location)
+        glVertexPointer(3, GL_FLOAT, _STRIDE, ctypes.c_void_p(0))
+        glColorPointer(3, GL_FLOAT, _STRIDE, ctypes.c_void_p(12))
+        glVertexAttribPointer(self.radius_location, 1, GL_FLOAT, GL_FALSE, _STRIDE, ctypes.c_void_p(24))
+
+        glDrawArrays(GL_POINTS, 0, len(vertices))
+
+        glDisableVertexAttribArray(self.radius_location)
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glDisable(GL_POINT_SPRITE)
+        glDisable(GL_VERTEX_PROGRAM_POINT_SIZE)
+        glUseProgram(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def release(self):
+        """
+        Delete the GPU buffer and shader program.
+        """
+        glDeleteBuffers(1, [self.buffer])
+        glDeleteProgram(self.program)
@@ -0,0 +1,59 @@
+from OpenGL.GL import *
+from OpenGL.GLU import *
+
+# Display lists of unit spheres, keyed by (slices, stacks)
+_sphere_lists = {}
+
+
+def get_sphere_list(slices=32, stacks=32):
+    """
+    Return a display list that draws a unit sphere, building it on first use.
+
+    The tessellation is done once per (slices, stacks) pair and stored on the GPU; drawing a
+    body afterwards only costs a transform and a glCallList.
+
+    Parameters:
+    slices (int, optional): Number of subdivisions around the z axis.
+    stacks (int, optional): Number of subdivisions along the z axis.
+
+    Returns:
+    int: The OpenGL display list id.
+    """
+    key = (slices, stacks)
+    display_list = _sphere_lists.get(key)
+    if display_list is None:
+        quad = gluNewQuadric()
+        display_list = glGenLists(1)
+        glNewList(display_list, GL_COMPILE)
+        gluSphere(quad, 1.0, slices, stacks)
+        glEndList()
+        gluDeleteQuadric(quad)
+        _sphere_lists[key] = display_list
+    return display_list
+
+
+def draw_sphere(position, radius, slices=32, stacks=32):
+    """
+    Draw a sphere from the cached meshes using the current color.
+
+    Parameters:
+    position (np.array): Center of the sphere (shape: [3]).
+    radius (float): Radius of the sphere.
+    slices (int, optional): Number of subdivisions around the z axis.
+    stacks (int, optional): Number of subdivisions along the z axis.
+    """
+    display_list = get_sphere_list(slices, stacks)
+    glPushMatrix()
+    glTranslatef(*position)
+    glScalef(radius, radius, radius)
+    glCallList(display_list)
+    glPopMatrix()
+
+
+def release_sphere_lists():
+    """
+    Delete all cached sphere meshes; they are rebuilt on their next use.
+    """
+    for display_list in _sphere_lists.values():
+        glDeleteLists(display_list, 1)
+    _sphere_lists.clear()
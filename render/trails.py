@@ -0,0 +1,108 @@
+import ctypes
+
+import numpy as np
+from OpenGL.GL import *
+
+_VERTEX_SIZE = 3 * 4  # x, y, z as float32
+
+
+class TrailRenderer:
+    def __init__(self, length=256):
+        """
+        Initialize a renderer for the motion trails of all bodies.
+
+        Every body keeps its last length positions in a ring buffer on the GPU. The buffer is
+        laid out slot by slot (all bodies' positions of one sample next to each other) and holds
+        every sample twice, in slot i and i + length, so the newest length samples are always one
+        contiguous window. Appending a sample therefore costs two glBufferSubData calls of one
+        row each, and all trails are drawn in a single call by moving the vertex pointer to the
+        start of the window; the index and color buffers never change.
+
+        Parameters:
+        length (int, optional): Number of positions per trail.
+        """
+        self.length = length
+        self.n_bodies = 0
+        self.head = 0  # Slot of the newest sample
+        self.position_buffer, self.color_buffer, self.index_buffer = glGenBuffers(3)
+        self.index_count = 0
+
+    def set_bodies(self, colors, positions):
+        """
+        Start new trails for a set of bodies, all collapsed onto their current positions.
+
+        Parameters:
+        colors (np.array): RGB colors of all bodies (shape: [n, 3]).
+        positions (np.array): Current position vectors of all bodies (shape: [n, 3]).
+        """
+        n, length = len(positions), self.length
+        self.n_bodies = n
+        self.head = 0
+        samples = np.broadcast_to(np.asarray(positions, dtype=np.float32), (2 * length, n, 3))
+        glBindBuffer(GL_ARRAY_BUFFER, self.position_buffer)
+        glBufferData(GL_ARRAY_BUFFER, np.ascontiguousarray(samples), GL_DYNAMIC_DRAW)
+
+        # Vertex k * n + b of the window is sample k (0 is the oldest) of body b; older samples fade out
+        fade = np.linspace(0.0, 1.0, length, dtype=np.float32)
+        vertex_colors = np.empty((length, n, 4), dtype=np.float32)
+        vertex_colors[:, :, :3] = np.asarray(colors, dtype=np.float32)
+        vertex_colors[:, :, 3] = fade[:, np.newaxis]
+        glBindBuffer(GL_ARRAY_BUFFER, self.color_buffer)
+        glBufferData(GL_ARRAY_BUFFER, vertex_colors, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+        # One line segment between consecutive samples of every body
+        starts = np.arange((length - 1) * n, dtype=np.uint32)
+        indices = np.stack([starts, starts + n], axis=1)
+        self.index_count = indices.size
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.index_buffer)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices, GL_STATIC_DRAW)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+    def push(self, positions):
+        """
+        Append the current positions of all bodies, dropping the oldest sample.
+
+        Parameters:
+        positions (np.array): Position vectors of all bodies (shape: [n, 3]).
+        """
+        if len(positions) != self.n_bodies or self.n_bodies == 0:
+            return
+        self.head = (self.head + 1) % self.length
+        row = np.ascontiguousarray(positions, dtype=np.float32)
+        row_size = self.n_bodies * _VERTEX_SIZE
+        glBindBuffer(GL_ARRAY_BUFFER, self.position_buffer)
+        glBufferSubData(GL_ARRAY_BUFFER, self.head * row_size, row_size, row)
+        glBufferSubData(GL_ARRAY_BUFFER, (self.head + self.length) * row_size, row_size, row)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def draw(self):
+        """
+        Draw the trails of all bodies as fading lines.
+        """
+        if self.index_count == 0:
+            return
+        window_start = (self.head + 1) * self.n_bodies * _VERTEX_SIZE
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, self.position_buffer)
+        glVertexPointer(3, GL_FLOAT, 0, ctypes.c_void_p(window_start))
+        glBindBuffer(GL_ARRAY_BUFFER, self.color_buffer)
+        glColorPointer(4, GL_FLOAT, 0, ctypes.c_void_p(0))
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.index_buffer)
+
+        glDrawElements(GL_LINES, self.index_count, GL_UNSIGNED_INT, ctypes.c_void_p(0))
+
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glDisable(GL_BLEND)
+
+    def release(self):
+        """
+        Delete the GPU buffers.
+        """
+        glDeleteBuffers(3, [self.position_buffer, self.color_buffer, self.index_buffer])
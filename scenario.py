@@ -0,0 +1,303 @@
+"""
+Scenario files: JSON or TOML descriptions of a system of celestial bodies.
+
+A scenario holds a list of bodies, each with a name, radius, mass and RGB color and the name
+of its parent body, if any. Parents must be listed before their satellites. A body starts at
+
+    "position" / "velocity"   absolute vectors, or
+    "orbit"                   Keplerian elements about its parent: a, e and the angles i, node
+                              (longitude of the ascending node), peri (argument of periapsis)
+                              and M (mean anomaly), in degrees and relative to the ecliptic
+
+Bodies with "analytic": true follow a fixed Kepler orbit about their parent instead of being
+integrated (see physics.set_analytic). An entry with a "belt" table instead of a single orbit
+generates belt.count bodies named "<name> 1", "<name> 2", ... whose a, e and i are drawn
+uniformly from [min, max] ranges and whose angles are uniform, e.g. an asteroid belt.
+
+The optional "units" table sets the units of the numbers in the file:
+
+    length        positions, semi-major axes and (with time) velocities; default "m"
+    radius        body radii; defaults to the length unit, "scene" means simulation units
+    mass          masses; default "kg"
+    time          the time unit of velocities; default "s"
+    scene_length  size of one simulation length unit, in length units; default 1
+
+The simulation keeps seconds and the SI value of physics.G, so with a scene length of L metres
+masses become kg / L^3. "radius_scale" enlarges all radii for display. The ecliptic x-y plane
+maps to the x-z plane of the scene, with the ecliptic north pole pointing up along +y.
+"barycentric": true moves the system so that the center of mass of the integrated bodies
+rests at the origin.
+
+Building a large scenario (orbits, belts, barycentric correction, initial accelerations) takes
+a while, so load_scenario caches the built system in an .npz file keyed by the SHA-256 of the
+scenario file; later launches load that instead.
+"""
+import hashlib
+import json
+import os
+import zipfile
+
+import numpy as np
+
+from entity.celestial_body import CelestialBody
+from entity.system_state import SystemState
+import kepler
+import physics
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+CACHE_VERSION = 1
+STATE_ARRAYS = ('names', 'radii', 'colors', 'positions', 'velocities', 'accelerations', 'masses', 'parents',
+                'analytic', 'elements')
+
+# Sizes of the supported units in SI units
+LENGTH_UNITS = {'m': 1.0, 'km': 1e3, 'earth_radius': 6.371e6, 'solar_radius': 6.957e8, 'au': 1.495978707e11,
+                'ly': 9.4607304725808e15, 'pc': 3.0856775814913673e16}
+MASS_UNITS = {'kg': 1.0, 'earth_mass': 5.9722e24, 'jupiter_mass': 1.89819e27, 'solar_mass': 1.98847e30}
+TIME_UNITS = {'s': 1.0, 'min': 60.0, 'h': 3600.0, 'day': 86400.0, 'year': 3.15576e7}
+
+# Ecliptic (x, y, z) to scene (x, z, -y)
+_ECLIPTIC_TO_SCENE = np.array([[1.0, 0.0, 0.0],
+                               [0.0, 0.0, 1.0],
+                               [0.0, -1.0, 0.0]])
+
+
+def default_cache_dir():
+    """
+    Return the directory scenario caches are written to by default.
+    """
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'solarsim')
+
+
+def load_scenario(path, use_cache=True, cache_dir=None):
+    """
+    Build a system of celestial bodies from a JSON or TOML scenario file.
+
+    Parameters:
+    path (str): Path of the scenario file; files ending in .toml are read as TOML.
+    use_cache (bool, optional): Whether to load and store the built system in the cache.
+    cache_dir (str, optional): Directory of the cache; defaults to default_cache_dir().
+
+    Returns:
+    SystemState: The system holding all bodies, in file order, with current accelerations.
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    cache_path = None
+    if use_cache:
+        # The physical constants are part of the key since the cached accelerations depend on them
+        key = hashlib.sha256(data)
+        key.update(repr((CACHE_VERSION, physics.G, physics.epsilon)).encode())
+        cache_path = os.path.join(cache_dir or default_cache_dir(), key.hexdigest() + '.npz')
+        state = _load_cache(cache_path)
+        if state is not None:
+            return state
+
+    state = build_state(parse_scenario(data, toml=path.endswith('.toml')))
+    if cache_path is not None:
+        try:
+            _save_cache(state, cache_path)
+        except OSError:
+            pass  # A read-only cache directory only costs the next launch some time
+    return state
+
+
+def parse_scenario(data, toml=False):
+    """
+    Parse the contents of a scenario file.
+
+    Parameters:
+    data (bytes): Contents of the file.
+    toml (bool, optional): Whether the contents are TOML rather than JSON.
+
+    Returns:
+    dict: The scenario.
+    """
+    if not toml:
+        return json.loads(data)
+    if tomllib is None:
+        raise ImportError("Reading TOML scenarios needs Python 3.11 or newer.")
+    return tomllib.loads(data.decode())
+
+
+def _unit_scales(scenario):
+    # Factors converting the numbers in the file to simulation units
+    units = scenario.get('units', {})
+    length = LENGTH_UNITS[units.get('length', 'm')]
+    scene_length = units.get('scene_length', 1) * length
+    radius_unit = units.get('radius', units.get('length', 'm'))
+    radius = 1.0 if radius_unit == 'scene' else LENGTH_UNITS[radius_unit] / scene_length
+    return {
+        'length': length / scene_length,
+        'radius': radius * scenario.get('radius_scale', 1),
+        'mass': MASS_UNITS[units.get('mass', 'kg')] / scene_length ** 3,
+        'velocity': length / TIME_UNITS[units.get('time', 's')] / scene_length,
+    }
+
+
+def _range(value, rng, count):
+    # A [min, max] pair draws uniformly from the range; a single number is used for every body
+    if isinstance(value, (list, tuple)):
+        return rng.uniform(value[0], value[1], count)
+    return np.full(count, float(value))
+
+
+def _orbit_elements(orbits, mu, scales):
+    # Elements of orbits given in file units: a dict of arrays a, e, i, node, peri and M
+    elements = kepler.elements_from_angles(scales['length'] * orbits['a'], orbits['e'],
+                                           *(np.radians(orbits[name]) for name in ('i', 'node', 'peri', 'M')), mu)
+    elements[:, 4:7] = elements[:, 4:7] @ _ECLIPTIC_TO_SCENE.T
+    elements[:, 7:10] = elements[:, 7:10] @ _ECLIPTIC_TO_SCENE.T
+    return elements
+
+
+def _single_orbit(orbit):
+    # Everything but the semi-major axis defaults to 0
+    return {name: np.array([float(orbit.get(name, 0.0))]) for name in ('a', 'e', 'i', 'node', 'peri', 'M')}
+
+
+def _belt_orbits(belt):
+    rng = np.random.default_rng(belt.get('seed', 0))
+    count = int(belt['count'])
+    orbits = {name: _range(belt.get(name, 0.0), rng, count) for name in ('a', 'e', 'i')}
+    for name in ('node', 'peri', 'M'):
+        orbits[name] = rng.uniform(0, 360, count)
+    return orbits
+
+
+def build_state(scenario):
+    """
+    Build a system of celestial bodies from a parsed scenario.
+
+    Parameters:
+    scenario (dict): The scenario, see the module documentation.
+
+    Returns:
+    SystemState: The system holding all bodies, in file order, with current accelerations.
+    """
+    scales = _unit_scales(scenario)
+    entries = scenario['bodies']
+    state = SystemState(capacity=sum(int(entry['belt']['count']) if 'belt' in entry else 1 for entry in entries))
+    bodies_by_name = {}
+    analytic_bodies = []
+    for entry in entries:
+        parent_name = entry.get('parent')
+        if parent_name is not None and parent_name not in bodies_by_name:
+            raise ValueError(f"Parent {parent_name!r} of {entry['name']!r} must be listed before it.")
+        parent = bodies_by_name.get(parent_name)
+        if 'belt' in entry:
+            orbits = _belt_orbits(entry['belt'])
+            names = [f"{entry['name']} {number}" for number in range(1, len(orbits['a']) + 1)]
+        else:
+            orbits = _single_orbit(entry['orbit']) if 'orbit' in entry else None
+            names = [entry['name']]
+        mass = scales['mass'] * entry['mass']
+
+        if orbits is None:
+            positions = [scales['length'] * np.array(entry.get('position', [0, 0, 0]), dtype=float)]
+            velocities = [scales['velocity'] * np.array(entry.get('velocity', [0, 0, 0]), dtype=float)]
+        else:
+            if parent is None:
+                raise ValueError(f"{entry['name']!r} needs a parent body to orbit.")
+            elements = _orbit_elements(orbits, physics.G * (mass + parent.mass), scales)
+            relative_positions, relative_velocities = kepler.state_from_elements(elements, 0.0)
+            positions = parent.position + relative_positions
+            velocities = parent.velocity + relative_velocities
+
+        for name, position, velocity in zip(names, positions, velocities):
+            body = CelestialBody(p_name=name,
+                                 radius=scales['radius'] * entry['radius'],
+                                 mass=mass,
+                                 color=tuple(entry['color']),
+                                 initial_position=position,
+                                 initial_velocity=velocity,
+                                 parent_body=parent,
+                                 state=state)
+            bodies_by_name[name] = body
+            if entry.get('analytic', False):
+                analytic_bodies.append(body)
+
+    integrated = np.ones(len(state), dtype=bool)
+    integrated[[body.index for body in analytic_bodies]] = False
+    if scenario.get('barycentric', False):
+        # Analytic bodies are test particles, so only the integrated ones carry momentum
+        weights = state.masses * integrated
+        state.positions[:] -= weights @ state.positions / weights.sum()
+        state.velocities[:] -= weights @ state.velocities / weights.sum()
+    if analytic_bodies:
+        physics.set_analytic(state, analytic_bodies)
+
+    state.accelerations[integrated] = physics.calculate_accelerations(state.positions[integrated],
+                                                                      state.masses[integrated])
+    state.accelerations_current = True
+    return state
+
+
+def state_to_arrays(state):
+    """
+    Collect everything needed to rebuild a system into plain arrays, e.g. to store or share it.
+
+    Parameters:
+    state (SystemState): The system.
+
+    Returns:
+    dict: Arrays keyed by the names in STATE_ARRAYS.
+    """
+    return {
+        'names': np.array([body.p_name for body in state.bodies], dtype=str),
+        'radii': state.radii.copy(),
+        'colors': np.array([body.color for body in state.bodies], dtype=float).reshape(-1, 3),
+        'positions': state.positions.copy(),
+        'velocities': state.velocities.copy(),
+        'accelerations': state.accelerations.copy(),
+        'masses': state.masses.copy(),
+        'parents': state.parents.copy(),
+        'analytic': state.analytic.copy(),
+        'elements': state.elements.copy(),
+    }
+
+
+def state_from_arrays(arrays, accelerations_current=True):
+    """
+    Rebuild a system from the arrays of state_to_arrays.
+
+    Parameters:
+    arrays (dict): Arrays keyed by the names in STATE_ARRAYS.
+    accelerations_current (bool, optional): Whether the stored accelerations match the positions.
+
+    Returns:
+    SystemState: A new system with one new body per row.
+    """
+    state = SystemState(capacity=len(arrays['names']))
+    for name, radius, color, mass in zip(arrays['names'].tolist(), arrays['radii'].tolist(),
+                                         arrays['colors'].tolist(), arrays['masses'].tolist()):
+        CelestialBody(p_name=name, radius=radius, mass=mass, color=tuple(color), state=state)
+    # Parents are linked once every body exists: after collisions a parent can follow its satellites
+    for body, parent in zip(state.bodies, arrays['parents'].tolist()):
+        if parent >= 0:
+            body.parent_body = state.bodies[parent]
+    for name in ('positions', 'velocities', 'accelerations', 'analytic', 'elements'):
+        getattr(state, name)[:] = arrays[name]
+    state.accelerations_current = accelerations_current
+    return state
+
+
+def _save_cache(state, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as file:
+        np.savez(file, **state_to_arrays(state))
+    os.replace(temporary_path, path)  # Another process never sees a half-written cache
+
+
+def _load_cache(path):
+    try:
+        with np.load(path) as cache:
+            arrays = {name: cache[name] for name in STATE_ARRAYS}
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        return None  # Missing or damaged; it is rebuilt
+    return state_from_arrays(arrays)
@@ -0,0 +1,309 @@
+import threading
+import time
+
+import checkpoint
+import collisions
+import physics
+from profiler import Profiler
+
+
+class Snapshot:
+    __slots__ = ('positions', 'velocities', 'masses', 'analytic', 'elements', 'time', 'wall_time')
+
+    def __init__(self, positions, velocities, sim_time, wall_time, masses=None, analytic=None, elements=None):
+        """
+        Initialize a published copy of the per-body arrays the render loop reads.
+
+        All arrays describe the same bodies in the same rows, even while collisions shrink the
+        state on the worker thread.
+
+        Parameters:
+        positions (np.array): Position vectors of all bodies (shape: [n, 3]).
+        velocities (np.array): Velocity vectors of all bodies (shape: [n, 3]).
+        sim_time (float): Simulation time of the positions (s).
+        wall_time (float): time.perf_counter() value when the positions were published.
+        masses (np.array, optional): Masses of all bodies (shape: [n]).
+        analytic (np.array, optional): Whether each body moves on a fixed Kepler orbit (shape: [n]).
+        elements (np.array, optional): Orbital elements of the analytic bodies (shape: [n, kepler.ELEMENT_COUNT]).
+        """
+        self.positions = positions
+        self.velocities = velocities
+        self.masses = masses
+        self.analytic = analytic
+        self.elements = elements
+        self.time = sim_time
+        self.wall_time = wall_time
+
+    def copy_state(self, state, wall_time):
+        """
+        Copy the arrays of a system into the snapshot, reusing its buffers when the body count is unchanged.
+
+        Parameters:
+        state (SystemState): The system.
+        wall_time (float): time.perf_counter() value to record.
+        """
+        for name in ('positions', 'velocities', 'masses', 'analytic', 'elements'):
+            source = getattr(state, name)
+            target = getattr(self, name)
+            if target is None or target.shape != source.shape:
+                setattr(self, name, source.copy())
+            else:
+                target[:] = source
+        self.time = state.time
+        self.wall_time = wall_time
+
+    def copy(self):
+        return Snapshot(self.positions.copy(), self.velocities.copy(), self.time, self.wall_time, self.masses.copy(),
+                        self.analytic.copy(), self.elements.copy())
+
+
+class Simulation:
+    def __init__(self, state, timestep, speed_up, integrator=physics.step, max_catch_up=0.25, recorder=None,
+                 profiler=None, collide=False, diagnostics=None, checkpointer=None):
+        """
+        Initialize a fixed-step simulation that runs on its own worker thread.
+
+        The worker advances the state in fixed steps of timestep simulated seconds, as many as
+        needed to keep the simulated clock at speed_up times the wall clock. After every step it
+        publishes a copy of the positions, velocities, masses and orbits. The render loop never
+        touches the state buffers directly; it reads the two most recent snapshots through
+        interpolated_positions and latest_state, so it stays responsive no matter how long a
+        physics step takes.
+
+        Parameters:
+        state (SystemState): The system to simulate.
+        timestep (float): Fixed physics time step (s).
+        speed_up (float): Simulated seconds per wall-clock second.
+        integrator (callable, optional): Function advancing (state, delta_time), e.g. physics.step.
+        max_catch_up (float, optional): Wall-clock seconds of backlog after which the simulation
+            gives up catching up and runs slower than real time instead.
+        recorder (TrajectoryWriter, optional): Receives the positions after every step.
+        profiler (Profiler, optional): Times every step under the 'physics' scope and collision
+            handling under 'collisions'.
+        collide (bool, optional): Whether touching bodies are merged after every step, see
+            collisions.py. The body list then shrinks on the worker thread; compare the length
+            of the published positions with your copy of the list to notice.
+        diagnostics (Diagnostics, optional): Observes the state after every step, see
+            diagnostics.py; timed under the 'diagnostics' scope.
+        checkpointer (Checkpointer, optional): Receives the checkpoints asked for with
+            request_checkpoint, see checkpoint.py.
+        """
+        self.state = state
+        self.timestep = timestep
+        self.speed_up = speed_up
+        self.integrator = integrator
+        self.max_catch_up = max_catch_up
+        self.recorder = recorder
+        if recorder is not None:
+            recorder.append(state.time, state.positions)
+        self.profiler = profiler if profiler is not None else Profiler()
+        self.collide = collide
+        self.diagnostics = diagnostics
+        self.checkpointer = checkpointer
+        self._checkpoint_request = None  # View settings of a checkpoint the worker should take
+        self._request_lock = threading.Lock()
+        self.merged_into = {}  # Body removed in a collision -> body it was merged into
+        self.paused = False
+        self.steps = 0
+        self.last_step_duration = 0.0  # Wall-clock seconds the most recent step took
+
+        # Held by the worker while it changes the state; take it before adding or removing bodies
+        self.state_lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        now = time.perf_counter()
+        self._previous, self._current, self._spare = (Snapshot(None, None, state.time, now) for _ in range(3))
+        for snapshot in (self._previous, self._current, self._spare):
+            snapshot.copy_state(state, now)
+
+        self._running = threading.Event()
+        self._thread = None
+
+    @property
+    def steps_per_second(self):
+        """float: Number of physics steps the worker runs per wall-clock second."""
+        return self.speed_up / self.timestep
+
+    def start(self):
+        """
+        Start the worker thread.
+        """
+        if self._thread is not None:
+            return
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, name='physics', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the worker thread, wait for it to finish its current step and close the recorder.
+        """
+        self._running.clear()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def publish(self):
+        """
+        Publish the current positions, velocities, masses and orbits as the newest snapshot.
+
+        The worker calls this after every step; call it yourself (holding state_lock) after
+        changing the state from another thread so the change shows up immediately.
+        """
+        spare = self._spare
+        spare.copy_state(self.state, time.perf_counter())
+        with self._snapshot_lock:
+            self._spare = self._previous
+            self._previous = self._current
+            self._current = spare
+
+    def interpolated_positions(self):
+        """
+        Return body positions interpolated between the two most recent snapshots.
+
+        The result trails the simulation by at most one step, which lets motion look smooth at
+        the render frame rate even when it differs from the physics rate.
+
+        Returns:
+        tuple: Position vectors (shape: [n, 3]) and the simulation time they correspond to (s).
+        """
+        with self._snapshot_lock:
+            previous, current = self._previous, self._current
+            interval = current.time - previous.time
+            if self.paused or interval <= 0 or previous.positions.shape != current.positions.shape:
+                return current.positions.copy(), current.time
+            elapsed = (time.perf_counter() - current.wall_time) * self.speed_up
+            alpha = min(max(elapsed / interval, 0.0), 1.0)
+            positions = previous.positions + alpha * (current.positions - previous.positions)
+            return positions, previous.time + alpha * interval
+
+    def latest_state(self):
+        """
+        Return a copy of the newest snapshot, without interpolation.
+
+        Use its masses, analytic flags and elements rather than those of the state, which the
+        worker may be changing; all its arrays have the same rows.
+
+        Returns:
+        Snapshot: The copy.
+        """
+        with self._snapshot_lock:
+            return self._current.copy()
+
+    def request_checkpoint(self, **view):
+        """
+        Ask the worker to take a checkpoint after its current step and submit it to the checkpointer.
+
+        Unlike take_checkpoint this returns at once, so the render loop does not wait for a
+        physics step to finish; the worker also serves the request while paused.
+
+        Parameters:
+        **view: JSON-compatible settings to store alongside, e.g. the camera.
+        """
+        if self.checkpointer is None:
+            raise ValueError("The simulation has no checkpointer to submit checkpoints to.")
+        with self._request_lock:
+            self._checkpoint_request = view
+
+    def take_checkpoint(self, **view):
+        """
+        Take a checkpoint of the state between two steps, see checkpoint.capture.
+
+        This waits for the step in progress; use request_checkpoint from the render loop.
+
+        Parameters:
+        **view: JSON-compatible settings to store alongside, e.g. the camera.
+
+        Returns:
+        Checkpoint: The checkpoint.
+        """
+        with self.state_lock:
+            return checkpoint.capture(self.state, self.steps, **view)
+
+    def restore(self, saved):
+        """
+        Rewind the state to a checkpoint from take_checkpoint, putting back bodies merged since.
+
+        Stepping on from there repeats the original run bit for bit. Both snapshots are
+        replaced, so the render loop does not interpolate across the jump.
+
+        Parameters:
+        saved (Checkpoint): The checkpoint.
+        """
+        if self.recorder is not None:
+            raise ValueError("A recorded trajectory can't go back in time.")
+        with self.state_lock:
+            checkpoint.restore_state(saved, self.state)
+            self.steps = saved.metadata['steps']
+            for body in self.state.bodies:
+                self.merged_into.pop(body, None)
+            if self.diagnostics is not None:
+                self.diagnostics.reset()
+            self.publish()
+            self.publish()
+
+    def resolve_collisions(self):
+        """
+        Merge the touching bodies of the state; call holding state_lock.
+
+        Returns:
+        list: The merges as (merged body, list of removed bodies) pairs; empty when no bodies touch.
+        """
+        result = collisions.resolve_collisions(self.state)
+        if result is None:
+            return []
+        merges, row_map = result
+        for survivor, removed in merges:
+            for body in removed:
+                self.merged_into[body] = survivor
+        if self.recorder is not None:
+            self.recorder.remap(row_map)
+        return merges
+
+    def merged_body(self, body):
+        """
+        Return the body that a body removed in collisions lives on in, or the body itself.
+        """
+        while body in self.merged_into:
+            body = self.merged_into[body]
+        return body
+
+    def _run(self):
+        backlog = 0.0  # Simulated time owed to the wall clock
+        last = time.perf_counter()
+        while self._running.is_set():
+            now = time.perf_counter()
+            if not self.paused:
+                backlog += (now - last) * self.speed_up
+            last = now
+            backlog = min(backlog, self.max_catch_up * self.speed_up)
+
+            if backlog >= self.timestep:
+                with self.state_lock:
+                    start = time.perf_counter()
+                    with self.profiler.scope('physics'):
+                        self.integrator(self.state, self.timestep)
+                    if self.collide:
+                        with self.profiler.scope('collisions'):
+                            self.resolve_collisions()
+                    if self.diagnostics is not None:
+                        with self.profiler.scope('diagnostics'):
+                            self.diagnostics.observe(self.state)
+                    self.last_step_duration = time.perf_counter() - start
+                    self.steps += 1
+                    self.publish()
+                    if self.recorder is not None:
+                        self.recorder.append(self.state.time, self.state.positions)
+                backlog -= self.timestep
+            else:
+                # Sleep until the next step is due, but stay responsive to stop() and speed changes
+                wait = (self.timestep - backlog) / self.speed_up if self.speed_up > 0 else 0.01
+                time.sleep(min(wait, 0.01))
+
+            # Take the request and clear it in one go, so a request made meanwhile is not lost
+            with self._request_lock:
+                view, self._checkpoint_request = self._checkpoint_request, None
+            if view is not None:
+                with self.state_lock:
+                    self.checkpointer.submit(checkpoint.capture(self.state, self.steps, **view))
@@ -0,0 +1,229 @@
+"""
+Headless command line interface for the solar system simulation.
+
+Runs the physics without pygame or OpenGL, for long integrations on machines without a display:
+
+    python -m solarsim run scenarios/default.json --steps 1e6 --dt 500 --output run.traj
+
+and runs ensembles of variants of a scenario in parallel (see ensemble.py):
+
+    python -m solarsim ensemble scenarios/default.json --sweep Earth.speed_factor=0.9:1.1:9 --output sweep.csv
+"""
+import argparse
+import sys
+import time
+from functools import partial
+
+import backends
+import barnes_hut
+import checkpoint
+import diagnostics
+import ensemble
+import physics
+from scenario import load_scenario
+from trajectory import TrajectoryWriter
+
+
+def make_integrator(args):
+    """
+    Build the integrator function selected on the command line.
+
+    Parameters:
+    args (argparse.Namespace): Parsed command line arguments.
+
+    Returns:
+    callable: Function advancing (state, delta_time).
+    """
+    if args.compensated and args.integrator != 'verlet':
+        raise SystemExit('Compensated summation is only implemented for the verlet integrator.')
+    if args.integrator == 'adaptive':
+        if args.solver != 'direct':
+            raise SystemExit('The adaptive integrator only supports the direct solver.')
+        return partial(physics.step_adaptive, accuracy=args.accuracy, max_substeps=args.max_substeps)
+    backend = backends.load_backend(args.backend)
+    if args.solver == 'barnes-hut':
+        solver = partial(barnes_hut.calculate_accelerations, theta=args.theta)
+    else:
+        solver = backend.calculate_accelerations
+    if args.integrator == 'hierarchical':
+        return partial(physics.step_hierarchical, solver=solver, accuracy=args.accuracy,
+                       max_substeps=args.max_substeps)
+    if args.solver == 'barnes-hut' or args.compensated:
+        return partial(physics.step, solver=solver, compensated=args.compensated)
+    return backend.step
+
+
+def run(args):
+    """
+    Integrate a scenario for a number of steps, report the speed and optionally save the trajectory.
+
+    Parameters:
+    args (argparse.Namespace): Parsed command line arguments.
+    """
+    if args.resume:
+        resumed = checkpoint.load_checkpoint(args.resume)
+        state = checkpoint.restore_state(resumed)
+        first_step = resumed.metadata['steps'] + 1
+    elif args.scenario:
+        state = load_scenario(args.scenario, use_cache=not args.no_cache)
+        first_step = 1
+    else:
+        raise SystemExit('Give a scenario or a checkpoint to --resume from.')
+    integrator = make_integrator(args)
+    steps = int(args.steps)
+    print(f'{len(state)} bodies, {steps} steps of {args.dt} s ({args.integrator}, {args.solver})'
+          + (f', resuming after step {first_step - 1}' if args.resume else ''))
+    checkpointer = checkpoint.Checkpointer(args.checkpoint) if args.checkpoint else None
+
+    recorder = TrajectoryWriter(args.output, state.bodies) if args.output else None
+    if recorder:
+        recorder.append(state.time, state.positions)
+    monitor = diagnostics.Diagnostics(args.diagnostics_every, args.energy_tolerance, args.axis_tolerance) \
+        if args.diagnostics_every > 0 else None
+    flag_count = 0
+    if monitor:
+        monitor.observe(state)  # The initial state is the baseline
+    start = time.perf_counter()
+    last_report = start
+    for step_index in range(first_step, steps + 1):
+        integrator(state, args.dt)
+        if recorder and step_index % args.record_every == 0:
+            recorder.append(state.time, state.positions)
+        if checkpointer and step_index % args.checkpoint_every == 0:
+            checkpointer.submit(checkpoint.capture(state, step_index))
+        if monitor and monitor.observe(state) and len(monitor.flags) > flag_count:
+            for flag in monitor.flags[flag_count:]:
+                print(f'step {step_index}, t = {state.time:.6g} s: {flag}')
+            flag_count = len(monitor.flags)
+            if args.stop_unstable:
+                steps = step_index
+                break
+        now = time.perf_counter()
+        if now - last_report >= args.report_interval:
+            drift = f", energy drift {monitor.statistics['energy drift'].last:.2e}" if monitor else ''
+            rate = (step_index - first_step + 1) / (now - start)
+            print(f'step {step_index}/{steps}: {rate:.1f} steps/s{drift}')
+            last_report = now
+    elapsed = time.perf_counter() - start
+
+    run_steps = max(steps - first_step + 1, 0)
+    print(f'Finished {run_steps} steps in {elapsed:.2f} s ({run_steps / max(elapsed, 1e-12):.1f} steps/s), '
+          f'simulated time {state.time:.6g} s')
+    if checkpointer:
+        last_step = max(steps, first_step - 1)
+        checkpointer.submit(checkpoint.capture(state, last_step))
+        checkpointer.close()
+        if checkpointer.error:
+            raise SystemExit(f'Writing the checkpoint failed: {checkpointer.error}')
+        print(f'Wrote the checkpoint after step {last_step} to {args.checkpoint}')
+    if monitor:
+        monitor.measure(state)
+        print('Diagnostics: ' + ('stable' if monitor.stable else 'UNSTABLE'))
+        for line in monitor.lines:
+            print(f'  {line}')
+    if recorder:
+        recorder.close()
+        print(f'Wrote {recorder.frames} frames to {args.output}')
+
+
+def run_ensemble(args):
+    """
+    Run every variant of a scenario in worker processes and write a table of their metrics.
+
+    Parameters:
+    args (argparse.Namespace): Parsed command line arguments.
+    """
+    state = load_scenario(args.scenario, use_cache=not args.no_cache)
+    try:
+        sweeps = [ensemble.parse_sweep(text) for text in args.sweep]
+        variants = ensemble.make_variants(sweeps, args.perturb)
+        ensemble.check_variants(state, variants)
+    except ValueError as error:
+        raise SystemExit(str(error))
+    steps = int(args.steps)
+    swept_dt = [values for name, values in sweeps if name == 'dt']
+    step_sizes = ', '.join(f'{value:g}' for value in swept_dt[-1]) if swept_dt else f'{args.dt:g}'
+    print(f'{len(variants)} variants of {len(state)} bodies, {steps} steps of {step_sizes} s ({args.integrator})')
+
+    results = []
+    start = time.perf_counter()
+    runs = ensemble.run_ensemble(state, variants, steps, args.dt, integrator=args.integrator, backend=args.backend,
+                                 workers=args.workers, collide=args.collisions, sample_every=args.sample_every,
+                                 axis_tolerance=args.axis_tolerance, position_sigma=args.position_sigma,
+                                 velocity_sigma=args.velocity_sigma, seed=args.seed)
+    for result in runs:
+        results.append(result)
+        parameters = ', '.join(f'{name}={value:g}' for name, value in result.items() if name not in ensemble.METRICS)
+        print(f"[{len(results)}/{len(variants)}] {parameters or 'base'}: energy error {result['energy_error']:.3g}, "
+              f"min distance {result['min_distance']:.6g}, {'stable' if result['stable'] else 'unstable'}")
+    elapsed = time.perf_counter() - start
+
+    stable = sum(result['stable'] for result in results)
+    print(f'Finished {len(results)} runs in {elapsed:.2f} s; {stable} stable, {len(results) - stable} unstable')
+    if args.output:
+        ensemble.write_csv(results, args.output)
+        print(f'Wrote {args.output}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='solarsim', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='integrate a scenario without a display')
+    run_parser.add_argument('scenario', nargs='?', help='scenario JSON or TOML file; not needed with --resume')
+    run_parser.add_argument('--no-cache', action='store_true', help='rebuild the scenario instead of loading it from the cache')
+    run_parser.add_argument('--steps', type=float, default=1000, help='number of steps (accepts 1e6)')
+    run_parser.add_argument('--dt', type=float, default=500, help='time step (s)')
+    run_parser.add_argument('--integrator', choices=('verlet', 'adaptive', 'hierarchical'), default='verlet')
+    run_parser.add_argument('--solver', choices=('direct', 'barnes-hut'), default='direct')
+    run_parser.add_argument('--backend', choices=backends.BACKEND_NAMES, default=backends.DEFAULT_BACKEND,
+                            help='direct summation kernels (see backends.py)')
+    run_parser.add_argument('--compensated', action='store_true',
+                            help='Kahan-compensated position and velocity updates for long verlet runs')
+    run_parser.add_argument('--theta', type=float, default=0.5, help='Barnes-Hut opening angle')
+    run_parser.add_argument('--accuracy', type=float, default=0.03, help='adaptive and hierarchical timestep accuracy')
+    run_parser.add_argument('--max-substeps', type=int, default=64, help='adaptive and hierarchical substeps per step')
+    run_parser.add_argument('--output', help='record the trajectory into this directory (see trajectory.py)')
+    run_parser.add_argument('--record-every', type=int, default=1, help='record every n-th step')
+    run_parser.add_argument('--report-interval', type=float, default=1.0, help='seconds between progress lines')
+    run_parser.add_argument('--checkpoint', help='write a checkpoint to this file periodically and at the end')
+    run_parser.add_argument('--checkpoint-every', type=int, default=10000, help='steps between checkpoints')
+    run_parser.add_argument('--resume', help='continue from a checkpoint, up to --steps steps in total')
+    run_parser.add_argument('--diagnostics-every', type=int, default=100,
+                            help='steps between energy, momentum and orbit checks (see diagnostics.py); 0 disables them')
+    run_parser.add_argument('--energy-tolerance', type=float, default=1e-3, help='relative energy drift that flags the run')
+    run_parser.add_argument('--axis-tolerance', type=float, default=0.05,
+                            help='relative semi-major axis change that flags a satellite')
+    run_parser.add_argument('--stop-unstable', action='store_true', help='stop at the first flag')
+    run_parser.set_defaults(handler=run)
+
+    ensemble_parser = subparsers.add_parser('ensemble', help='run variants of a scenario in parallel')
+    ensemble_parser.add_argument('scenario', help='scenario JSON or TOML file')
+    ensemble_parser.add_argument('--no-cache', action='store_true', help='rebuild the scenario instead of loading it from the cache')
+    ensemble_parser.add_argument('--sweep', action='append', default=[],
+                                 help='NAME=start:stop:count or NAME=v1,v2,...; NAME is dt or BODY.FIELD with FIELD '
+                                      f"one of {', '.join(ensemble.BODY_FIELDS)}; repeat for a grid")
+    ensemble_parser.add_argument('--perturb', type=int, default=0, help='perturbed copies of every swept combination')
+    ensemble_parser.add_argument('--position-sigma', type=float, default=0.0, help='standard deviation of position perturbations')
+    ensemble_parser.add_argument('--velocity-sigma', type=float, default=0.0, help='standard deviation of velocity perturbations')
+    ensemble_parser.add_argument('--seed', type=int, default=0, help='seed of the perturbations')
+    ensemble_parser.add_argument('--steps', type=float, default=1000, help='number of steps per run (accepts 1e6)')
+    ensemble_parser.add_argument('--dt', type=float, default=500, help='time step (s), unless swept')
+    ensemble_parser.add_argument('--integrator', choices=ensemble.INTEGRATORS, default='hierarchical')
+    ensemble_parser.add_argument('--backend', choices=backends.BACKEND_NAMES, default=backends.DEFAULT_BACKEND,
+                                 help='direct summation kernels (see backends.py)')
+    ensemble_parser.add_argument('--collisions', action='store_true', help='merge touching bodies (see collisions.py)')
+    ensemble_parser.add_argument('--sample-every', type=int, default=1, help='steps between closest approach samples')
+    ensemble_parser.add_argument('--axis-tolerance', type=float, default=0.1,
+                                 help='largest relative semi-major axis change of a stable run')
+    ensemble_parser.add_argument('--workers', type=int, help='worker processes; defaults to the number of CPU cores')
+    ensemble_parser.add_argument('--output', help='write the results as CSV to this file')
+    ensemble_parser.set_defaults(handler=run_ensemble)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,44 @@
+"""
+Tests of the regression check of the physics benchmark and of its committed baseline.
+
+Run from the repository root with python -m pytest.
+"""
+import json
+import os
+
+import pytest
+
+from benchmarks import bench_physics
+
+BASELINE = os.path.join(os.path.dirname(__file__), os.pardir, 'benchmarks', 'baseline.json')
+
+
+def result(latency=1e-3, memory=2 ** 20, energy_error=1e-10, backend='numpy'):
+    return {'integrator': 'verlet', 'backend': backend, 'n': 100, 'steps': 100, 'steps_per_second': 1 / latency,
+            'latency_median': latency, 'latency_p95': latency, 'peak_memory': memory, 'energy_error': energy_error}
+
+
+@pytest.mark.parametrize("changed, regressions", [
+    ({}, 0),
+    ({'latency': 1.1e-3}, 0),
+    ({'latency': 1.3e-3}, 1),
+    ({'memory': 4 * 2 ** 20}, 1),
+    ({'energy_error': 5e-10}, 0),
+    ({'energy_error': 2e-9}, 1),
+    ({'latency': 2e-3, 'energy_error': 1e-8}, 2),
+    ({'backend': 'numba', 'latency': 1.0}, 0),  # Not in the baseline
+])
+def test_compare(changed, regressions):
+    baseline = {'results': [result()]}
+    assert len(bench_physics.compare([result(**changed)], baseline, threshold=0.2, energy_factor=10.0)) == regressions
+
+
+def test_baseline_covers_quick_cases():
+    with open(BASELINE) as file:
+        baseline = json.load(file)
+    assert baseline['version'] == bench_physics.FORMAT_VERSION
+    cases = {bench_physics.case_key(case) for case in baseline['results']}
+    for backend in ('numpy', 'barnes_hut'):
+        for integrator in ('verlet', 'hierarchical'):
+            for n in bench_physics.QUICK_SIZES:
+                assert (integrator, backend, n) in cases
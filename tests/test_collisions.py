@@ -0,0 +1,109 @@
+"""
+Tests of the spatial-hash collision detection and of merging touching bodies.
+
+Run from the repository root with python -m pytest.
+"""
+import numpy as np
+import pytest
+
+import collisions
+from entity.celestial_body import CelestialBody
+from entity.system_state import SystemState
+
+
+def brute_force_collisions(positions, radii):
+    # Every pair compared directly, in the format of find_collisions
+    first, second = np.triu_indices(len(radii), 1)
+    separations = positions[second] - positions[first]
+    touching = np.einsum('ij,ij->i', separations, separations) <= (radii[first] + radii[second]) ** 2
+    return np.column_stack((first[touching], second[touching]))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_find_collisions_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    n = 400
+    positions = rng.uniform(-50, 50, (n, 3))
+    radii = rng.uniform(0.1, 2.0, n)
+    radii[:3] = [30.0, 12.0, 8.0]  # Bodies too large for the cells
+    radii[3:10] = 0.0
+    positions[3:6] = positions[6]  # Coincident point bodies
+    np.testing.assert_array_equal(collisions.find_collisions(positions, radii),
+                                  brute_force_collisions(positions, radii))
+
+
+def test_find_collisions_with_cell_sizes():
+    rng = np.random.default_rng(7)
+    positions = rng.uniform(-10, 10, (200, 3))
+    radii = rng.uniform(0.0, 0.8, 200)
+    expected = brute_force_collisions(positions, radii)
+    for cell_size in (0.0, 0.05, 1.0, 100.0):
+        np.testing.assert_array_equal(collisions.find_collisions(positions, radii, cell_size), expected)
+
+
+def test_coincident_point_bodies_collide():
+    positions = np.array([[1.0, 2.0, 3.0], [1.0, 2.0, 3.0], [4.0, 0.0, 0.0], [4.0, 0.0, 1e-9], [-7.0, 5.0, 0.0]])
+    pairs = collisions.find_collisions(positions, np.zeros(5))
+    assert pairs.tolist() == [[0, 1]]
+
+
+def test_collision_groups_chain():
+    groups = collisions.collision_groups(np.array([[0, 3], [3, 5], [1, 2]]), 7)
+    assert [group.tolist() for group in groups] == [[0, 3, 5], [1, 2]]
+
+
+def system():
+    """
+    Build a Sun with an Earth and its Moon, a heavier Rock touching the Earth and a distant Comet.
+
+    Returns:
+    SystemState: The system, in the rows Sun, Earth, Moon, Rock, Comet.
+    """
+    state = SystemState()
+    sun = CelestialBody("Sun", 4, 10000.0, (1, 1, 0), state=state)
+    earth = CelestialBody("Earth", 1, 100.0, (0, 0, 1), np.array([20.0, 0, 0]), np.array([0, 0, -1.8e-4]),
+                          parent_body=sun, state=state)
+    CelestialBody("Moon", 0.3, 1.0, (0.5, 0.5, 0.5), np.array([23.0, 0, 0]), np.array([0, 0, -1.9e-4]),
+                  parent_body=earth, state=state)
+    CelestialBody("Rock", 1, 300.0, (1, 0, 0), np.array([20.5, 0, 0]), np.array([0, 1e-5, -1.7e-4]),
+                  parent_body=sun, state=state)
+    CelestialBody("Comet", 0.2, 0.5, (1, 1, 1), np.array([-60.0, 0, 0]), np.array([0, 0, 1e-4]),
+                  parent_body=sun, state=state)
+    return state
+
+
+def test_merge_conserves_mass_and_momentum_and_reparents():
+    state = system()
+    earth, moon, rock = state.bodies[1:4]
+    total_mass = state.masses.sum()
+    momentum = state.masses @ state.velocities
+    center_of_mass = state.masses @ state.positions
+    volume = np.sum(state.radii[[1, 3]] ** 3)
+
+    merges, row_map = collisions.resolve_collisions(state)
+
+    assert [(survivor.p_name, [body.p_name for body in removed]) for survivor, removed in merges] \
+        == [("Rock", ["Earth"])]
+    assert [body.p_name for body in state.bodies] == ["Sun", "Moon", "Rock", "Comet"]
+    # The Earth's row goes to the Rock it was merged into
+    assert row_map.tolist() == [0, 2, 1, 2, 3]
+    assert state.parents.tolist() == [-1, 2, 0, 0]
+    assert moon.parent_body is rock
+    assert earth.state is not state
+    assert state.masses.sum() == pytest.approx(total_mass, rel=1e-15)
+    np.testing.assert_allclose(state.masses @ state.velocities, momentum, rtol=1e-14, atol=1e-20)
+    np.testing.assert_allclose(state.masses @ state.positions, center_of_mass, rtol=1e-14)
+    assert rock.radius == pytest.approx(np.cbrt(volume))
+    assert collisions.resolve_collisions(state) is None
+
+
+def test_merge_of_a_parent_into_its_satellite():
+    # A satellite heavier than its parent survives the merge with it and the Rock, and takes over
+    # the parent's parent
+    state = system()
+    state.masses[2] = 1000.0
+    state.positions[2] = state.positions[1]
+    merges, row_map = collisions.resolve_collisions(state)
+    assert [body.p_name for body in state.bodies] == ["Sun", "Moon", "Comet"]
+    assert state.parents.tolist() == [-1, 0, 0]
+    assert row_map.tolist() == [0, 1, 1, 1, 2]
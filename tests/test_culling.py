@@ -0,0 +1,96 @@
+"""
+Tests of view-frustum culling, level-of-detail selection and the fitted depth range, which need no GL context.
+
+Run from the repository root with python -m pytest.
+"""
+import math
+
+import numpy as np
+import pytest
+
+from render.culling import LOD_CULLED, LOD_FULL, LOD_LOW, LOD_POINT, depth_range, select_lod, to_eye_space, \
+    view_matrix
+
+HEIGHT = 600
+ASPECT = 1.5
+FIELD_OF_VIEW = 45
+TAN_VERTICAL = math.tan(math.radians(FIELD_OF_VIEW) / 2)
+TAN_HORIZONTAL = TAN_VERTICAL * ASPECT
+
+
+def lod(eye_positions, radii, near=1.0, far=1000.0, **options):
+    return select_lod(np.asarray(eye_positions, dtype=float), np.asarray(radii, dtype=float), HEIGHT, ASPECT,
+                      near, far, FIELD_OF_VIEW, **options)
+
+
+@pytest.mark.parametrize("axis, sign, tangent", [(0, 1, TAN_HORIZONTAL), (0, -1, TAN_HORIZONTAL),
+                                                 (1, 1, TAN_VERTICAL), (1, -1, TAN_VERTICAL)])
+def test_side_planes(axis, sign, tangent):
+    # Bodies of radius 1 at depth 100 whose centers lie beyond a side plane by less and by more than their radius
+    depth, radius = 100.0, 1.0
+    to_plane = tangent * depth  # Offset of the plane along the axis at this depth
+    slant = math.sqrt(1 + tangent ** 2)  # Offset along the axis per unit of distance from the plane
+    eye_positions = np.zeros((3, 3))
+    eye_positions[:, 2] = -depth
+    eye_positions[:, axis] = sign * np.array([to_plane - 5, to_plane + 0.9 * slant * radius,
+                                              to_plane + 1.1 * slant * radius])
+    assert lod(eye_positions, [radius] * 3)[0] != LOD_CULLED
+    assert lod(eye_positions, [radius] * 3)[1] != LOD_CULLED
+    assert lod(eye_positions, [radius] * 3)[2] == LOD_CULLED
+
+
+def test_near_and_far_planes():
+    near, far = 10.0, 100.0
+    # Radius 1: crossing near, short of near, inside, crossing far, beyond far, behind the camera
+    depths = [9.5, 8.5, 99.5, 100.5, 102.0, -5.0]
+    eye_positions = [[0.0, 0.0, -depth] for depth in depths]
+    levels = lod(eye_positions, [1.0] * len(depths), near, far)
+    assert (levels != LOD_CULLED).tolist() == [True, False, True, True, False, False]
+
+
+def test_lod_thresholds():
+    # Projected diameter in pixels is radius * HEIGHT / (TAN_VERTICAL * depth)
+    depth = 200.0
+    radius_per_pixel = TAN_VERTICAL * depth / HEIGHT
+    pixels = np.array([100.0, 40.01, 39.99, 4.01, 3.99, 0.5])  # Around both thresholds
+    levels = lod([[0.0, 0.0, -depth]] * len(pixels), pixels * radius_per_pixel)
+    assert levels.tolist() == [LOD_FULL, LOD_FULL, LOD_LOW, LOD_LOW, LOD_POINT, LOD_POINT]
+
+    levels = lod([[0.0, 0.0, -depth]] * 2, [40 * radius_per_pixel] * 2, full_pixels=50.0, low_pixels=10.0)
+    assert levels.tolist() == [LOD_LOW, LOD_LOW]
+    levels = lod([[0.0, 0.0, -depth]] * 2, [100 * radius_per_pixel] * 2, point_only=np.array([True, False]))
+    assert levels.tolist() == [LOD_POINT, LOD_FULL]
+
+
+def test_depth_range_encloses_scene():
+    eye_positions = np.array([[0.0, 0.0, -20.0], [3.0, 0.0, -300.0], [0.0, 0.0, 50.0]])
+    near, far = depth_range(eye_positions, np.array([4.0, 10.0, 1.0]))
+    assert near == pytest.approx(16 * 0.99)
+    assert far == pytest.approx(310 * 1.01)
+
+
+def test_depth_range_limits_ratio():
+    near, far = depth_range(np.array([[0.0, 0.0, -1.0], [0.0, 0.0, -1e9]]), np.array([0.5, 1.0]), depth_ratio=1e6)
+    assert far == pytest.approx(near * 1e6)
+
+
+def test_body_reaching_past_minimum_near_stays_visible():
+    # The body being looked at reaches past minimum_near; it must pin the near plane, not be clipped
+    eye_positions = np.array([[0.0, 0.0, -20.0], [0.0, -0.2, -0.5]])
+    radii = np.array([4.0, 1.0])
+    near, far = depth_range(eye_positions, radii, minimum_near=0.1)
+    assert near == 0.1
+    assert far >= 24.0
+    levels = select_lod(eye_positions, radii, HEIGHT, ASPECT, near, far, FIELD_OF_VIEW)
+    assert LOD_CULLED not in levels.tolist()
+
+
+def test_bodies_behind_camera_do_not_pin_near():
+    near, _ = depth_range(np.array([[0.0, 0.0, -20.0], [0.0, 0.0, 5.0]]), np.array([4.0, 1.0]), minimum_near=0.1)
+    assert near == pytest.approx(16 * 0.99)
+
+
+def test_view_matrix_centers_target():
+    target = np.array([10.0, -3.0, 7.0])
+    matrix = view_matrix(-50.0, 30.0, 45.0, target)
+    np.testing.assert_allclose(to_eye_space(matrix, target[np.newaxis]), [[0.0, 0.0, -50.0]], atol=1e-12)
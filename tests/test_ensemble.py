@@ -0,0 +1,107 @@
+"""
+Tests of the variants of parameter sweeps and ensembles.
+
+Run from the repository root with python -m pytest.
+"""
+import numpy as np
+import pytest
+
+import ensemble
+import physics
+from entity.celestial_body import CelestialBody
+from entity.system_state import SystemState
+from scenario import state_from_arrays, state_to_arrays
+
+
+def circular_velocity(parent, offset, mass):
+    # Velocity of a circular orbit in the x-z plane about a parent, at an offset along x
+    return parent.velocity + np.array([0, 0, -np.sqrt(physics.G * (parent.mass + mass) / offset)])
+
+
+def system_arrays():
+    """
+    Build a Sun with a Mars and an Earth, whose Moon has a Probe of its own, all on circular orbits.
+
+    Returns:
+    dict: The system as returned by scenario.state_to_arrays.
+    """
+    state = SystemState()
+    sun = CelestialBody("Sun", 4, 10000.0, (1, 1, 0), state=state)
+    earth = CelestialBody("Earth", 1, 100.0, (0, 0, 1), np.array([20.0, 0, 0]), circular_velocity(sun, 20.0, 100.0),
+                          parent_body=sun, state=state)
+    moon = CelestialBody("Moon", 0.3, 1.0, (0.5, 0.5, 0.5), np.array([22.5, 0, 0]),
+                         circular_velocity(earth, 2.5, 1.0), parent_body=earth, state=state)
+    CelestialBody("Probe", 0.01, 1e-6, (1, 1, 1), np.array([22.6, 0, 0]), circular_velocity(moon, 0.1, 1e-6),
+                  parent_body=moon, state=state)
+    CelestialBody("Mars", 0.5, 10.0, (1, 0, 0), np.array([-30.0, 0, 0]), -circular_velocity(sun, 30.0, 10.0),
+                  parent_body=sun, state=state)
+    return state_to_arrays(state)
+
+
+def relative_states(state, child, parent):
+    bodies = {body.p_name: body for body in state.bodies}
+    return (bodies[child].position - bodies[parent].position, bodies[child].velocity - bodies[parent].velocity)
+
+
+@pytest.mark.parametrize("field", ["speed_factor", "distance_factor"])
+def test_satellites_follow_their_parent(field):
+    arrays = system_arrays()
+    base = state_from_arrays(arrays)
+    state = state_from_arrays(arrays)
+    ensemble.apply_variant(state, {f"Earth.{field}": 0.9})
+
+    # The Earth's satellites, and theirs, keep their positions and velocities relative to it
+    for child, parent in (("Moon", "Earth"), ("Probe", "Moon")):
+        for changed, original in zip(relative_states(state, child, parent), relative_states(base, child, parent)):
+            np.testing.assert_allclose(changed, original, rtol=1e-12, atol=1e-15)
+    # The Earth itself changed relative to the Sun, and nothing else moved
+    earth_offset, earth_velocity = relative_states(state, "Earth", "Sun")
+    base_offset, base_velocity = relative_states(base, "Earth", "Sun")
+    if field == "speed_factor":
+        np.testing.assert_allclose(earth_velocity, 0.9 * base_velocity, rtol=1e-12)
+        np.testing.assert_allclose(earth_offset, base_offset, rtol=1e-12)
+    else:
+        np.testing.assert_allclose(earth_offset, 0.9 * base_offset, rtol=1e-12)
+        np.testing.assert_allclose(earth_velocity, base_velocity, rtol=1e-12)
+    for index in (0, 4):
+        np.testing.assert_array_equal(state.positions[index], base.positions[index])
+        np.testing.assert_array_equal(state.velocities[index], base.velocities[index])
+
+
+def test_apply_variant_sets_masses_and_dt():
+    state = state_from_arrays(system_arrays())
+    dt = ensemble.apply_variant(state, {"Mars.mass_factor": 2.0, "Sun.radius": 5.0, "dt": 250.0})
+    assert dt == 250.0
+    assert state.masses[4] == 20.0
+    assert state.radii[0] == 5.0
+    assert not state.accelerations_current
+    with pytest.raises(ValueError):
+        ensemble.apply_variant(state, {"Pluto.mass": 1.0})
+
+
+def test_run_variant_keeps_a_moved_moon_bound():
+    arrays = system_arrays()
+    result = ensemble.run_variant(arrays, {"Earth.distance_factor": 1.01}, steps=50, dt=500.0,
+                                  integrator=physics.step)
+    assert result["Earth.distance_factor"] == 1.01
+    assert result["unbound"] == 0 and result["merged"] == 0
+    assert result["min_distance"] == pytest.approx(0.1, rel=0.5)  # The Probe stays close to the Moon
+
+
+def test_min_distance_matches_brute_force():
+    rng = np.random.default_rng(3)
+    positions = rng.uniform(-100, 100, (300, 3))
+    separations = positions[:, np.newaxis] - positions[np.newaxis]
+    distances = np.sqrt(np.einsum('ijk,ijk->ij', separations, separations))[np.triu_indices(300, 1)]
+    assert ensemble._min_distance(positions, block_elements=1000) == distances.min()
+    assert ensemble._min_distance(positions, below=2 * distances.min()) == distances.min()
+    assert ensemble._min_distance(positions, below=0.5 * distances.min()) == 0.5 * distances.min()
+
+
+def test_make_variants():
+    sweeps = [ensemble.parse_sweep("Earth.speed_factor=0.9:1.1:3"), ensemble.parse_sweep("dt=250,500")]
+    variants = ensemble.make_variants(sweeps, perturbations=2)
+    assert len(variants) == 12
+    assert variants[0] == {"Earth.speed_factor": 0.9, "dt": 250.0, "perturbation": 0}
+    with pytest.raises(ValueError):
+        ensemble.parse_sweep("Earth.colour=1")
@@ -0,0 +1,65 @@
+"""
+Two-body regression tests of the kick-drift-kick Velocity Verlet step, physics.step.
+
+Run from the repository root with python -m pytest.
+"""
+import numpy as np
+import pytest
+
+import physics
+from entity.celestial_body import CelestialBody
+from entity.system_state import SystemState
+
+ORBITS = 20
+
+
+def circular_orbit(sun_mass=10000.0, planet_mass=100.0, distance=20.0):
+    """
+    Build a planet on a circular orbit about a sun, with the center of mass at rest at the origin.
+
+    Parameters:
+    sun_mass (float, optional): Mass of the sun.
+    planet_mass (float, optional): Mass of the planet.
+    distance (float, optional): Distance between the two bodies.
+
+    Returns:
+    tuple: The SystemState and the orbital period (s).
+    """
+    total_mass = sun_mass + planet_mass
+    speed = np.sqrt(physics.G * total_mass / distance)  # Relative speed of the planet
+    state = SystemState(capacity=2)
+    sun = CelestialBody(p_name="Sun", radius=4, mass=sun_mass, color=(1, 1, 0),
+                        initial_position=np.array([-planet_mass / total_mass * distance, 0, 0]),
+                        initial_velocity=np.array([0, 0, planet_mass / total_mass * speed]),
+                        state=state)
+    CelestialBody(p_name="Earth", radius=1, mass=planet_mass, color=(0, 0, 1),
+                  initial_position=np.array([sun_mass / total_mass * distance, 0, 0]),
+                  initial_velocity=np.array([0, 0, -sun_mass / total_mass * speed]),
+                  parent_body=sun, state=state)
+    return state, 2 * np.pi * distance / speed
+
+
+# Time steps of 60 frames per second at speed_up = 50000 and at two and four times that, with the
+# largest relative energy error allowed over ORBITS orbits
+@pytest.mark.parametrize("delta_time, energy_tolerance", [(833, 6e-7), (1666, 2.4e-6), (3333, 9e-6)])
+def test_two_body_conservation(delta_time, energy_tolerance):
+    state, period = circular_orbit()
+    initial_energy = physics.total_energy(state.positions, state.velocities, state.masses)
+    initial_angular_momentum = physics.angular_momentum(state.positions, state.velocities, state.masses)
+
+    steps = int(ORBITS * period / delta_time)
+    energy_errors = np.empty(steps)
+    angular_momentum_errors = np.empty(steps)
+    for index in range(steps):
+        physics.step(state, delta_time)
+        energy = physics.total_energy(state.positions, state.velocities, state.masses)
+        energy_errors[index] = abs((energy - initial_energy) / initial_energy)
+        angular_momentum = physics.angular_momentum(state.positions, state.velocities, state.masses)
+        angular_momentum_errors[index] = (np.linalg.norm(angular_momentum - initial_angular_momentum)
+                                          / np.linalg.norm(initial_angular_momentum))
+
+    assert energy_errors.max() < energy_tolerance
+    # Bounded rather than drifting: the second half of the run is no worse than the first
+    half = steps // 2
+    assert energy_errors[half:].max() < 1.5 * energy_errors[:half].max()
+    assert angular_momentum_errors.max() < 1e-12
@@ -0,0 +1,297 @@
+"""
+Chunked trajectory recording and memory-mapped replay.
+
+A trajectory is a directory holding three files:
+
+    header.json    names, masses, radii, colors and parent indices of the bodies
+    times.f64      simulation time of every frame, raw little-endian float64 (shape: [frames])
+    positions.f64  positions of every frame, raw little-endian float64 (shape: [frames, n, 3])
+
+Frames are buffered in memory and appended to the raw files one chunk at a time, so a
+recording costs one array copy per frame and one write per chunk. Readers memory-map the raw
+files, so any frame of an arbitrarily long recording is available without loading the rest.
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+import kepler
+from entity.celestial_body import CelestialBody
+from entity.system_state import SystemState
+from simulation import Snapshot
+
+FORMAT_VERSION = 1
+_DTYPE = np.dtype('<f8')
+
+
+class TrajectoryWriter:
+    def __init__(self, path, bodies, chunk_size=256):
+        """
+        Create a new trajectory recording for a fixed set of bodies.
+
+        Parameters:
+        path (str): Directory to write the trajectory to; created if missing, overwritten if present.
+        bodies (list of CelestialBody): The bodies whose positions will be recorded, in state order.
+        chunk_size (int, optional): Number of frames buffered in memory before they are written.
+        """
+        self.path = path
+        self.n_bodies = len(bodies)
+        self.chunk_size = chunk_size
+        self.frames = 0
+        os.makedirs(path, exist_ok=True)
+
+        index_of = {id(body): index for index, body in enumerate(bodies)}
+        header = {
+            'version': FORMAT_VERSION,
+            'names': [body.p_name for body in bodies],
+            'masses': [float(body.mass) for body in bodies],
+            'radii': [float(body.radius) for body in bodies],
+            'colors': [list(body.color) for body in bodies],
+            'parents': [index_of.get(id(body.parent_body), -1) for body in bodies],
+        }
+        with open(os.path.join(path, 'header.json'), 'w') as file:
+            json.dump(header, file, indent=2)
+
+        self._times_file = open(os.path.join(path, 'times.f64'), 'wb')
+        self._positions_file = open(os.path.join(path, 'positions.f64'), 'wb')
+        self._times = np.empty(chunk_size, dtype=_DTYPE)
+        self._positions = np.empty((chunk_size, self.n_bodies, 3), dtype=_DTYPE)
+        self._buffered = 0
+        self._rows = None  # Row of the appended positions that every recorded body is read from
+        self._row_count = self.n_bodies  # Number of rows append expects
+
+    def remap(self, row_map):
+        """
+        Follow a change of the body list, e.g. after collisions.merge_groups removed bodies.
+
+        The recording keeps its fixed set of bodies; a removed body is recorded at the position
+        of the body it was merged into from now on.
+
+        Parameters:
+        row_map (np.array): New row of every row of the previous positions (shape: [n_previous]).
+        """
+        row_map = np.asarray(row_map)
+        self._rows = row_map if self._rows is None else row_map[self._rows]
+        self._row_count = int(row_map.max()) + 1 if len(row_map) else 0
+
+    def append(self, sim_time, positions):
+        """
+        Record one frame.
+
+        Parameters:
+        sim_time (float): Simulation time of the frame (s).
+        positions (np.array): Position vectors of all bodies (shape: [n, 3]).
+        """
+        if len(positions) != self._row_count:
+            raise ValueError(f'Expected {self._row_count} bodies, got {len(positions)}.')
+        self._times[self._buffered] = sim_time
+        if self._rows is None:
+            self._positions[self._buffered] = positions
+        else:
+            np.take(positions, self._rows, axis=0, out=self._positions[self._buffered])
+        self._buffered += 1
+        self.frames += 1
+        if self._buffered == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered frames to disk.
+        """
+        if self._buffered:
+            self._times[:self._buffered].tofile(self._times_file)
+            self._positions[:self._buffered].tofile(self._positions_file)
+            self._buffered = 0
+        self._times_file.flush()
+        self._positions_file.flush()
+
+    def close(self):
+        """
+        Write the remaining frames and close the files.
+        """
+        if self._times_file.closed:
+            return
+        self.flush()
+        self._times_file.close()
+        self._positions_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TrajectoryReader:
+    def __init__(self, path):
+        """
+        Open a recorded trajectory for replay without reading its frames into memory.
+
+        Parameters:
+        path (str): Directory written by a TrajectoryWriter.
+        """
+        self.path = path
+        with open(os.path.join(path, 'header.json')) as file:
+            header = json.load(file)
+        if header.get('version') != FORMAT_VERSION:
+            raise ValueError(f'Unsupported trajectory format version {header.get("version")!r}.')
+        self.names = header['names']
+        self.masses = np.array(header['masses'])
+        self.radii = np.array(header['radii'])
+        self.colors = [tuple(color) for color in header['colors']]
+        self.parents = np.array(header['parents'], dtype=np.int64)
+        n_bodies = len(self.names)
+
+        # A writer that is still running may have written a partial frame; ignore it
+        times_size = os.path.getsize(os.path.join(path, 'times.f64')) // _DTYPE.itemsize
+        positions_size = os.path.getsize(os.path.join(path, 'positions.f64')) // (_DTYPE.itemsize * 3 * n_bodies)
+        frames = min(times_size, positions_size)
+        if frames == 0:
+            raise ValueError(f'{path} contains no frames.')
+        self.times = np.memmap(os.path.join(path, 'times.f64'), dtype=_DTYPE, mode='r', shape=(frames,))
+        self.positions = np.memmap(os.path.join(path, 'positions.f64'), dtype=_DTYPE, mode='r',
+                                   shape=(frames, n_bodies, 3))
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def start_time(self):
+        return float(self.times[0])
+
+    @property
+    def end_time(self):
+        return float(self.times[-1])
+
+    def positions_at(self, sim_time):
+        """
+        Return the body positions at any time within the recording.
+
+        Only the two frames around sim_time are read from disk; positions between them are
+        linearly interpolated.
+
+        Parameters:
+        sim_time (float): Simulation time (s); clamped to the recorded range.
+
+        Returns:
+        np.array: Position vectors of all bodies (shape: [n, 3]).
+        """
+        index = int(np.searchsorted(self.times, sim_time, side='right'))
+        if index <= 0:
+            return np.array(self.positions[0])
+        if index >= len(self):
+            return np.array(self.positions[-1])
+        earlier, later = self.times[index - 1], self.times[index]
+        alpha = (sim_time - earlier) / (later - earlier) if later > earlier else 0.0
+        return self.positions[index - 1] + alpha * (self.positions[index] - self.positions[index - 1])
+
+    def velocities_at(self, sim_time):
+        """
+        Estimate the body velocities at any time within the recording from the two frames around it.
+
+        Parameters:
+        sim_time (float): Simulation time (s); clamped to the recorded range.
+
+        Returns:
+        np.array: Velocity vectors of all bodies, zero for a single-frame recording (shape: [n, 3]).
+        """
+        if len(self) < 2:
+            return np.zeros(self.positions.shape[1:])
+        index = min(max(int(np.searchsorted(self.times, sim_time, side='right')), 1), len(self) - 1)
+        interval = self.times[index] - self.times[index - 1]
+        if interval <= 0:
+            return np.zeros(self.positions.shape[1:])
+        return (self.positions[index] - self.positions[index - 1]) / interval
+
+    def build_state(self):
+        """
+        Create a system of celestial bodies matching the recorded ones, placed at the first frame
+        and moving with the velocities estimated from the first two frames.
+
+        Returns:
+        SystemState: The system holding one body per recorded body, in recorded order.
+        """
+        state = SystemState(capacity=len(self.names))
+        initial_velocities = self.velocities_at(self.start_time)
+        bodies = []
+        for index, name in enumerate(self.names):
+            bodies.append(CelestialBody(p_name=name,
+                                        radius=self.radii[index],
+                                        mass=self.masses[index],
+                                        color=self.colors[index],
+                                        initial_position=np.array(self.positions[0, index]),
+                                        initial_velocity=initial_velocities[index],
+                                        state=state))
+        # A recording started after collisions may list a parent after its satellites
+        for body, parent in zip(bodies, self.parents.tolist()):
+            if parent >= 0:
+                body.parent_body = bodies[parent]
+        state.time = self.start_time
+        return state
+
+
+class ReplayPlayer:
+    def __init__(self, reader, speed_up):
+        """
+        Play back a recorded trajectory in place of a live Simulation.
+
+        The player offers the same interpolated_positions, latest_state, speed_up, paused and
+        state_lock interface as simulation.Simulation, so the render loop does not care which one
+        it draws. Nothing changes the bodies during a replay, so the lock is never contended.
+        The replay time advances with the wall clock times speed_up, which may be negative to play
+        backwards.
+
+        Parameters:
+        reader (TrajectoryReader): The recording to play.
+        speed_up (float): Simulated seconds per wall-clock second.
+        """
+        self.reader = reader
+        self.speed_up = speed_up
+        self.paused = False
+        self.time = reader.start_time
+        self.state_lock = threading.Lock()
+        self._last_wall_time = None
+
+    def start(self):
+        self._last_wall_time = time.perf_counter()
+
+    def stop(self):
+        pass
+
+    def seek(self, sim_time):
+        """
+        Jump to a time within the recording.
+
+        Parameters:
+        sim_time (float): Simulation time (s); clamped to the recorded range.
+        """
+        self.time = min(max(sim_time, self.reader.start_time), self.reader.end_time)
+
+    def latest_state(self):
+        """
+        Return the recorded positions and estimated velocities at the current replay time.
+
+        Returns:
+        Snapshot: The positions and velocities with the recorded masses; recorded bodies never
+            move on analytic orbits.
+        """
+        n = len(self.reader.names)
+        return Snapshot(self.reader.positions_at(self.time), self.reader.velocities_at(self.time), self.time,
+                        time.perf_counter(), self.reader.masses.copy(), np.zeros(n, dtype=bool),
+                        np.zeros((n, kepler.ELEMENT_COUNT)))
+
+    def interpolated_positions(self):
+        """
+        Return the recorded positions at the current replay time.
+
+        Returns:
+        tuple: Position vectors (shape: [n, 3]) and the simulation time they correspond to (s).
+        """
+        now = time.perf_counter()
+        if self._last_wall_time is not None and not self.paused:
+            self.seek(self.time + (now - self._last_wall_time) * self.speed_up)
+        self._last_wall_time = now
+        return self.reader.positions_at(self.time), self.time